@@ -0,0 +1,87 @@
+"""Store course description and summary as compressed bytea
+
+Revision ID: 3a7d5c1e9b64
+Revises: e6f1b8d24a70
+Create Date: 2026-10-19 15:41:27.306518
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = "3a7d5c1e9b64"
+down_revision = "e6f1b8d24a70"
+branch_labels = None
+depends_on = None
+
+CHUNK_SIZE = 10000
+COLUMNS = ("description", "ai_summary")
+
+
+def backfill(expressions: dict[str, str]):
+    """
+    Fill the new columns one id range per transaction, so the table is never
+    locked or rewritten in one go
+    """
+    max_id = op.get_bind().execute(sa.text("SELECT max(id) FROM course")).scalar()
+    assignments = ", ".join(
+        f"{column}_new = {expression}" for column, expression in expressions.items()
+    )
+    with op.get_context().autocommit_block():
+        for start in range(0, (max_id or 0) + 1, CHUNK_SIZE):
+            op.execute(
+                sa.text(
+                    f"UPDATE course SET {assignments} WHERE id > :start AND id <= :end"
+                ).bindparams(start=start, end=start + CHUNK_SIZE)
+            )
+
+
+def swap_columns():
+    for column in COLUMNS:
+        op.drop_column("course", column)
+        op.alter_column("course", f"{column}_new", new_column_name=column)
+
+
+def upgrade():
+    # Existing rows are stored plain (codec byte 0); compress them afterwards
+    # with `python -m app.tasks.compress_text recompress`
+    for column in COLUMNS:
+        op.add_column("course", sa.Column(f"{column}_new", sa.LargeBinary()))
+    backfill(
+        {
+            column: f"'\\x00'::bytea || convert_to({column}, 'UTF8')"
+            for column in COLUMNS
+        }
+    )
+    swap_columns()
+
+
+def downgrade():
+    compressed = (
+        op.get_bind()
+        .execute(
+            sa.text(
+                "SELECT count(*) FROM course "
+                "WHERE get_byte(description, 0) <> 0 OR get_byte(ai_summary, 0) <> 0"
+            )
+        )
+        .scalar()
+    )
+    if compressed:
+        raise RuntimeError(
+            f"{compressed} courses hold compressed text; run the recompress "
+            "command with TEXT_COMPRESSION=false before downgrading"
+        )
+
+    for column in COLUMNS:
+        op.add_column("course", sa.Column(f"{column}_new", sa.Text()))
+    backfill(
+        {
+            column: f"convert_from(substring({column} FROM 2), 'UTF8')"
+            for column in COLUMNS
+        }
+    )
+    swap_columns()
@@ -0,0 +1,87 @@
+"""Add summary revisions
+
+Revision ID: 5e8d1f3a7c92
+Revises: 7b2c9e4f1a36
+Create Date: 2026-10-19 18:22:07.640315
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = "5e8d1f3a7c92"
+down_revision = "7b2c9e4f1a36"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "summaryrevision",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("course_id", sa.Integer(), nullable=False),
+        sa.Column("revision", sa.Integer(), nullable=False),
+        sa.Column(
+            "source", sqlmodel.sql.sqltypes.AutoString(length=20), nullable=False
+        ),
+        sa.Column("keyframe", sa.Boolean(), nullable=False),
+        sa.Column("content", sa.LargeBinary(), nullable=True),
+        sa.Column(
+            "summary_model", sqlmodel.sql.sqltypes.AutoString(length=255), nullable=True
+        ),
+        sa.Column(
+            "summary_prompt_version",
+            sqlmodel.sql.sqltypes.AutoString(length=50),
+            nullable=True,
+        ),
+        sa.Column(
+            "summary_source_hash",
+            sqlmodel.sql.sqltypes.AutoString(length=64),
+            nullable=True,
+        ),
+        sa.Column("prompt_tokens", sa.Integer(), nullable=False),
+        sa.Column("completion_tokens", sa.Integer(), nullable=False),
+        sa.Column("edited_by", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["course_id"], ["course.id"]),
+        sa.ForeignKeyConstraint(["edited_by"], ["user.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("course_id", "revision"),
+    )
+    op.add_column("course", sa.Column("summary_revision", sa.Integer(), nullable=True))
+    op.execute("UPDATE course SET summary_revision = 0")
+    op.alter_column("course", "summary_revision", nullable=False)
+
+    # Existing summaries become revision 1. Both columns hold the same
+    # CompressedText encoding, so the bytes are copied as they are; an empty
+    # summary is stored as the plain marker byte alone.
+    op.execute(
+        """
+        INSERT INTO summaryrevision (
+            course_id, revision, source, keyframe, content, summary_model,
+            summary_prompt_version, summary_source_hash, prompt_tokens,
+            completion_tokens, created_at
+        )
+        SELECT
+            id, 1,
+            CASE WHEN summary_source_hash IS NULL THEN 'user' ELSE 'ai' END,
+            true, ai_summary, summary_model, summary_prompt_version,
+            summary_source_hash, 0, 0, updated_at
+        FROM course
+        WHERE ai_summary <> '\\x00'::bytea
+        """
+    )
+    op.execute(
+        """
+        UPDATE course SET summary_revision = 1
+        WHERE ai_summary <> '\\x00'::bytea
+        """
+    )
+
+
+def downgrade():
+    op.drop_column("course", "summary_revision")
+    op.drop_table("summaryrevision")
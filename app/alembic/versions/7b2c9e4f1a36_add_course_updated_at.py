@@ -0,0 +1,28 @@
+"""Add course.updated_at
+
+Revision ID: 7b2c9e4f1a36
+Revises: 3a7d5c1e9b64
+Create Date: 2026-10-19 16:05:48.512093
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = "7b2c9e4f1a36"
+down_revision = "3a7d5c1e9b64"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("course", sa.Column("updated_at", sa.DateTime(), nullable=True))
+    op.execute("UPDATE course SET updated_at = created_at")
+    op.alter_column("course", "updated_at", nullable=False)
+
+
+def downgrade():
+    op.drop_column("course", "updated_at")
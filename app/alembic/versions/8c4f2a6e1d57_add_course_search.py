@@ -0,0 +1,119 @@
+"""Add course search
+
+Revision ID: 8c4f2a6e1d57
+Revises: 5e8d1f3a7c92
+Create Date: 2026-10-19 20:14:36.918402
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+from sqlalchemy.dialects import postgresql
+
+from app.core.config import settings
+from app.core.vector import Vector
+
+
+# revision identifiers, used by Alembic.
+revision = "8c4f2a6e1d57"
+down_revision = "5e8d1f3a7c92"
+branch_labels = None
+depends_on = None
+
+CHUNK_SIZE = 10000
+# Of the default SEARCH_EMBEDDING_MODEL
+DIMENSIONS = 384
+# Mirrors app.crud.search for plain rows; compressed rows are left to
+# `python -m app.tasks.search_index reindex --missing-only`
+BACKFILL = """
+    INSERT INTO coursesearch (course_id, user_id, content_vector, summary_vector)
+    SELECT
+        id,
+        user_id,
+        setweight(to_tsvector(CAST(:config AS regconfig), title), 'A')
+            || setweight(to_tsvector(
+                CAST(:config AS regconfig),
+                left(convert_from(substring(description FROM 2), 'UTF8'), 100000)
+            ), 'C'),
+        setweight(to_tsvector(
+            CAST(:config AS regconfig),
+            convert_from(substring(coalesce(ai_summary, '\\x00') FROM 2), 'UTF8')
+        ), 'B')
+    FROM course
+    WHERE id > :start AND id <= :end
+        AND get_byte(description, 0) = 0
+        AND get_byte(coalesce(ai_summary, '\\x00'), 0) = 0
+"""
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+    op.create_table(
+        "coursesearch",
+        sa.Column("course_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("content_vector", postgresql.TSVECTOR(), nullable=False),
+        sa.Column("summary_vector", postgresql.TSVECTOR(), nullable=False),
+        sa.ForeignKeyConstraint(["course_id"], ["course.id"]),
+        sa.PrimaryKeyConstraint("course_id"),
+    )
+
+    max_id = op.get_bind().execute(sa.text("SELECT max(id) FROM course")).scalar()
+    with op.get_context().autocommit_block():
+        for start in range(0, (max_id or 0) + 1, CHUNK_SIZE):
+            op.execute(
+                sa.text(BACKFILL).bindparams(
+                    config=settings.SEARCH_TEXT_CONFIG,
+                    start=start,
+                    end=start + CHUNK_SIZE,
+                )
+            )
+    # Built after the backfill, which is much faster than updating it row by row
+    op.create_index(
+        "ix_coursesearch_document",
+        "coursesearch",
+        ["user_id", sa.text("(content_vector || summary_vector)")],
+        unique=False,
+        postgresql_using="gin",
+    )
+
+    # Semantic search needs pgvector (0.8 or later); without it the table is
+    # left out and SEARCH_EMBEDDINGS must stay off
+    has_pgvector = (
+        op.get_bind()
+        .execute(sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'vector'"))
+        .scalar()
+    )
+    if not has_pgvector:
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    op.create_table(
+        "courseembedding",
+        sa.Column("course_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("embedding", Vector(DIMENSIONS), nullable=False),
+        sa.Column("embedded_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["course_id"], ["course.id"]),
+        sa.PrimaryKeyConstraint("course_id"),
+    )
+    op.create_index(
+        op.f("ix_courseembedding_user_id"),
+        "courseembedding",
+        ["user_id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_courseembedding_embedding",
+        "courseembedding",
+        ["embedding"],
+        unique=False,
+        postgresql_using="hnsw",
+        postgresql_ops={"embedding": "vector_cosine_ops"},
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS courseembedding")
+    op.drop_index("ix_coursesearch_document", table_name="coursesearch")
+    op.drop_table("coursesearch")
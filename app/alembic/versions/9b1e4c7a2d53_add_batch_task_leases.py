@@ -0,0 +1,53 @@
+"""Add batch task leases for pull-based workers
+
+Revision ID: 9b1e4c7a2d53
+Revises: f3f86b3325fd
+Create Date: 2026-10-19 09:12:31.417203
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = "9b1e4c7a2d53"
+down_revision = "f3f86b3325fd"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "batchtask",
+        sa.Column("attempts", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.add_column(
+        "batchtask", sa.Column("lease_expires_at", sa.DateTime(), nullable=True)
+    )
+    op.create_index(
+        op.f("ix_batchtask_batch_job_id"), "batchtask", ["batch_job_id"], unique=False
+    )
+    # Keep the claim query cheap: it only ever looks at pending tasks and at
+    # processing tasks with an expired lease
+    op.create_index(
+        "ix_batchtask_pending",
+        "batchtask",
+        ["id"],
+        postgresql_where=sa.text("status = 'PENDING'"),
+    )
+    op.create_index(
+        "ix_batchtask_processing_lease",
+        "batchtask",
+        ["lease_expires_at"],
+        postgresql_where=sa.text("status = 'PROCESSING'"),
+    )
+
+
+def downgrade():
+    op.drop_index("ix_batchtask_processing_lease", table_name="batchtask")
+    op.drop_index("ix_batchtask_pending", table_name="batchtask")
+    op.drop_index(op.f("ix_batchtask_batch_job_id"), table_name="batchtask")
+    op.drop_column("batchtask", "lease_expires_at")
+    op.drop_column("batchtask", "attempts")
@@ -0,0 +1,65 @@
+"""Add course description hash and summary provenance
+
+Revision ID: a71f3c9e5b28
+Revises: e8a03b6d9f12
+Create Date: 2026-10-19 12:04:17.518230
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = "a71f3c9e5b28"
+down_revision = "e8a03b6d9f12"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "course",
+        sa.Column(
+            "description_hash",
+            sqlmodel.sql.sqltypes.AutoString(length=64),
+            server_default="",
+            nullable=False,
+        ),
+    )
+    op.add_column(
+        "course",
+        sa.Column(
+            "summary_model", sqlmodel.sql.sqltypes.AutoString(length=255), nullable=True
+        ),
+    )
+    op.add_column(
+        "course",
+        sa.Column(
+            "summary_prompt_version",
+            sqlmodel.sql.sqltypes.AutoString(length=50),
+            nullable=True,
+        ),
+    )
+    op.add_column(
+        "course",
+        sa.Column(
+            "summary_source_hash",
+            sqlmodel.sql.sqltypes.AutoString(length=64),
+            nullable=True,
+        ),
+    )
+    # Same digest as app.core.hashing.text_hash. Existing summaries have no
+    # provenance, so they count as stale until regenerated.
+    op.execute(
+        "UPDATE course SET description_hash = "
+        "encode(sha256(convert_to(coalesce(description, ''), 'UTF8')), 'hex')"
+    )
+
+
+def downgrade():
+    op.drop_column("course", "summary_source_hash")
+    op.drop_column("course", "summary_prompt_version")
+    op.drop_column("course", "summary_model")
+    op.drop_column("course", "description_hash")
@@ -0,0 +1,51 @@
+"""Add token usage and course description tokens
+
+Revision ID: b2e57d0c8f46
+Revises: f0c83a5d2e91
+Create Date: 2026-10-19 13:52:31.604218
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = "b2e57d0c8f46"
+down_revision = "f0c83a5d2e91"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "tokenusage",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("prompt_tokens", sa.Integer(), nullable=False),
+        sa.Column("completion_tokens", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["user.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("user_id", "day"),
+    )
+    op.add_column(
+        "course",
+        sa.Column(
+            "description_tokens", sa.Integer(), server_default="0", nullable=False
+        ),
+    )
+    # Approximated at four characters per token, as in app.services.tokens
+    op.execute(
+        "UPDATE course SET description_tokens = "
+        "(length(coalesce(description, '')) + 3) / 4"
+    )
+
+
+def downgrade():
+    op.drop_column("course", "description_tokens")
+    op.drop_table("tokenusage")
@@ -0,0 +1,41 @@
+"""Add failed task counter and sweeper indexes to batch jobs
+
+Revision ID: c5d2a8f41e07
+Revises: 9b1e4c7a2d53
+Create Date: 2026-10-19 10:03:55.218904
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = "c5d2a8f41e07"
+down_revision = "9b1e4c7a2d53"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "batchjob",
+        sa.Column("failed_tasks", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.create_index(
+        "ix_batchjob_active",
+        "batchjob",
+        ["id"],
+        postgresql_where=sa.text("status IN ('PENDING', 'PROCESSING')"),
+    )
+    # Tasks claimed before leases existed expire based on their last update
+    op.execute(
+        "UPDATE batchtask SET lease_expires_at = updated_at "
+        "WHERE status = 'PROCESSING' AND lease_expires_at IS NULL"
+    )
+
+
+def downgrade():
+    op.drop_index("ix_batchjob_active", table_name="batchjob")
+    op.drop_column("batchjob", "failed_tasks")
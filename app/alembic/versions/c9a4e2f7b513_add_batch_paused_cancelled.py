@@ -0,0 +1,33 @@
+"""Add paused and cancelled batch statuses
+
+Revision ID: c9a4e2f7b513
+Revises: b2e57d0c8f46
+Create Date: 2026-10-19 14:30:46.281573
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = "c9a4e2f7b513"
+down_revision = "b2e57d0c8f46"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # New enum labels can't be used in the transaction that adds them
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE batchstatus ADD VALUE IF NOT EXISTS 'PAUSED'")
+        op.execute("ALTER TYPE batchstatus ADD VALUE IF NOT EXISTS 'CANCELLED'")
+
+
+def downgrade():
+    # Postgres can't drop enum labels; move the rows off them instead
+    op.execute("UPDATE batchtask SET status = 'PENDING' WHERE status = 'PAUSED'")
+    op.execute("UPDATE batchtask SET status = 'FAILED' WHERE status = 'CANCELLED'")
+    op.execute("UPDATE batchjob SET status = 'PROCESSING' WHERE status = 'PAUSED'")
+    op.execute("UPDATE batchjob SET status = 'FAILED' WHERE status = 'CANCELLED'")
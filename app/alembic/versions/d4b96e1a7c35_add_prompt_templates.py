@@ -0,0 +1,75 @@
+"""Add prompt templates
+
+Revision ID: d4b96e1a7c35
+Revises: a71f3c9e5b28
+Create Date: 2026-10-19 12:41:52.306914
+
+"""
+
+from datetime import datetime, UTC
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = "d4b96e1a7c35"
+down_revision = "a71f3c9e5b28"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    prompttemplate = op.create_table(
+        "prompttemplate",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column(
+            "version", sqlmodel.sql.sqltypes.AutoString(length=50), nullable=False
+        ),
+        sa.Column("system_prompt", sa.TEXT(), nullable=True),
+        sa.Column("summary_prompt", sa.TEXT(), nullable=True),
+        sa.Column("chunk_prompt", sa.TEXT(), nullable=True),
+        sa.Column("weight", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("version"),
+    )
+    # The prompts that were hard-coded until now; summaries recorded with
+    # version "1" were made with them
+    op.bulk_insert(
+        prompttemplate,
+        [
+            {
+                "version": "1",
+                "system_prompt": (
+                    "You are a helpful assistant that creates concise, informative "
+                    "summaries of online courses."
+                ),
+                "summary_prompt": (
+                    "Summarize this online course in 2-3 sentences: {text}"
+                ),
+                "chunk_prompt": (
+                    "This is part {part} of {parts} of a long online course "
+                    "description. Summarize the key topics it covers in 2-3 "
+                    "sentences: {text}"
+                ),
+                "weight": 1,
+                "created_at": datetime.now(UTC),
+            }
+        ],
+    )
+    op.create_foreign_key(
+        "course_summary_prompt_version_fkey",
+        "course",
+        "prompttemplate",
+        ["summary_prompt_version"],
+        ["version"],
+    )
+
+
+def downgrade():
+    op.drop_constraint(
+        "course_summary_prompt_version_fkey", "course", type_="foreignkey"
+    )
+    op.drop_table("prompttemplate")
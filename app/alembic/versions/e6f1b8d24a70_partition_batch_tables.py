@@ -0,0 +1,162 @@
+"""Partition batch tables by month and drop batchtask.result
+
+Revision ID: e6f1b8d24a70
+Revises: c9a4e2f7b513
+Create Date: 2026-10-19 15:08:12.947361
+
+"""
+
+from datetime import date, datetime, UTC
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = "e6f1b8d24a70"
+down_revision = "c9a4e2f7b513"
+branch_labels = None
+depends_on = None
+
+# batchtask columns without result, which is read from course.ai_summary now
+TASK_COLUMNS = (
+    "id, batch_job_id, course_id, status, error, created_at, updated_at, attempts, "
+    "lease_expires_at, prompt_tokens, completion_tokens, llm_calls, "
+    "postprocess_outcome"
+)
+
+
+def month_start(day: date, months: int = 0) -> date:
+    month = day.year * 12 + day.month - 1 + months
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def create_batch_indexes():
+    op.create_index(
+        "ix_batchjob_active",
+        "batchjob",
+        ["id"],
+        postgresql_where=sa.text("status IN ('PENDING', 'PROCESSING')"),
+    )
+    op.create_index(
+        op.f("ix_batchtask_batch_job_id"), "batchtask", ["batch_job_id"], unique=False
+    )
+    op.create_index(
+        "ix_batchtask_pending",
+        "batchtask",
+        ["id"],
+        postgresql_where=sa.text("status = 'PENDING'"),
+    )
+    op.create_index(
+        "ix_batchtask_processing_lease",
+        "batchtask",
+        ["lease_expires_at"],
+        postgresql_where=sa.text("status = 'PROCESSING'"),
+    )
+
+
+def rename_to_old(table: str):
+    op.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+    op.execute(
+        f"ALTER TABLE {table}_old RENAME CONSTRAINT {table}_pkey TO {table}_old_pkey"
+    )
+
+
+def drop_old_indexes():
+    op.drop_index("ix_batchjob_active", table_name="batchjob_old")
+    op.drop_index("ix_batchtask_batch_job_id", table_name="batchtask_old")
+    op.drop_index("ix_batchtask_pending", table_name="batchtask_old")
+    op.drop_index("ix_batchtask_processing_lease", table_name="batchtask_old")
+
+
+def upgrade():
+    # Rebuilds both tables: run in a maintenance window on large databases
+    connection = op.get_bind()
+    today = datetime.now(UTC).date()
+    oldest = connection.execute(
+        sa.text(
+            "SELECT least((SELECT min(created_at) FROM batchjob), "
+            "(SELECT min(created_at) FROM batchtask))"
+        )
+    ).scalar()
+    month = month_start(oldest.date() if oldest else today)
+    months = []
+    while month <= month_start(today, 2):
+        months.append(month)
+        month = month_start(month, 1)
+
+    # A partitioned batchjob can't have a unique constraint on id alone
+    op.drop_constraint("batchtask_batch_job_id_fkey", "batchtask", type_="foreignkey")
+    rename_to_old("batchjob")
+    rename_to_old("batchtask")
+    drop_old_indexes()
+
+    for table in ("batchjob", "batchtask"):
+        op.execute(
+            f"CREATE TABLE {table} (LIKE {table}_old INCLUDING DEFAULTS) "
+            "PARTITION BY RANGE (created_at)"
+        )
+        op.execute(
+            f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey "
+            "PRIMARY KEY (id, created_at)"
+        )
+        for month in months:
+            op.execute(
+                f"CREATE TABLE {table}_p{month:%Y%m} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month}') TO ('{month_start(month, 1)}')"
+            )
+        op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+
+    op.drop_column("batchtask", "result")
+    op.create_foreign_key(
+        "batchjob_user_id_fkey", "batchjob", "user", ["user_id"], ["id"]
+    )
+    op.create_foreign_key(
+        "batchtask_course_id_fkey", "batchtask", "course", ["course_id"], ["id"]
+    )
+
+    op.execute("INSERT INTO batchjob SELECT * FROM batchjob_old")
+    op.execute(
+        f"INSERT INTO batchtask ({TASK_COLUMNS}) "
+        f"SELECT {TASK_COLUMNS} FROM batchtask_old"
+    )
+    op.drop_table("batchtask_old")
+    op.drop_table("batchjob_old")
+    create_batch_indexes()
+
+
+def downgrade():
+    rename_to_old("batchjob")
+    rename_to_old("batchtask")
+    drop_old_indexes()
+
+    for table in ("batchjob", "batchtask"):
+        op.execute(f"CREATE TABLE {table} (LIKE {table}_old INCLUDING DEFAULTS)")
+        op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id)")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+
+    op.add_column("batchtask", sa.Column("result", sa.TEXT(), nullable=True))
+    op.execute("INSERT INTO batchjob SELECT * FROM batchjob_old")
+    op.execute(
+        f"INSERT INTO batchtask ({TASK_COLUMNS}, result) "
+        f"SELECT {', '.join(f'batchtask_old.{c}' for c in TASK_COLUMNS.split(', '))}, "
+        "CASE WHEN batchtask_old.status = 'COMPLETED' THEN course.ai_summary "
+        "ELSE '' END "
+        "FROM batchtask_old JOIN course ON course.id = batchtask_old.course_id"
+    )
+    # Dropping the partitioned tables drops their partitions
+    op.drop_table("batchtask_old")
+    op.drop_table("batchjob_old")
+
+    op.create_foreign_key(
+        "batchjob_user_id_fkey", "batchjob", "user", ["user_id"], ["id"]
+    )
+    op.create_foreign_key(
+        "batchtask_course_id_fkey", "batchtask", "course", ["course_id"], ["id"]
+    )
+    op.create_foreign_key(
+        "batchtask_batch_job_id_fkey", "batchtask", "batchjob", ["batch_job_id"], ["id"]
+    )
+    create_batch_indexes()
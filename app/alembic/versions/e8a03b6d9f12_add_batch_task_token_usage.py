@@ -0,0 +1,41 @@
+"""Add token usage to batch tasks
+
+Revision ID: e8a03b6d9f12
+Revises: c5d2a8f41e07
+Create Date: 2026-10-19 11:26:40.093117
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = "e8a03b6d9f12"
+down_revision = "c5d2a8f41e07"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "batchtask",
+        sa.Column("prompt_tokens", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.add_column(
+        "batchtask",
+        sa.Column(
+            "completion_tokens", sa.Integer(), server_default="0", nullable=False
+        ),
+    )
+    op.add_column(
+        "batchtask",
+        sa.Column("llm_calls", sa.Integer(), server_default="0", nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_column("batchtask", "llm_calls")
+    op.drop_column("batchtask", "completion_tokens")
+    op.drop_column("batchtask", "prompt_tokens")
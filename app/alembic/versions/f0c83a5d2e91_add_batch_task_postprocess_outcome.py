@@ -0,0 +1,34 @@
+"""Add postprocess outcome to batch tasks
+
+Revision ID: f0c83a5d2e91
+Revises: d4b96e1a7c35
+Create Date: 2026-10-19 13:15:08.742051
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = "f0c83a5d2e91"
+down_revision = "d4b96e1a7c35"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "batchtask",
+        sa.Column(
+            "postprocess_outcome",
+            sqlmodel.sql.sqltypes.AutoString(length=20),
+            server_default="",
+            nullable=False,
+        ),
+    )
+
+
+def downgrade():
+    op.drop_column("batchtask", "postprocess_outcome")
@@ -1,4 +1,7 @@
+import os
+
 from celery import Celery
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
 from app.core.config import settings
 
 # Create the Celery app
@@ -6,7 +9,11 @@ celery_app = Celery(
     "app",
     broker=f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/0",
     backend=f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/0",
-    include=["app.tasks.batch_tasks"],
+    include=[
+        "app.tasks.batch_tasks",
+        "app.tasks.maintenance",
+        "app.tasks.resummarize",
+    ],
 )
 
 # Optional: Configure Celery
@@ -18,7 +25,75 @@ celery_app.conf.update(
     task_track_started=True,
     result_expires=3600,  # Results expire after 1 hour
     worker_prefetch_multiplier=1,  # Don't prefetch more than one task
+    beat_schedule={
+        "reap-stale-batch-tasks": {
+            "task": "reap_stale_batch_tasks",
+            "schedule": settings.BATCH_SWEEP_SECONDS,
+        },
+        "dispatch-stalled-batch-tasks": {
+            "task": "dispatch_stalled_batch_tasks",
+            "schedule": settings.BATCH_SWEEP_SECONDS,
+        },
+        "finalize-batch-jobs": {
+            "task": "finalize_batch_jobs",
+            "schedule": settings.BATCH_SWEEP_SECONDS,
+        },
+        "maintain-batch-partitions": {
+            "task": "maintain_batch_partitions",
+            "schedule": settings.BATCH_PARTITION_CHECK_SECONDS,
+        },
+        "flush-token-usage": {
+            "task": "flush_token_usage",
+            "schedule": settings.TOKEN_USAGE_FLUSH_SECONDS,
+        },
+    },
 )
+if settings.SEARCH_EMBEDDINGS:
+    celery_app.conf.beat_schedule["embed-courses"] = {
+        "task": "embed_courses",
+        "schedule": settings.SEARCH_EMBEDDING_SWEEP_SECONDS,
+    }
+
+
+@worker_init.connect
+def start_metrics_exporter(**kwargs) -> None:
+    """Serve the worker's metrics from its main process"""
+    if settings.METRICS_ENABLED:
+        from app.core import metrics
+
+        metrics.start_worker_exporter(settings.METRICS_WORKER_PORT)
+
+
+@worker_init.connect
+def preload_task_dependencies(**kwargs) -> None:
+    """
+    Load what the tasks import lazily once in the main process, so prefork
+    children inherit it instead of each paying for it on their first task
+    """
+    from app.services import tokens
+
+    if settings.LLM_BACKEND != "stub":
+        import openai  # noqa: F401
+
+    tokens.get_encoding(settings.LLM_MODEL)
+
+
+@worker_process_init.connect
+def init_tracing(**kwargs) -> None:
+    """Tracing is set up in each prefork child, after the fork"""
+    from app.core.tracing import setup_tracing
+
+    setup_tracing("celery-worker")
+
+
+@worker_process_shutdown.connect
+def discard_child_metrics(pid: int | None = None, **kwargs) -> None:
+    """Drop the live gauges of a prefork child that exited"""
+    if settings.METRICS_ENABLED and pid and os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid)
+
 
 if __name__ == "__main__":
     celery_app.start()
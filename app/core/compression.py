@@ -0,0 +1,158 @@
+"""
+Transparent compression of large text columns.
+
+Values are stored as bytea behind a one-byte codec prefix: 0 for plain UTF-8,
+1 for a zstd frame. A zstd frame records the ID of the dictionary it was
+compressed with, so any dictionary in TEXT_COMPRESSION_DICTIONARY_DIR can still
+decode old rows after a new one is trained. zstandard is optional (the
+`compression` extra); without it new values are stored plain.
+"""
+
+import logging
+import os
+import threading
+from functools import lru_cache
+
+from sqlalchemy import LargeBinary
+from sqlalchemy.types import TypeDecorator
+
+from app.core.config import settings
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+logger = logging.getLogger(__name__)
+
+PLAIN = b"\x00"
+ZSTD = b"\x01"
+DICTIONARY_SUFFIX = ".zdict"
+
+_local = threading.local()
+
+
+@lru_cache
+def _dictionaries() -> dict:
+    """Dictionaries in TEXT_COMPRESSION_DICTIONARY_DIR, keyed by dictionary ID"""
+    directory = settings.TEXT_COMPRESSION_DICTIONARY_DIR
+    if zstandard is None or not directory or not os.path.isdir(directory):
+        return {}
+
+    dictionaries = {}
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(DICTIONARY_SUFFIX):
+            continue
+        with open(os.path.join(directory, name), "rb") as f:
+            dictionary = zstandard.ZstdCompressionDict(f.read())
+        dictionaries[dictionary.dict_id()] = dictionary
+    return dictionaries
+
+
+def _compressor():
+    # zstd contexts must not be shared between threads
+    compressor = getattr(_local, "compressor", None)
+    if compressor is None:
+        dictionary_id = settings.TEXT_COMPRESSION_DICTIONARY_ID
+        dictionary = _dictionaries().get(dictionary_id) if dictionary_id else None
+        if dictionary_id and dictionary is None:
+            logger.warning(
+                f"Compression dictionary {dictionary_id} not found, "
+                "compressing without one"
+            )
+        compressor = zstandard.ZstdCompressor(
+            level=settings.TEXT_COMPRESSION_LEVEL, dict_data=dictionary
+        )
+        _local.compressor = compressor
+    return compressor
+
+
+def _decompressor(dictionary_id: int):
+    decompressors = getattr(_local, "decompressors", None)
+    if decompressors is None:
+        decompressors = _local.decompressors = {}
+    decompressor = decompressors.get(dictionary_id)
+    if decompressor is None:
+        dictionary = None
+        if dictionary_id:
+            dictionary = _dictionaries().get(dictionary_id)
+            if dictionary is None:
+                raise ValueError(f"Compression dictionary {dictionary_id} not found")
+        decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+        decompressors[dictionary_id] = decompressor
+    return decompressor
+
+
+def compress_text(value: str) -> bytes:
+    """
+    Encode text for a CompressedText column.
+
+    Short values, and all values when compression is off or zstandard is not
+    installed, are stored as plain UTF-8.
+    """
+    data = value.encode()
+    if (
+        not settings.TEXT_COMPRESSION
+        or zstandard is None
+        or len(data) < settings.TEXT_COMPRESSION_MIN_BYTES
+    ):
+        return PLAIN + data
+
+    compressed = _compressor().compress(data)
+    if len(compressed) >= len(data):
+        return PLAIN + data
+    return ZSTD + compressed
+
+
+def decompress_text(data: bytes) -> str:
+    """Decode a value written by compress_text"""
+    codec, payload = data[:1], data[1:]
+    if codec == PLAIN:
+        return payload.decode()
+    if codec == ZSTD:
+        if zstandard is None:
+            raise RuntimeError(
+                "Compressed text found but zstandard is not installed; "
+                "install the `compression` extra"
+            )
+        dictionary_id = zstandard.get_frame_parameters(payload).dict_id
+        return _decompressor(dictionary_id).decompress(payload).decode()
+    raise ValueError(f"Unknown text codec {codec!r}")
+
+
+def train_dictionary(samples: list[str], size: int) -> bytes:
+    """
+    Train a zstd dictionary on sample texts.
+
+    Returns:
+        The dictionary, to be saved as <dictionary ID>.zdict in
+        TEXT_COMPRESSION_DICTIONARY_DIR
+    """
+    if zstandard is None:
+        raise RuntimeError("Training a dictionary needs the `compression` extra")
+    dictionary = zstandard.train_dictionary(
+        size, [sample.encode() for sample in samples]
+    )
+    return dictionary.as_bytes()
+
+
+def dictionary_id(data: bytes) -> int:
+    return zstandard.ZstdCompressionDict(data).dict_id()
+
+
+class CompressedText(TypeDecorator):
+    """Text column stored as bytea, zstd-compressed when worthwhile"""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return decompress_text(bytes(value))
@@ -1,4 +1,5 @@
 import secrets
+from typing import Literal
 
 from pydantic import (
     PostgresDsn,
@@ -38,8 +39,157 @@ class Settings(BaseSettings):
     REDIS_HOST: str
     REDIS_PORT: int = 6379
 
+    # LLM backend: "openai", "openai_compatible" (a local server at LLM_BASE_URL)
+    # or "stub" for offline load testing
+    LLM_BACKEND: Literal["openai", "openai_compatible", "stub"] = "openai"
+    LLM_BASE_URL: str = ""
+    # Stub backend: log-normal latency around LLM_STUB_LATENCY_MS, plus output
+    # tokens at LLM_STUB_TOKENS_PER_SECOND, failing LLM_STUB_ERROR_RATE of calls
+    LLM_STUB_LATENCY_MS: float = 800.0
+    LLM_STUB_LATENCY_SIGMA: float = 0.5
+    LLM_STUB_ERROR_RATE: float = 0.0
+    LLM_STUB_TOKENS_PER_SECOND: float = 50.0
+    LLM_STUB_SEED: int | None = None
+
     # OpenAI API key
     OPENAI_API_KEY: str = ""
+    LLM_MODEL: str = "gpt-4o-mini-2024-07-18"
+    # Each call times out after LLM_TIMEOUT_SECONDS. The client does not retry
+    # on its own by default: the batch workers retry with backoff, and the API
+    # tells the caller when to retry
+    LLM_TIMEOUT_SECONDS: float = 60.0
+    LLM_CLIENT_MAX_RETRIES: int = 0
+    # Descriptions above LLM_MAX_INPUT_TOKENS are truncated; above the map-reduce
+    # threshold they are summarized in at most LLM_MAX_CHUNKS chunks instead
+    LLM_MAX_INPUT_TOKENS: int = 6000
+    LLM_MAP_REDUCE_THRESHOLD_TOKENS: int = 12000
+    LLM_CHUNK_TOKENS: int = 4000
+    LLM_MAX_CHUNKS: int = 8
+    LLM_MAP_CONCURRENCY: int = 4
+    # Summaries are cut by the model at LLM_MAX_OUTPUT_TOKENS and then validated
+    # locally; incomplete ones are trimmed or get a LLM_CONTINUATION_TOKENS
+    # continuation
+    LLM_MAX_OUTPUT_TOKENS: int = 150
+    LLM_CONTINUATION_TOKENS: int = 40
+    SUMMARY_MIN_CHARS: int = 40
+    SUMMARY_MAX_CHARS: int = 600
+    # Every summary version is kept; all but every
+    # SUMMARY_REVISION_KEYFRAME_INTERVAL-th are stored as a delta
+    SUMMARY_REVISION_KEYFRAME_INTERVAL: int = 20
+    # Active prompt templates are re-read from the database this often
+    PROMPT_CACHE_SECONDS: int = 60
+    # Re-summarizing after a prompt change creates batch jobs RESUMMARIZE_CHUNK_SIZE
+    # courses at a time, waiting while more batch tasks than the limit are queued
+    RESUMMARIZE_CHUNK_SIZE: int = 500
+    RESUMMARIZE_MAX_QUEUE_DEPTH: int = 5000
+    RESUMMARIZE_DELAY_SECONDS: int = 10
+
+    # Course descriptions and summaries are stored zstd-compressed when
+    # TEXT_COMPRESSION is on and the `compression` extra is installed. Values
+    # under TEXT_COMPRESSION_MIN_BYTES stay plain. TEXT_COMPRESSION_DICTIONARY_ID
+    # selects the dictionary to compress with from TEXT_COMPRESSION_DICTIONARY_DIR
+    # (0 for none); see app.tasks.compress_text
+    TEXT_COMPRESSION: bool = False
+    TEXT_COMPRESSION_LEVEL: int = 3
+    TEXT_COMPRESSION_MIN_BYTES: int = 256
+    TEXT_COMPRESSION_DICTIONARY_DIR: str = ""
+    TEXT_COMPRESSION_DICTIONARY_ID: int = 0
+
+    # JSON and text responses of at least this size are compressed with zstd,
+    # br or gzip, whichever the client accepts (zstd and br need the
+    # `compression` extra)
+    RESPONSE_COMPRESSION_MIN_BYTES: int = 1024
+
+    # Courses are full-text searchable by title, summary and description, parsed
+    # with the SEARCH_TEXT_CONFIG text search configuration. SEARCH_EMBEDDINGS
+    # adds semantic search; it needs pgvector in Postgres and the `search` extra.
+    # The Celery beat embeds up to SEARCH_EMBEDDING_BATCH_SIZE new or changed
+    # courses every SEARCH_EMBEDDING_SWEEP_SECONDS with SEARCH_EMBEDDING_MODEL,
+    # a 384-dimension fastembed model
+    SEARCH_TEXT_CONFIG: str = "english"
+    SEARCH_EMBEDDINGS: bool = False
+    SEARCH_EMBEDDING_MODEL: str = "BAAI/bge-small-en-v1.5"
+    SEARCH_EMBEDDING_BATCH_SIZE: int = 256
+    SEARCH_EMBEDDING_SWEEP_SECONDS: int = 60
+
+    # Prometheus metrics; workers serve theirs on METRICS_WORKER_PORT
+    METRICS_ENABLED: bool = True
+    METRICS_WORKER_PORT: int = 9100
+
+    # OpenTelemetry tracing, exported over OTLP/gRPC; needs the `tracing` extra
+    OTEL_ENABLED: bool = False
+    OTEL_SERVICE_NAME: str = "ai-summary"
+    OTEL_EXPORTER_OTLP_ENDPOINT: str = "http://localhost:4317"
+    OTEL_SAMPLE_RATIO: float = 1.0
+
+    # Concurrent summary requests for the same course share one LLM call, and
+    # repeated requests with the same Idempotency-Key get the first response back
+    SUMMARY_SINGLEFLIGHT_LOCK_SECONDS: int = 120
+    SUMMARY_SINGLEFLIGHT_WAIT_SECONDS: int = 90
+    IDEMPOTENCY_TTL_SECONDS: int = 60 * 60 * 24
+
+    # LLM token budgets per UTC day and month, for each user and for the whole
+    # deployment; 0 means unlimited, and all are off by default. Spend is
+    # flushed from Redis to Postgres every TOKEN_USAGE_FLUSH_SECONDS
+    TOKEN_BUDGET_USER_DAILY: int = 0
+    TOKEN_BUDGET_USER_MONTHLY: int = 0
+    TOKEN_BUDGET_ORG_DAILY: int = 0
+    TOKEN_BUDGET_ORG_MONTHLY: int = 0
+    TOKEN_USAGE_FLUSH_SECONDS: int = 60
+
+    # Batch workers: "celery" pushes every task through the broker, "pull" lets
+    # app.tasks.pull_worker claim tasks from Postgres with FOR UPDATE SKIP LOCKED
+    BATCH_WORKER_MODE: Literal["celery", "pull"] = "celery"
+    BATCH_CLAIM_SIZE: int = 10
+    # Claimed tasks hold a lease that both worker modes extend every
+    # BATCH_HEARTBEAT_SECONDS while the LLM call runs; the reaper requeues
+    # tasks whose lease has expired
+    BATCH_LEASE_SECONDS: int = 300
+    BATCH_HEARTBEAT_SECONDS: int = 60
+    BATCH_POLL_SECONDS: float = 1.0
+    BATCH_MAX_ATTEMPTS: int = 3
+    # With BATCH_SCHEDULER=fair, Celery-mode tasks wait in per-user queues in
+    # Redis and are sent to the workers by deficit round-robin, each user's turn
+    # worth BATCH_SCHEDULER_QUANTUM_TOKENS estimated tokens times their weight.
+    # At most BATCH_SCHEDULER_MAX_IN_FLIGHT tasks (about the total worker
+    # concurrency) are queued in the broker or running, and at most
+    # BATCH_SCHEDULER_USER_MAX_IN_FLIGHT of one user (0 for no cap); admins can
+    # override cap and weight per user. "fifo" sends every task to the broker
+    BATCH_SCHEDULER: Literal["fifo", "fair"] = "fair"
+    BATCH_SCHEDULER_MAX_IN_FLIGHT: int = 32
+    BATCH_SCHEDULER_USER_MAX_IN_FLIGHT: int = 0
+    BATCH_SCHEDULER_QUANTUM_TOKENS: int = 8000
+    # Tasks failing with a retryable LLM error (rate limited, timed out,
+    # provider unavailable) are retried after an exponential backoff starting at
+    # BATCH_RETRY_BASE_SECONDS, or after the provider's Retry-After
+    BATCH_RETRY_BASE_SECONDS: int = 30
+    BATCH_RETRY_MAX_SECONDS: int = 600
+    # Task outcomes: "direct" commits each one from the worker, "stream" appends
+    # it to a Redis stream that app.tasks.outcome_flusher writes to Postgres in
+    # batches of up to BATCH_WRITE_BEHIND_BATCH_SIZE every
+    # BATCH_WRITE_BEHIND_INTERVAL_MS. Workers wait for
+    # BATCH_WRITE_BEHIND_REPLICAS Redis replicas to have each outcome (0 relies
+    # on the primary's persistence alone); flushers take over entries another
+    # flusher left unacknowledged for BATCH_WRITE_BEHIND_CLAIM_IDLE_MS
+    BATCH_WRITE_MODE: Literal["direct", "stream"] = "direct"
+    BATCH_WRITE_BEHIND_INTERVAL_MS: int = 200
+    BATCH_WRITE_BEHIND_BATCH_SIZE: int = 500
+    BATCH_WRITE_BEHIND_REPLICAS: int = 0
+    BATCH_WRITE_BEHIND_WAIT_MS: int = 100
+    BATCH_WRITE_BEHIND_CLAIM_IDLE_MS: int = 60_000
+    # Celery beat sweeps for stale tasks and unfinished jobs
+    BATCH_SWEEP_SECONDS: int = 60
+    BATCH_SWEEP_LIMIT: int = 1000
+    # How long workers see the paused/cancelled flag of a job in Redis
+    BATCH_STATE_TTL_SECONDS: int = 7 * 24 * 3600
+    # batchjob and batchtask are partitioned by month. Partitions are created
+    # BATCH_PARTITION_MONTHS_AHEAD in advance; finished months older than
+    # BATCH_RETENTION_MONTHS are archived to gzipped CSV files in
+    # BATCH_ARCHIVE_DIR and dropped (0 keeps them forever)
+    BATCH_PARTITION_MONTHS_AHEAD: int = 2
+    BATCH_RETENTION_MONTHS: int = 6
+    BATCH_ARCHIVE_DIR: str = "/var/lib/ai-summary/archive"
+    BATCH_PARTITION_CHECK_SECONDS: int = 3600
 
 
 settings = Settings()  # type: ignore
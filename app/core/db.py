@@ -1,5 +1,23 @@
+import time
+
+from sqlalchemy.pool import QueuePool
 from sqlmodel import create_engine
 
 from app.core.config import settings
+from app.core.metrics import DB_POOL_CHECKOUT_WAIT
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait for a connection"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
 
-engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+engine = create_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI), poolclass=InstrumentedQueuePool
+)
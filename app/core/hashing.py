@@ -0,0 +1,6 @@
+import hashlib
+
+
+def text_hash(text: str) -> str:
+    """Stable SHA-256 hex digest of a text, used to detect changed content"""
+    return hashlib.sha256(text.encode()).hexdigest()
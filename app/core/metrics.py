@@ -0,0 +1,120 @@
+"""
+Prometheus metrics shared by the API and the workers.
+
+Set PROMETHEUS_MULTIPROC_DIR when running several API or Celery worker
+processes, so every process writes its samples where the exporter can
+aggregate them.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route", "status"],
+)
+LLM_CALL_DURATION = Histogram(
+    "llm_call_duration_seconds",
+    "Latency of a single LLM completion call",
+    ["model"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64),
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "Tokens sent to and received from the LLM",
+    ["model", "direction"],
+)
+LLM_ERRORS = Counter("llm_errors_total", "Failed LLM calls", ["model", "error"])
+BATCH_TASK_PHASE_DURATION = Histogram(
+    "batch_task_phase_duration_seconds",
+    "Time a batch task spends in each phase",
+    ["phase"],
+)
+BATCH_TASKS = Counter("batch_tasks_total", "Processed batch tasks", ["outcome"])
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the SQLAlchemy pool",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+SUMMARY_POSTPROCESS = Counter(
+    "summary_postprocess_total", "Outcome of summary validation", ["outcome"]
+)
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups", ["cache", "result"])
+WRITE_BEHIND_REPLICA_SHORTFALL = Counter(
+    "batch_outcome_replica_shortfall_total",
+    "Outcomes pushed to the stream before enough replicas acknowledged them",
+)
+
+
+class QueueDepthCollector(Collector):
+    """Reads the broker queue length at scrape time"""
+
+    def collect(self):
+        from app.core.redis import get_redis
+
+        gauge = GaugeMetricFamily(
+            "celery_queue_depth", "Messages waiting in the broker", labels=["queue"]
+        )
+        try:
+            gauge.add_metric(["celery"], get_redis().llen("celery"))
+        except Exception:
+            pass
+        yield gauge
+
+
+@contextmanager
+def track_phase(phase: str):
+    """Time a block as one phase of a batch task"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        BATCH_TASK_PHASE_DURATION.labels(phase).observe(time.perf_counter() - start)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def build_registry() -> CollectorRegistry:
+    """Registry to export: aggregated over processes in multiprocess mode"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return registry
+
+
+_exposition_registry: CollectorRegistry | None = None
+
+
+def render_latest() -> tuple[bytes, str]:
+    """Render the metrics for the /metrics endpoint"""
+    global _exposition_registry
+    if _exposition_registry is None:
+        _exposition_registry = build_registry()
+        _exposition_registry.register(QueueDepthCollector())
+    return generate_latest(_exposition_registry), CONTENT_TYPE_LATEST
+
+
+def start_worker_exporter(port: int) -> None:
+    """Serve worker metrics over HTTP from the worker's main process"""
+    registry = build_registry()
+    registry.register(QueueDepthCollector())
+    start_http_server(port, registry=registry)
@@ -0,0 +1,15 @@
+from functools import lru_cache
+
+import redis
+
+from app.core.config import settings
+
+
+@lru_cache
+def get_redis() -> redis.Redis:
+    """Process-wide Redis client, so the connection pool is shared"""
+    return redis.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        decode_responses=True,
+    )
@@ -0,0 +1,51 @@
+"""
+Compact deltas between two versions of a text, for the summary history.
+
+Texts are split into words, each with its trailing whitespace, and a delta is
+a JSON list of operations on the words of the old version: a positive number
+copies that many words, a negative one skips them and a string is inserted as
+is. A one-word fix to a summary is stored as e.g. `[14,-1,"learners ",22]`.
+"""
+
+import re
+from difflib import SequenceMatcher
+
+import orjson
+
+_WORDS = re.compile(r"\S+\s*|\s+")
+
+
+def _words(text: str) -> list[str]:
+    return _WORDS.findall(text)
+
+
+def diff(old: str, new: str) -> str:
+    """Delta that turns `old` into `new`"""
+    old_words, new_words = _words(old), _words(new)
+    matcher = SequenceMatcher(None, old_words, new_words, autojunk=False)
+    ops: list[int | str] = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append(i2 - i1)
+            continue
+        if i2 > i1:
+            ops.append(i1 - i2)
+        if j2 > j1:
+            ops.append("".join(new_words[j1:j2]))
+    return orjson.dumps(ops).decode()
+
+
+def patch(old: str, delta: str) -> str:
+    """Apply a delta made by diff() to `old`"""
+    old_words = _words(old)
+    position = 0
+    parts = []
+    for op in orjson.loads(delta):
+        if isinstance(op, str):
+            parts.append(op)
+        elif op > 0:
+            parts.append("".join(old_words[position : position + op]))
+            position += op
+        else:
+            position -= op
+    return "".join(parts)
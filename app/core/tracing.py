@@ -0,0 +1,86 @@
+"""
+OpenTelemetry tracing for the API, the Celery workers and the pull worker.
+
+Tracing is optional: it needs OTEL_ENABLED=true and the `tracing` extra
+installed. The Celery instrumentation carries the trace context in the task
+headers, so a /batch/ request, process_batch_job and every process_batch_task
+it enqueues end up in one trace, together with their SQL statements and LLM
+calls.
+"""
+
+import logging
+from contextlib import contextmanager, nullcontext
+
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+_tracer = None
+
+
+def setup_tracing(component: str, app=None) -> None:
+    """
+    Configure the tracer provider and instrument Celery and SQLAlchemy, plus
+    the FastAPI app when one is given. Call once per process, after forking.
+    """
+    global _tracer
+    if not settings.OTEL_ENABLED or _tracer is not None:
+        return
+
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import (
+            OTLPSpanExporter,
+        )
+        from opentelemetry.instrumentation.celery import CeleryInstrumentor
+        from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    except ImportError:
+        logger.warning("OTEL_ENABLED is set but the tracing extra is not installed")
+        return
+
+    from app.core.db import engine
+
+    provider = TracerProvider(
+        resource=Resource.create(
+            {
+                "service.name": settings.OTEL_SERVICE_NAME,
+                "service.namespace": "ai-summary",
+                "service.instance.component": component,
+            }
+        ),
+        # Follow the caller's decision so a trace is never sampled halfway
+        sampler=ParentBased(TraceIdRatioBased(settings.OTEL_SAMPLE_RATIO)),
+    )
+    provider.add_span_processor(
+        BatchSpanProcessor(
+            OTLPSpanExporter(endpoint=settings.OTEL_EXPORTER_OTLP_ENDPOINT)
+        )
+    )
+    trace.set_tracer_provider(provider)
+
+    CeleryInstrumentor().instrument()
+    SQLAlchemyInstrumentor().instrument(engine=engine)
+    if app is not None:
+        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+
+        FastAPIInstrumentor.instrument_app(app, excluded_urls="metrics")
+
+    _tracer = trace.get_tracer("app")
+
+
+def start_span(name: str, **attributes):
+    """Span around a block of work; a no-op when tracing is not set up"""
+    if _tracer is None:
+        return nullcontext()
+    return _span(name, attributes)
+
+
+@contextmanager
+def _span(name: str, attributes: dict):
+    with _tracer.start_as_current_span(name, attributes=attributes) as span:
+        yield span
@@ -0,0 +1,38 @@
+"""
+The pgvector `vector` column type, without a dependency on the pgvector
+package. Values are lists of floats, sent and read in pgvector's text format.
+"""
+
+from sqlalchemy import Float
+from sqlalchemy.types import UserDefinedType
+
+
+class Vector(UserDefinedType):
+    cache_ok = True
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+
+    def get_col_spec(self, **kw) -> str:
+        return f"vector({self.dimensions})"
+
+    def bind_processor(self, dialect):
+        def process(value: list[float] | None) -> str | None:
+            if value is None:
+                return None
+            return "[" + ",".join(str(float(x)) for x in value) + "]"
+
+        return process
+
+    def result_processor(self, dialect, coltype):
+        def process(value: str | None) -> list[float] | None:
+            if value is None:
+                return None
+            return [float(x) for x in value[1:-1].split(",")]
+
+        return process
+
+    class comparator_factory(UserDefinedType.Comparator):
+        def cosine_distance(self, other):
+            """`<=>`, served by an HNSW index with vector_cosine_ops"""
+            return self.op("<=>", return_type=Float)(other)
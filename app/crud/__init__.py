@@ -1,11 +1,37 @@
 from .auth import authenticate
 from .users import create_user, get_user_by_id, get_user_by_email
-from .courses import create_course, get_course_by_id
+from .courses import (
+    create_course,
+    get_course_by_id,
+    get_course_version,
+    get_user_courses,
+    get_user_courses_version,
+)
+from .revisions import get_summary_revision, get_summary_revisions
 from .batch import (
+    apply_task_outcomes,
+    cancel_batch_job,
+    claim_batch_task,
+    claim_batch_tasks,
+    complete_batch_task,
+    count_filtered_courses,
+    count_pending_tasks,
     create_batch_job,
+    create_batch_job_from_filter,
+    defer_batch_task,
+    extend_task_leases,
+    fail_batch_task,
+    finalize_batch_jobs,
     get_batch_job,
     get_batch_jobs,
     get_batch_tasks,
+    get_batch_tasks_version,
+    get_pending_tasks,
+    get_stale_course_ids,
+    reap_stale_tasks,
+    release_batch_task,
+    sum_description_tokens,
+    transition_batch_job,
     update_batch_job_status,
     update_task_status,
 )
@@ -17,10 +43,34 @@ __all__ = [
     "get_user_by_email",
     "create_course",
     "get_course_by_id",
+    "get_course_version",
+    "get_user_courses",
+    "get_user_courses_version",
+    "get_summary_revision",
+    "get_summary_revisions",
+    "apply_task_outcomes",
+    "cancel_batch_job",
+    "claim_batch_task",
+    "claim_batch_tasks",
+    "complete_batch_task",
+    "count_filtered_courses",
+    "count_pending_tasks",
     "create_batch_job",
+    "create_batch_job_from_filter",
+    "defer_batch_task",
+    "extend_task_leases",
+    "fail_batch_task",
+    "finalize_batch_jobs",
     "get_batch_job",
     "get_batch_jobs",
     "get_batch_tasks",
+    "get_batch_tasks_version",
+    "get_pending_tasks",
+    "get_stale_course_ids",
+    "reap_stale_tasks",
+    "release_batch_task",
+    "sum_description_tokens",
+    "transition_batch_job",
     "update_batch_job_status",
     "update_task_status",
 ]
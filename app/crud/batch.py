@@ -1,9 +1,35 @@
-from datetime import datetime, UTC
+from datetime import datetime, timedelta, UTC
 from typing import Any
 
+from sqlalchemy import (
+    Integer,
+    Row,
+    String,
+    and_,
+    case,
+    cast,
+    column,
+    func,
+    insert,
+    literal,
+    or_,
+    update,
+    values,
+)
 from sqlmodel import Session, select
 
-from app.models import BatchJob, BatchTask, BatchStatus, Course, BatchJobCreate
+from app.crud.revisions import lock_course_summaries, new_summary_revision
+from app.crud.search import summary_vector, update_summary_vector
+from app.models import (
+    BatchJob,
+    BatchTask,
+    BatchStatus,
+    Course,
+    CourseSearch,
+    BatchJobCreate,
+    BatchTaskPublic,
+    CourseFilter,
+)
 
 
 def create_batch_job(
@@ -17,6 +43,9 @@ def create_batch_job(
     batch_job = BatchJob(
         user_id=user_id, name=batch_in.name, total_tasks=len(batch_in.course_ids)
     )
+    # Nothing to process, e.g. every course in a "stale" batch is up to date
+    if not batch_in.course_ids:
+        batch_job.status = BatchStatus.COMPLETED
     session.add(batch_job)
     session.flush()
 
@@ -29,6 +58,112 @@ def create_batch_job(
     return batch_job
 
 
+def create_batch_job_from_filter(
+    *,
+    session: Session,
+    name: str,
+    user_id: int,
+    course_filter: CourseFilter,
+    model: str | None = None,
+    prompt_versions: list[str] | None = None,
+) -> BatchJob:
+    """
+    Create a batch job for the user's courses matching a filter.
+
+    The tasks are created by a single INSERT ... SELECT, so the course IDs
+    never leave the database. A job without matching courses is created as
+    completed.
+
+    Args:
+        session: Database session
+        name: Name of the batch job
+        user_id: ID of the user who owns the courses
+        course_filter: Which courses to include
+        model: With prompt_versions, only include courses without a current
+            summary from this model
+        prompt_versions: The current prompt versions
+
+    Returns:
+        The new batch job
+    """
+    batch_job = BatchJob(user_id=user_id, name=name)
+    session.add(batch_job)
+    session.flush()
+
+    now = datetime.now(UTC)
+    courses = select(
+        literal(batch_job.id),
+        Course.id,
+        literal(BatchStatus.PENDING, BatchTask.status.type),
+        literal(""),
+        literal(now),
+        literal(now),
+    ).where(*_filter_conditions(user_id, course_filter, model, prompt_versions))
+    total = session.exec(
+        insert(BatchTask).from_select(
+            [
+                BatchTask.batch_job_id,
+                BatchTask.course_id,
+                BatchTask.status,
+                BatchTask.error,
+                BatchTask.created_at,
+                BatchTask.updated_at,
+            ],
+            courses,
+        )
+    ).rowcount
+
+    batch_job.total_tasks = total
+    if not total:
+        batch_job.status = BatchStatus.COMPLETED
+    session.add(batch_job)
+    session.commit()
+    session.refresh(batch_job)
+    return batch_job
+
+
+def count_filtered_courses(
+    *,
+    session: Session,
+    user_id: int,
+    course_filter: CourseFilter,
+    cap: int,
+    model: str | None = None,
+    prompt_versions: list[str] | None = None,
+) -> tuple[int, int]:
+    """
+    Count the courses a filter-based batch job would include.
+
+    Returns:
+        The number of courses and their description tokens, each counted at
+        most `cap` tokens
+    """
+    statement = select(
+        func.count(),
+        func.coalesce(func.sum(func.least(Course.description_tokens, cap)), 0),
+    ).where(*_filter_conditions(user_id, course_filter, model, prompt_versions))
+    courses, description_tokens = session.exec(statement).one()
+    return courses, description_tokens
+
+
+def _filter_conditions(
+    user_id: int,
+    course_filter: CourseFilter,
+    model: str | None,
+    prompt_versions: list[str] | None,
+) -> list:
+    conditions = [Course.user_id == user_id]
+    if course_filter.status is not None:
+        conditions.append(Course.status == course_filter.status)
+    if course_filter.created_after is not None:
+        conditions.append(Course.created_at > course_filter.created_after)
+    if course_filter.created_before is not None:
+        conditions.append(Course.created_at < course_filter.created_before)
+    if model is not None and prompt_versions is not None:
+        conditions.append(_stale_condition(model, prompt_versions))
+    return conditions
+
+
 def get_batch_job(
     *, session: Session, batch_job_id: int, user_id: int
 ) -> BatchJob | None:
@@ -45,10 +180,46 @@ def get_batch_jobs(*, session: Session, user_id: int) -> list[BatchJob]:
     return session.exec(statement).all()
 
 
-def get_batch_tasks(*, session: Session, batch_job_id: int) -> list[BatchTask]:
-    """Get all tasks for a batch job"""
-    statement = select(BatchTask).where(BatchTask.batch_job_id == batch_job_id)
-    return session.exec(statement).all()
+def get_batch_tasks(*, session: Session, batch_job_id: int) -> list[dict]:
+    """
+    Get all tasks for a batch job, completed ones with their course's summary.
+
+    Returns:
+        Dicts with the fields of BatchTaskPublic, built straight from the
+        selected columns so large jobs don't need a model per row
+    """
+    columns = [
+        getattr(BatchTask, name)
+        for name in BatchTaskPublic.model_fields
+        if name != "result"
+    ]
+    statement = (
+        select(*columns, Course.ai_summary)
+        .join(Course, Course.id == BatchTask.course_id)
+        .where(BatchTask.batch_job_id == batch_job_id)
+        .order_by(BatchTask.id)
+    )
+    tasks = []
+    for row in session.exec(statement).mappings():
+        task = dict(row)
+        ai_summary = task.pop("ai_summary")
+        task["result"] = ai_summary if task["status"] == BatchStatus.COMPLETED else ""
+        tasks.append(task)
+    return tasks
+
+
+def get_batch_tasks_version(*, session: Session, batch_job_id: int) -> datetime | None:
+    """
+    Latest updated_at of the courses of a job's tasks; together with the job's
+    own updated_at it versions the task list of a finished job, whose results
+    are read from the courses
+    """
+    statement = (
+        select(func.max(Course.updated_at))
+        .join(BatchTask, BatchTask.course_id == Course.id)
+        .where(BatchTask.batch_job_id == batch_job_id)
+    )
+    return session.exec(statement).one()
 
 
 def update_batch_job_status(
@@ -67,15 +238,132 @@ def update_batch_job_status(
     return job
 
 
+def transition_batch_job(
+    *,
+    session: Session,
+    batch_job_id: int,
+    from_statuses: list[BatchStatus],
+    to_status: BatchStatus,
+) -> bool:
+    """
+    Move a job to `to_status` if it is currently in one of `from_statuses`.
+
+    Returns:
+        bool: False if the job does not exist or was in another status
+    """
+    statement = (
+        update(BatchJob)
+        .where(BatchJob.id == batch_job_id, BatchJob.status.in_(from_statuses))
+        .values(status=to_status, updated_at=datetime.now(UTC))
+    )
+    moved = session.exec(statement).rowcount > 0
+    session.commit()
+    return moved
+
+
+def cancel_batch_job(*, session: Session, batch_job_id: int) -> int | None:
+    """
+    Cancel an unfinished job and all of its tasks that have not started.
+
+    Tasks already being processed are left to their worker.
+
+    Returns:
+        The number of cancelled tasks, or None if the job had already finished
+    """
+    now = datetime.now(UTC)
+    statement = (
+        update(BatchJob)
+        .where(
+            BatchJob.id == batch_job_id,
+            BatchJob.status.in_(
+                [BatchStatus.PENDING, BatchStatus.PROCESSING, BatchStatus.PAUSED]
+            ),
+        )
+        .values(status=BatchStatus.CANCELLED, updated_at=now)
+    )
+    if session.exec(statement).rowcount == 0:
+        session.rollback()
+        return None
+
+    cancelled = session.exec(
+        update(BatchTask)
+        .where(
+            BatchTask.batch_job_id == batch_job_id,
+            BatchTask.status == BatchStatus.PENDING,
+        )
+        .values(status=BatchStatus.CANCELLED, updated_at=now)
+    ).rowcount
+    session.commit()
+    return cancelled
+
+
+def get_pending_tasks(
+    *,
+    session: Session,
+    batch_job_id: int | None = None,
+    task_ids: list[int] | None = None,
+) -> list[Row]:
+    """
+    Get the tasks of a job, or the given tasks, that have not been claimed yet,
+    with what the scheduler needs to know about them
+
+    Returns:
+        list: Rows of id, batch_job_id, user_id and description_tokens, in ID
+            order
+    """
+    statement = (
+        select(
+            BatchTask.id,
+            BatchTask.batch_job_id,
+            Course.user_id,
+            Course.description_tokens,
+        )
+        .join(Course, Course.id == BatchTask.course_id)
+        .where(BatchTask.status == BatchStatus.PENDING)
+        .order_by(BatchTask.id)
+    )
+    if batch_job_id is not None:
+        statement = statement.where(BatchTask.batch_job_id == batch_job_id)
+    if task_ids is not None:
+        statement = statement.where(BatchTask.id.in_(task_ids))
+    return session.exec(statement).all()
+
+
+def count_pending_tasks(*, session: Session, limit: int) -> int:
+    """
+    Count the tasks that pull workers could claim, i.e. pending tasks of jobs
+    that are not paused or cancelled
+
+    Args:
+        limit: Stop counting past this many, so a deep backlog stays cheap
+
+    Returns:
+        int: Number of claimable tasks, at most limit + 1
+    """
+    pending = (
+        select(BatchTask.id)
+        .where(
+            BatchTask.status == BatchStatus.PENDING,
+            BatchTask.batch_job_id.not_in(
+                select(BatchJob.id).where(
+                    BatchJob.status.in_([BatchStatus.PAUSED, BatchStatus.CANCELLED])
+                )
+            ),
+        )
+        .limit(limit + 1)
+        .subquery()
+    )
+    return session.exec(select(func.count()).select_from(pending)).one()
+
+
 def update_task_status(
     *,
     session: Session,
     task_id: int,
     status: BatchStatus,
-    result: str | None = None,
     error: str | None = None,
 ) -> BatchTask | None:
-    """Update the status and potentially the result of a task"""
+    """Update the status and potentially the error of a task"""
     task = session.get(BatchTask, task_id)
     if not task:
         return None
@@ -83,9 +371,6 @@ def update_task_status(
     task.status = status
     task.updated_at = datetime.now(UTC)
 
-    if result is not None:
-        task.result = result
-
     if error is not None:
         task.error = error
 
@@ -126,3 +411,699 @@ def verify_course_ownership(*, session: Session, course_id: int, user_id: int) -
     statement = select(Course).where(Course.id == course_id, Course.user_id == user_id)
     course = session.exec(statement).first()
     return course is not None
+
+
+def get_stale_course_ids(
+    *, session: Session, course_ids: list[int], model: str, prompt_versions: list[str]
+) -> list[int]:
+    """
+    Filter course IDs down to the courses whose summary is out of date.
+
+    A summary is current when it was generated from the course's present
+    description with the given model and one of the active prompt versions, or
+    when it was written or edited by hand; everything else, including courses
+    that were never summarized, is stale.
+
+    Args:
+        session: Database session
+        course_ids: IDs of the candidate courses
+        model: Model the summaries should come from
+        prompt_versions: Prompt versions the summaries may come from
+
+    Returns:
+        The IDs of the stale courses, in ID order
+    """
+    if not course_ids:
+        return []
+
+    statement = (
+        select(Course.id)
+        .where(Course.id.in_(course_ids), _stale_condition(model, prompt_versions))
+        .order_by(Course.id)
+    )
+    return list(session.exec(statement).all())
+
+
+def _stale_condition(model: str, prompt_versions: list[str]):
+    return and_(
+        # Hand-written summaries have no prompt version and are never replaced
+        or_(Course.ai_summary == "", Course.summary_prompt_version.is_not(None)),
+        or_(
+            Course.summary_source_hash.is_distinct_from(Course.description_hash),
+            Course.summary_model.is_distinct_from(model),
+            Course.summary_prompt_version.not_in(prompt_versions),
+        ),
+    )
+
+
+def sum_description_tokens(*, session: Session, course_ids: list[int], cap: int) -> int:
+    """
+    Total description tokens of the courses, each counted at most `cap` tokens
+    since longer descriptions are truncated or chunked before summarizing
+    """
+    if not course_ids:
+        return 0
+
+    statement = select(
+        func.coalesce(func.sum(func.least(Course.description_tokens, cap)), 0)
+    ).where(Course.id.in_(course_ids))
+    return session.exec(statement).one()
+
+
+def claim_batch_task(
+    *, session: Session, task_id: int, lease_seconds: int
+) -> Row | None:
+    """
+    Claim a pending task and fetch the course description in one statement.
+
+    The task is moved to PROCESSING with an UPDATE ... FROM course ... RETURNING,
+    so a task that is already claimed (or finished) is never processed twice.
+
+    Args:
+        session: Database session
+        task_id: ID of the task to claim
+        lease_seconds: How long the claim is valid without a heartbeat
+
+    Returns:
+        A row with id, batch_job_id, course_id, attempts, user_id and
+        description, or None if the task does not exist or is not pending
+    """
+    claimed = _claim(
+        session=session,
+        condition=and_(
+            BatchTask.id == task_id, BatchTask.status == BatchStatus.PENDING
+        ),
+        lease_seconds=lease_seconds,
+    )
+    return claimed[0] if claimed else None
+
+
+def claim_batch_tasks(
+    *, session: Session, limit: int, lease_seconds: int, max_attempts: int
+) -> list[Row]:
+    """
+    Claim up to `limit` tasks for a pull-based worker.
+
+    Pending tasks and tasks whose lease has expired are locked with
+    FOR UPDATE SKIP LOCKED, so concurrent workers never claim the same row.
+    Tasks of paused and cancelled jobs are skipped.
+
+    Args:
+        session: Database session
+        limit: Maximum number of tasks to claim
+        lease_seconds: How long the claim is valid without a heartbeat
+        max_attempts: Tasks that have been claimed this many times are skipped
+
+    Returns:
+        Rows with id, batch_job_id, course_id, attempts, user_id and description
+    """
+    now = datetime.now(UTC)
+    claimable = (
+        select(BatchTask.id)
+        .where(
+            or_(
+                BatchTask.status == BatchStatus.PENDING,
+                and_(
+                    BatchTask.status == BatchStatus.PROCESSING,
+                    BatchTask.lease_expires_at < now,
+                ),
+            ),
+            BatchTask.attempts < max_attempts,
+            BatchTask.batch_job_id.not_in(
+                select(BatchJob.id).where(
+                    BatchJob.status.in_([BatchStatus.PAUSED, BatchStatus.CANCELLED])
+                )
+            ),
+        )
+        .order_by(BatchTask.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return _claim(
+        session=session,
+        condition=BatchTask.id.in_(claimable),
+        lease_seconds=lease_seconds,
+    )
+
+
+def extend_task_leases(
+    *, session: Session, task_ids: list[int], lease_seconds: int
+) -> int:
+    """
+    Heartbeat: push back the lease of tasks the caller is still processing.
+
+    Returns:
+        int: Number of leases extended
+    """
+    if not task_ids:
+        return 0
+
+    now = datetime.now(UTC)
+    statement = (
+        update(BatchTask)
+        .where(BatchTask.id.in_(task_ids), BatchTask.status == BatchStatus.PROCESSING)
+        .values(lease_expires_at=now + timedelta(seconds=lease_seconds))
+    )
+    extended = session.exec(statement).rowcount
+    session.commit()
+    return extended
+
+
+def _claim(*, session: Session, condition, lease_seconds: int) -> list[Row]:
+    """Move the matching tasks to PROCESSING under a fresh lease"""
+    now = datetime.now(UTC)
+    statement = (
+        update(BatchTask)
+        .where(condition, BatchTask.course_id == Course.id)
+        .values(
+            status=BatchStatus.PROCESSING,
+            attempts=BatchTask.attempts + 1,
+            lease_expires_at=now + timedelta(seconds=lease_seconds),
+            updated_at=now,
+        )
+        .returning(
+            BatchTask.id,
+            BatchTask.batch_job_id,
+            BatchTask.course_id,
+            BatchTask.attempts,
+            Course.user_id,
+            Course.description,
+        )
+    )
+    claimed = session.exec(statement).all()
+    session.commit()
+    return claimed
+
+
+def complete_batch_task(
+    *,
+    session: Session,
+    task_id: int,
+    batch_job_id: int,
+    course_id: int,
+    result: str,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+    llm_calls: int = 1,
+    postprocess_outcome: str = "",
+    summary_model: str | None = None,
+    summary_prompt_version: str | None = None,
+    summary_source_hash: str | None = None,
+) -> bool:
+    """
+    Store the course summary with its provenance and history, the task outcome
+    with its token usage and the job progress in a single transaction. The
+    summary is only stored on the course, not duplicated on the task.
+
+    Returns:
+        bool: False if the task was no longer in PROCESSING and nothing was written
+    """
+    now = datetime.now(UTC)
+    statement = (
+        update(BatchTask)
+        .where(BatchTask.id == task_id, BatchTask.status == BatchStatus.PROCESSING)
+        .values(
+            status=BatchStatus.COMPLETED,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            llm_calls=llm_calls,
+            postprocess_outcome=postprocess_outcome,
+            updated_at=now,
+        )
+    )
+    if session.exec(statement).rowcount == 0:
+        session.rollback()
+        return False
+
+    previous, revision = lock_course_summaries(session=session, course_ids=[course_id])[
+        course_id
+    ]
+    if result != previous:
+        revision += 1
+        update_summary_vector(session=session, course_id=course_id, ai_summary=result)
+        session.add(
+            new_summary_revision(
+                course_id=course_id,
+                revision=revision,
+                previous=previous,
+                text=result,
+                source="batch",
+                summary_model=summary_model,
+                summary_prompt_version=summary_prompt_version,
+                summary_source_hash=summary_source_hash,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+            )
+        )
+    session.exec(
+        update(Course)
+        .where(Course.id == course_id)
+        .values(
+            ai_summary=result,
+            status="draft",
+            updated_at=now,
+            summary_model=summary_model,
+            summary_prompt_version=summary_prompt_version,
+            summary_source_hash=summary_source_hash,
+            summary_revision=revision,
+        )
+    )
+    _advance_job_progress(session=session, batch_job_id=batch_job_id, now=now)
+    session.commit()
+    return True
+
+
+def apply_task_outcomes(*, session: Session, outcomes: list[dict]) -> int:
+    """
+    Write a batch of buffered task outcomes in one transaction: one multi-row
+    UPDATE for the tasks, one each for the summaries of their courses and their
+    search documents, one INSERT for the summary history and one UPDATE per job
+    for its progress. Outcomes of tasks that are no longer
+    PROCESSING, because they were reaped or already written, are skipped, so
+    writing a batch twice is harmless.
+
+    Args:
+        outcomes: Dicts with task_id, batch_job_id, course_id, status
+            (COMPLETED or FAILED), result, error, token counts, llm_calls,
+            postprocess_outcome and the summary provenance
+
+    Returns:
+        int: Number of tasks written
+    """
+    if not outcomes:
+        return 0
+
+    now = datetime.now(UTC)
+    by_task = {outcome["task_id"]: outcome for outcome in outcomes}
+    task_rows = values(
+        column("id", Integer),
+        column("status", String),
+        column("error", String),
+        column("prompt_tokens", Integer),
+        column("completion_tokens", Integer),
+        column("llm_calls", Integer),
+        column("postprocess_outcome", String),
+        name="outcome",
+    ).data(
+        [
+            (
+                task_id,
+                outcome["status"].name,
+                outcome["error"],
+                outcome["prompt_tokens"],
+                outcome["completion_tokens"],
+                outcome["llm_calls"],
+                outcome["postprocess_outcome"],
+            )
+            # Same order in every flush, so concurrent flushes can't deadlock
+            for task_id, outcome in sorted(by_task.items())
+        ]
+    )
+    written = (
+        session.exec(
+            update(BatchTask)
+            .where(
+                BatchTask.id == task_rows.c.id,
+                BatchTask.status == BatchStatus.PROCESSING,
+            )
+            .values(
+                status=cast(task_rows.c.status, BatchTask.status.type),
+                error=task_rows.c.error,
+                prompt_tokens=task_rows.c.prompt_tokens,
+                completion_tokens=task_rows.c.completion_tokens,
+                llm_calls=task_rows.c.llm_calls,
+                postprocess_outcome=task_rows.c.postprocess_outcome,
+                updated_at=now,
+            )
+            .returning(BatchTask.id)
+        )
+        .scalars()
+        .all()
+    )
+
+    completed = [
+        by_task[task_id]
+        for task_id in sorted(written)
+        if by_task[task_id]["status"] == BatchStatus.COMPLETED
+    ]
+    if completed:
+        current = lock_course_summaries(
+            session=session,
+            course_ids=[outcome["course_id"] for outcome in completed],
+        )
+        # A course summarized by several tasks of the flush gets a revision for
+        # each, in task order, and keeps the last summary
+        latest: dict[int, tuple[dict, int]] = {}
+        for outcome in completed:
+            course_id = outcome["course_id"]
+            previous, revision = current[course_id]
+            if outcome["result"] != previous:
+                revision += 1
+                session.add(
+                    new_summary_revision(
+                        course_id=course_id,
+                        revision=revision,
+                        previous=previous,
+                        text=outcome["result"],
+                        source="batch",
+                        summary_model=outcome["summary_model"],
+                        summary_prompt_version=outcome["summary_prompt_version"],
+                        summary_source_hash=outcome["summary_source_hash"],
+                        prompt_tokens=outcome["prompt_tokens"],
+                        completion_tokens=outcome["completion_tokens"],
+                    )
+                )
+            current[course_id] = (outcome["result"], revision)
+            latest[course_id] = (outcome, revision)
+
+        course_rows = values(
+            column("id", Integer),
+            column("ai_summary", Course.ai_summary.type),
+            column("summary_model", String),
+            column("summary_prompt_version", String),
+            column("summary_source_hash", String),
+            column("summary_revision", Integer),
+            column("summary_text", String),  # Plain, for the search index
+            name="summary",
+        ).data(
+            [
+                (
+                    course_id,
+                    outcome["result"],
+                    outcome["summary_model"],
+                    outcome["summary_prompt_version"],
+                    outcome["summary_source_hash"],
+                    revision,
+                    outcome["result"],
+                )
+                for course_id, (outcome, revision) in sorted(latest.items())
+            ]
+        )
+        session.exec(
+            update(Course)
+            .where(Course.id == course_rows.c.id)
+            .values(
+                ai_summary=course_rows.c.ai_summary,
+                status="draft",
+                summary_model=course_rows.c.summary_model,
+                summary_prompt_version=course_rows.c.summary_prompt_version,
+                summary_source_hash=course_rows.c.summary_source_hash,
+                summary_revision=course_rows.c.summary_revision,
+                updated_at=now,
+            )
+        )
+        session.exec(
+            update(CourseSearch)
+            .where(CourseSearch.course_id == course_rows.c.id)
+            .values(summary_vector=summary_vector(course_rows.c.summary_text))
+        )
+
+    progress: dict[int, list[int]] = {}
+    for task_id in written:
+        outcome = by_task[task_id]
+        counts = progress.setdefault(outcome["batch_job_id"], [0, 0])
+        counts[0] += 1
+        if outcome["status"] == BatchStatus.FAILED:
+            counts[1] += 1
+    for batch_job_id, (finished, failed) in sorted(progress.items()):
+        _advance_job_progress(
+            session=session,
+            batch_job_id=batch_job_id,
+            now=now,
+            finished=finished,
+            failed=failed,
+        )
+
+    session.commit()
+    return len(written)
+
+
+def release_batch_task(
+    *, session: Session, task_id: int, status: BatchStatus = BatchStatus.PENDING
+) -> bool:
+    """
+    Give up a claimed task before calling the LLM: back to PENDING without
+    using up an attempt when its job was paused, or CANCELLED.
+
+    Returns:
+        bool: False if the task was no longer in PROCESSING
+    """
+    values = {
+        "status": status,
+        "lease_expires_at": None,
+        "updated_at": datetime.now(UTC),
+    }
+    if status == BatchStatus.PENDING:
+        values["attempts"] = BatchTask.attempts - 1
+
+    statement = (
+        update(BatchTask)
+        .where(BatchTask.id == task_id, BatchTask.status == BatchStatus.PROCESSING)
+        .values(**values)
+    )
+    released = session.exec(statement).rowcount > 0
+    session.commit()
+    return released
+
+
+def defer_batch_task(
+    *,
+    session: Session,
+    task_id: int,
+    delay_seconds: float,
+    error: str,
+    refund_attempt: bool = False,
+) -> bool:
+    """
+    Retry a claimed task later. It stays PROCESSING under a lease that ends
+    after `delay_seconds`, and reap_stale_tasks requeues it once that lease has
+    expired.
+
+    Args:
+        refund_attempt: Don't count this claim as an attempt, for tasks given
+            back without calling the LLM
+
+    Returns:
+        bool: False if the task was no longer in PROCESSING
+    """
+    now = datetime.now(UTC)
+    values = {
+        "lease_expires_at": now + timedelta(seconds=delay_seconds),
+        "error": error,
+        "updated_at": now,
+    }
+    if refund_attempt:
+        values["attempts"] = BatchTask.attempts - 1
+
+    statement = (
+        update(BatchTask)
+        .where(BatchTask.id == task_id, BatchTask.status == BatchStatus.PROCESSING)
+        .values(**values)
+    )
+    deferred = session.exec(statement).rowcount > 0
+    session.commit()
+    return deferred
+
+
+def fail_batch_task(*, session: Session, task_id: int, error: str) -> bool:
+    """
+    Mark an unfinished task as failed and count it towards the job progress.
+
+    Returns:
+        bool: False if the task does not exist or has already finished
+    """
+    now = datetime.now(UTC)
+    statement = (
+        update(BatchTask)
+        .where(
+            BatchTask.id == task_id,
+            BatchTask.status.in_([BatchStatus.PENDING, BatchStatus.PROCESSING]),
+        )
+        .values(status=BatchStatus.FAILED, error=error, updated_at=now)
+        .returning(BatchTask.batch_job_id)
+    )
+    batch_job_id = session.exec(statement).scalar()
+    if batch_job_id is None:
+        session.rollback()
+        return False
+
+    _advance_job_progress(session=session, batch_job_id=batch_job_id, now=now, failed=1)
+    session.commit()
+    return True
+
+
+def reap_stale_tasks(
+    *,
+    session: Session,
+    max_attempts: int,
+    limit: int,
+    exclude: list[int] | None = None,
+) -> tuple[list[int], int]:
+    """
+    Release tasks whose lease expired while PROCESSING, e.g. after a worker crash.
+
+    Tasks with attempts left go back to PENDING; the others are failed. At most
+    `limit` tasks are handled per call, and rows locked by a live worker are
+    skipped. Job counters are left to finalize_batch_jobs.
+
+    Args:
+        exclude: IDs of tasks that finished but whose outcome is still waiting
+            to be written, which must not run again
+
+    Returns:
+        The IDs of the requeued tasks and the number of failed tasks
+    """
+    now = datetime.now(UTC)
+    stale = (
+        select(BatchTask.id)
+        .where(
+            BatchTask.status == BatchStatus.PROCESSING,
+            BatchTask.lease_expires_at < now,
+            BatchTask.id.not_in(exclude or []),
+        )
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+
+    requeued = (
+        session.exec(
+            update(BatchTask)
+            .where(BatchTask.id.in_(stale.where(BatchTask.attempts < max_attempts)))
+            .values(status=BatchStatus.PENDING, lease_expires_at=None, updated_at=now)
+            .returning(BatchTask.id)
+        )
+        .scalars()
+        .all()
+    )
+
+    failed = session.exec(
+        update(BatchTask)
+        .where(BatchTask.id.in_(stale.where(BatchTask.attempts >= max_attempts)))
+        .values(
+            status=BatchStatus.FAILED,
+            error=f"Lease expired after {max_attempts} attempts",
+            lease_expires_at=None,
+            updated_at=now,
+        )
+    ).rowcount
+
+    session.commit()
+    return list(requeued), failed
+
+
+def finalize_batch_jobs(
+    *, session: Session, after_id: int, limit: int
+) -> tuple[int, int | None]:
+    """
+    Recompute progress and final state of unfinished jobs from their tasks.
+
+    Jobs are visited in ID order starting after `after_id`, `limit` at a time,
+    and counted with one grouped query. A job whose tasks have all finished is
+    COMPLETED, or FAILED when none of them succeeded.
+
+    Returns:
+        The number of jobs updated and the last job ID visited, or None when the
+        end of the active jobs was reached
+    """
+    now = datetime.now(UTC)
+    job_ids = session.exec(
+        select(BatchJob.id)
+        .where(
+            BatchJob.status.in_([BatchStatus.PENDING, BatchStatus.PROCESSING]),
+            BatchJob.id > after_id,
+        )
+        .order_by(BatchJob.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not job_ids:
+        session.rollback()
+        return 0, None
+
+    counts = (
+        select(
+            BatchTask.batch_job_id,
+            func.count()
+            .filter(BatchTask.status == BatchStatus.COMPLETED)
+            .label("succeeded"),
+            func.count().filter(BatchTask.status == BatchStatus.FAILED).label("failed"),
+        )
+        .where(BatchTask.batch_job_id.in_(job_ids))
+        .group_by(BatchTask.batch_job_id)
+        .subquery()
+    )
+    finished = counts.c.succeeded + counts.c.failed
+    statement = (
+        update(BatchJob)
+        .where(
+            BatchJob.id == counts.c.batch_job_id,
+            or_(
+                BatchJob.completed_tasks != finished,
+                BatchJob.failed_tasks != counts.c.failed,
+                finished >= BatchJob.total_tasks,
+            ),
+        )
+        .values(
+            completed_tasks=finished,
+            failed_tasks=counts.c.failed,
+            status=case(
+                (
+                    and_(finished >= BatchJob.total_tasks, counts.c.succeeded == 0),
+                    literal(BatchStatus.FAILED, BatchJob.status.type),
+                ),
+                (
+                    finished >= BatchJob.total_tasks,
+                    literal(BatchStatus.COMPLETED, BatchJob.status.type),
+                ),
+                else_=BatchJob.status,
+            ),
+            updated_at=now,
+        )
+    )
+    updated = session.exec(statement).rowcount
+    session.commit()
+
+    last_id = job_ids[-1] if len(job_ids) == limit else None
+    return updated, last_id
+
+
+def _advance_job_progress(
+    *,
+    session: Session,
+    batch_job_id: int,
+    now: datetime,
+    finished: int = 1,
+    failed: int = 0,
+) -> None:
+    """
+    Increment the job counters in place instead of recounting its tasks
+
+    Args:
+        finished: Number of newly finished tasks, failed ones included
+        failed: How many of them failed
+    """
+    failed_tasks = BatchJob.failed_tasks + failed
+    finished = BatchJob.completed_tasks + finished
+    session.exec(
+        update(BatchJob)
+        .where(BatchJob.id == batch_job_id)
+        .values(
+            completed_tasks=finished,
+            failed_tasks=failed_tasks,
+            status=case(
+                (
+                    and_(
+                        finished >= BatchJob.total_tasks,
+                        failed_tasks >= BatchJob.total_tasks,
+                    ),
+                    literal(BatchStatus.FAILED, BatchJob.status.type),
+                ),
+                (
+                    finished >= BatchJob.total_tasks,
+                    literal(BatchStatus.COMPLETED, BatchJob.status.type),
+                ),
+                else_=BatchJob.status,
+            ),
+            updated_at=now,
+        )
+    )
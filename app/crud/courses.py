@@ -1,42 +1,140 @@
+from datetime import datetime, UTC
+
+from sqlalchemy import func
 from sqlmodel import Session, select
+from app.core.config import settings
+from app.core.hashing import text_hash
+from app.crud.revisions import new_summary_revision
+from app.crud.search import index_course, update_summary_vector
 from app.models import Course, CourseCreate
+from app.services import tokens
 
 
 def create_course(*, session: Session, course_in: CourseCreate, user_id: int) -> Course:
-    db_course = Course.model_validate(course_in, update={"user_id": user_id})
+    db_course = Course.model_validate(
+        course_in,
+        update={
+            "user_id": user_id,
+            "description_hash": text_hash(course_in.description),
+            "description_tokens": tokens.count_tokens(
+                course_in.description, settings.LLM_MODEL
+            ),
+        },
+    )
     session.add(db_course)
+    session.flush()
+    index_course(session=session, course=db_course)
     session.commit()
     session.refresh(db_course)
     return db_course
 
 
-def get_course_by_id(*, session: Session, course_id: int) -> Course | None:
+def get_course_by_id(
+    *, session: Session, course_id: int, for_update: bool = False
+) -> Course | None:
     statement = select(Course).where(Course.id == course_id)
+    if for_update:
+        # The course may already be in the identity map from an earlier read;
+        # overwrite it with the row as of the lock, not the cached copy
+        statement = statement.with_for_update().execution_options(
+            populate_existing=True
+        )
     course = session.exec(statement).first()
     return course
 
 
+def get_course_version(
+    *, session: Session, course_id: int
+) -> tuple[int, datetime] | None:
+    """
+    Get the owner and updated_at of a course, to validate a cached copy without
+    loading the course
+
+    Returns:
+        (user_id, updated_at) or None if the course does not exist
+    """
+    statement = select(Course.user_id, Course.updated_at).where(Course.id == course_id)
+    return session.exec(statement).first()
+
+
+def get_user_courses_version(
+    *, session: Session, user_id: int
+) -> tuple[int, datetime | None]:
+    """Number of courses of a user and the latest updated_at among them"""
+    statement = select(func.count(), func.max(Course.updated_at)).where(
+        Course.user_id == user_id
+    )
+    return session.exec(statement).one()
+
+
+def get_user_courses(*, session: Session, user_id: int) -> list[dict]:
+    """
+    Get all courses of a user as plain dicts, for responses rendered without
+    building a model per row
+    """
+    statement = select(*Course.__table__.columns).where(Course.user_id == user_id)
+    return [dict(row) for row in session.exec(statement).mappings()]
+
+
 def update_course_with_summary(
-    *, session: Session, course_id: int, ai_summary: str, finalize: bool = False
+    *,
+    session: Session,
+    course_id: int,
+    ai_summary: str,
+    finalize: bool = False,
+    summary_model: str | None = None,
+    summary_prompt_version: str | None = None,
+    summary_source_hash: str | None = None,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+    edited_by: int | None = None,
 ) -> Course | None:
     """
-    Update a course with an AI-generated summary.
+    Update a course with an AI-generated summary and record it in the summary
+    history.
 
     Args:
         session: Database session
         course_id: ID of the course to update
         ai_summary: The AI-generated summary
         finalize: If True, set status to completed; otherwise, set to draft
+        summary_model: Model that generated the summary
+        summary_prompt_version: Prompt version the summary was generated with
+        summary_source_hash: Hash of the description that was summarized; when
+            not given this is a user edit, which clears the provenance
+        prompt_tokens: Prompt tokens spent on the summary
+        completion_tokens: Completion tokens spent on the summary
+        edited_by: ID of the user whose edit this is
 
     Returns:
         The updated course or None if not found
     """
-    course = get_course_by_id(session=session, course_id=course_id)
+    course = get_course_by_id(session=session, course_id=course_id, for_update=True)
     if not course:
         return None
 
+    if summary_source_hash is not None:
+        _record_summary_change(
+            session,
+            course,
+            ai_summary,
+            source="ai",
+            summary_model=summary_model,
+            summary_prompt_version=summary_prompt_version,
+            summary_source_hash=summary_source_hash,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+        )
+        course.summary_model = summary_model
+        course.summary_prompt_version = summary_prompt_version
+        course.summary_source_hash = summary_source_hash
+    else:
+        _record_summary_change(
+            session, course, ai_summary, source="user", edited_by=edited_by
+        )
     course.ai_summary = ai_summary
     course.status = "completed" if finalize else "draft"
+    course.updated_at = datetime.now(UTC)
     session.add(course)
     session.commit()
     session.refresh(course)
@@ -44,7 +142,11 @@ def update_course_with_summary(
 
 
 def finalize_course_summary(
-    *, session: Session, course_id: int, ai_summary: str = None
+    *,
+    session: Session,
+    course_id: int,
+    ai_summary: str = None,
+    edited_by: int | None = None,
 ) -> Course | None:
     """
     Finalize a course summary, optionally updating the AI summary.
@@ -53,19 +155,53 @@ def finalize_course_summary(
         session: Database session
         course_id: ID of the course to update
         ai_summary: Optional updated AI summary
+        edited_by: ID of the user who edited the summary
 
     Returns:
         The updated course or None if not found
     """
-    course = get_course_by_id(session=session, course_id=course_id)
+    course = get_course_by_id(session=session, course_id=course_id, for_update=True)
     if not course:
         return None
 
     if ai_summary is not None:
+        _record_summary_change(
+            session, course, ai_summary, source="user", edited_by=edited_by
+        )
         course.ai_summary = ai_summary
 
     course.status = "completed"
+    course.updated_at = datetime.now(UTC)
     session.add(course)
     session.commit()
     session.refresh(course)
     return course
+
+
+def _record_summary_change(
+    session: Session, course: Course, ai_summary: str, source: str, **metadata
+) -> None:
+    """
+    Append the new summary of a locked course to its history and re-index it
+    for search, if it changed
+    """
+    if ai_summary == course.ai_summary:
+        return
+    # A hand-written summary has no model or prompt version, which keeps it out
+    # of re-summarization
+    if source == "user":
+        course.summary_model = None
+        course.summary_prompt_version = None
+        course.summary_source_hash = None
+    update_summary_vector(session=session, course_id=course.id, ai_summary=ai_summary)
+    course.summary_revision += 1
+    session.add(
+        new_summary_revision(
+            course_id=course.id,
+            revision=course.summary_revision,
+            previous=course.ai_summary,
+            text=ai_summary,
+            source=source,
+            **metadata,
+        )
+    )
@@ -0,0 +1,96 @@
+"""
+Monthly range partitions of batchjob and batchtask on created_at.
+
+Partitions are named <table>_pYYYYMM and cover one UTC month; rows outside
+every partition land in <table>_default.
+"""
+
+import re
+from datetime import date
+
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from app.models import BatchJob, BatchStatus
+
+PARTITIONED_TABLES = ("batchtask", "batchjob")
+
+_PARTITION_NAME = re.compile(r"^(batchjob|batchtask)_p(\d{4})(\d{2})$")
+
+
+def month_start(day: date, months: int = 0) -> date:
+    """First day of the month `months` after the month of `day`"""
+    month = day.year * 12 + day.month - 1 + months
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+def get_partitions(*, session: Session, table: str) -> list[tuple[str, date]]:
+    """
+    Get the monthly partitions of a table, oldest first.
+
+    Returns:
+        (partition name, first day of its month) pairs; the default partition
+        is not included
+    """
+    rows = session.exec(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = :table"
+        ),
+        params={"table": table},
+    ).all()
+
+    partitions = []
+    for (name,) in rows:
+        match = _PARTITION_NAME.match(name)
+        if match and match.group(1) == table:
+            partitions.append((name, date(int(match.group(2)), int(match.group(3)), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def create_partition(*, session: Session, table: str, month: date) -> str:
+    """Create the partition of a table for one month, if it does not exist yet"""
+    if table not in PARTITIONED_TABLES:
+        raise ValueError(f"{table} is not partitioned")
+
+    name = partition_name(table, month)
+    session.exec(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month}') TO ('{month_start(month, 1)}')"
+        )
+    )
+    session.commit()
+    return name
+
+
+def drop_partition(*, session: Session, table: str, name: str) -> None:
+    """Drop a monthly partition and the rows in it"""
+    match = _PARTITION_NAME.match(name)
+    if not match or match.group(1) != table:
+        raise ValueError(f"{name} is not a partition of {table}")
+
+    session.exec(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+    session.exec(text(f"DROP TABLE {name}"))
+    session.commit()
+
+
+def has_unfinished_jobs(*, session: Session, before: date) -> bool:
+    """Whether any job created before `before` may still change its tasks"""
+    statement = (
+        select(BatchJob.id)
+        .where(
+            BatchJob.created_at < before,
+            BatchJob.status.in_(
+                [BatchStatus.PENDING, BatchStatus.PROCESSING, BatchStatus.PAUSED]
+            ),
+        )
+        .limit(1)
+    )
+    return session.exec(statement).first() is not None
@@ -0,0 +1,86 @@
+from sqlalchemy import Row
+from sqlmodel import Session, select
+
+from app.models import Course, PromptTemplate, PromptTemplateCreate
+
+
+def create_prompt_template(
+    *, session: Session, prompt_in: PromptTemplateCreate
+) -> PromptTemplate:
+    db_prompt = PromptTemplate.model_validate(prompt_in)
+    session.add(db_prompt)
+    session.commit()
+    session.refresh(db_prompt)
+    return db_prompt
+
+
+def get_prompt_template(*, session: Session, version: str) -> PromptTemplate | None:
+    statement = select(PromptTemplate).where(PromptTemplate.version == version)
+    return session.exec(statement).first()
+
+
+def get_prompt_templates(
+    *, session: Session, active_only: bool = False
+) -> list[PromptTemplate]:
+    """Get prompt templates, optionally only those with a non-zero weight"""
+    statement = select(PromptTemplate).order_by(PromptTemplate.id)
+    if active_only:
+        statement = statement.where(PromptTemplate.weight > 0)
+    return session.exec(statement).all()
+
+
+def update_prompt_weight(
+    *, session: Session, version: str, weight: int
+) -> PromptTemplate | None:
+    """Change the traffic share of a prompt; 0 retires it"""
+    prompt = get_prompt_template(session=session, version=version)
+    if not prompt:
+        return None
+
+    prompt.weight = weight
+    session.add(prompt)
+    session.commit()
+    session.refresh(prompt)
+    return prompt
+
+
+def get_outdated_courses(
+    *,
+    session: Session,
+    prompt_versions: list[str],
+    before_id: int | None,
+    limit: int,
+) -> list[Row]:
+    """
+    Get the next chunk of summarized courses whose summary was made with a
+    prompt version other than the given ones.
+
+    Finalized courses and summaries with no prompt version, which were written
+    or edited by hand, are left alone.
+
+    Courses are returned newest first and paged by ID, so the most recently
+    added courses are refreshed first.
+
+    Args:
+        session: Database session
+        prompt_versions: The current prompt versions
+        before_id: Only return courses with a lower ID; None starts at the top
+        limit: Maximum number of courses to return
+
+    Returns:
+        Rows with id and user_id
+    """
+    statement = (
+        select(Course.id, Course.user_id)
+        .where(
+            Course.ai_summary != "",
+            Course.status != "completed",
+            Course.summary_prompt_version.is_not(None),
+            Course.summary_prompt_version.not_in(prompt_versions),
+        )
+        .order_by(Course.id.desc())
+        .limit(limit)
+    )
+    if before_id is not None:
+        statement = statement.where(Course.id < before_id)
+    return session.exec(statement).all()
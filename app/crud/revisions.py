@@ -0,0 +1,138 @@
+from datetime import datetime, UTC
+
+from sqlalchemy import func
+from sqlalchemy.orm import defer
+from sqlmodel import Session, select
+
+from app.core import textdelta
+from app.core.config import settings
+from app.models import Course, SummaryRevision
+
+
+def lock_course_summaries(
+    *, session: Session, course_ids: list[int]
+) -> dict[int, tuple[str, int]]:
+    """
+    Lock courses whose summary is about to change and read their current one,
+    so concurrent writers append their revisions one after the other
+
+    Returns:
+        dict: Course ID -> (ai_summary, summary_revision)
+    """
+    statement = (
+        select(Course.id, Course.ai_summary, Course.summary_revision)
+        .where(Course.id.in_(course_ids))
+        .order_by(Course.id)
+        .with_for_update()
+    )
+    return {
+        course_id: (ai_summary, revision)
+        for course_id, ai_summary, revision in session.exec(statement)
+    }
+
+
+def new_summary_revision(
+    *,
+    course_id: int,
+    revision: int,
+    previous: str,
+    text: str,
+    source: str,
+    **metadata,
+) -> SummaryRevision:
+    """
+    Build the revision that replaces `previous` with `text`. The caller adds it
+    to the session and sets Course.summary_revision in the same transaction.
+
+    Every SUMMARY_REVISION_KEYFRAME_INTERVAL-th revision stores the full text,
+    so rebuilding any version applies fewer deltas than that. So does any
+    revision whose delta would be no smaller than the text.
+
+    Args:
+        revision: Number of the new revision
+        previous: Summary at revision - 1
+        text: New summary
+        source: "ai", "batch" or "user"
+        metadata: Other SummaryRevision fields, e.g. summary_model or edited_by
+
+    Returns:
+        The new revision, not yet added to the session
+    """
+    keyframe = (revision - 1) % settings.SUMMARY_REVISION_KEYFRAME_INTERVAL == 0
+    content = text
+    if not keyframe:
+        delta = textdelta.diff(previous, text)
+        if len(delta) < len(text):
+            content = delta
+        else:
+            keyframe = True
+    return SummaryRevision(
+        course_id=course_id,
+        revision=revision,
+        source=source,
+        keyframe=keyframe,
+        content=content,
+        created_at=datetime.now(UTC),
+        **metadata,
+    )
+
+
+def get_summary_revisions(
+    *, session: Session, course_id: int, before: int | None = None, limit: int = 20
+) -> list[SummaryRevision]:
+    """
+    Get a page of a course's summary history, newest first, without the texts
+
+    Args:
+        before: Only return revisions older than this one
+        limit: Maximum number of revisions
+
+    Returns:
+        list: Revisions with every field but content loaded
+    """
+    statement = (
+        select(SummaryRevision)
+        .where(SummaryRevision.course_id == course_id)
+        .order_by(SummaryRevision.revision.desc())
+        .limit(limit)
+    )
+    if before is not None:
+        statement = statement.where(SummaryRevision.revision < before)
+    return list(session.exec(statement.options(defer(SummaryRevision.content))))
+
+
+def get_summary_revision(
+    *, session: Session, course_id: int, revision: int
+) -> tuple[SummaryRevision, str] | None:
+    """
+    Get one revision of a course summary, rebuilt from the nearest keyframe
+
+    Returns:
+        (revision, summary text) or None if the revision does not exist
+    """
+    keyframe = (
+        select(func.max(SummaryRevision.revision))
+        .where(
+            SummaryRevision.course_id == course_id,
+            SummaryRevision.revision <= revision,
+            SummaryRevision.keyframe,
+        )
+        .scalar_subquery()
+    )
+    statement = (
+        select(SummaryRevision)
+        .where(
+            SummaryRevision.course_id == course_id,
+            SummaryRevision.revision >= keyframe,
+            SummaryRevision.revision <= revision,
+        )
+        .order_by(SummaryRevision.revision)
+    )
+    chain = session.exec(statement).all()
+    if not chain or chain[-1].revision != revision:
+        return None
+
+    text = chain[0].content
+    for step in chain[1:]:
+        text = step.content if step.keyframe else textdelta.patch(text, step.content)
+    return chain[-1], text
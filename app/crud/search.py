@@ -0,0 +1,211 @@
+from sqlalchemy import (
+    ColumnElement,
+    cast,
+    func,
+    literal,
+    literal_column,
+    or_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import REGCONFIG, insert as pg_insert
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.vector import Vector
+from app.models import Course, CourseEmbedding, CourseSearch, EMBEDDING_DIMENSIONS
+
+# A tsvector holds at most 1 MB; longer descriptions are indexed up to here
+MAX_DESCRIPTION_CHARS = 100_000
+
+
+def _tsvector(text: str | ColumnElement, weight: str) -> ColumnElement:
+    config = cast(literal(settings.SEARCH_TEXT_CONFIG), REGCONFIG)
+    # Inlined: setweight() takes a "char", which a varchar parameter isn't
+    return func.setweight(func.to_tsvector(config, text), literal_column(f"'{weight}'"))
+
+
+def content_vector(title: str, description: str) -> ColumnElement:
+    """Search document of the parts of a course that don't change"""
+    return _tsvector(title, "A").op("||")(
+        _tsvector(description[:MAX_DESCRIPTION_CHARS], "C")
+    )
+
+
+def summary_vector(ai_summary: str | ColumnElement) -> ColumnElement:
+    """Search document of a summary, ranked between title and description"""
+    return _tsvector(ai_summary, "B")
+
+
+def _document() -> ColumnElement:
+    # Must match the expression of ix_coursesearch_document
+    return CourseSearch.content_vector.op("||")(CourseSearch.summary_vector)
+
+
+def index_course(*, session: Session, course: Course) -> None:
+    """Add or replace the search document of a course; the caller commits"""
+    values = {
+        "course_id": course.id,
+        "user_id": course.user_id,
+        "content_vector": content_vector(course.title, course.description),
+        "summary_vector": summary_vector(course.ai_summary or ""),
+    }
+    statement = pg_insert(CourseSearch).values(values)
+    session.exec(
+        statement.on_conflict_do_update(
+            index_elements=[CourseSearch.course_id],
+            set_={
+                "content_vector": statement.excluded.content_vector,
+                "summary_vector": statement.excluded.summary_vector,
+            },
+        )
+    )
+
+
+def update_summary_vector(
+    *, session: Session, course_id: int, ai_summary: str | ColumnElement
+) -> None:
+    """Re-index the summary of a course; the caller commits"""
+    session.exec(
+        update(CourseSearch)
+        .where(CourseSearch.course_id == course_id)
+        .values(summary_vector=summary_vector(ai_summary))
+    )
+
+
+def search_courses(
+    *, session: Session, user_id: int, query: str, offset: int = 0, limit: int = 20
+) -> list[dict]:
+    """
+    Full-text search of a user's courses, best matches first. Queries use web
+    search syntax: quoted phrases, `or` and `-word`.
+
+    Returns:
+        list: CourseSearchHit fields of each matching course
+    """
+    config = cast(literal(settings.SEARCH_TEXT_CONFIG), REGCONFIG)
+    tsquery = func.websearch_to_tsquery(config, query)
+    score = func.ts_rank_cd(_document(), tsquery).label("score")
+    statement = (
+        select(
+            Course.id,
+            Course.title,
+            Course.ai_summary,
+            Course.status,
+            Course.created_at,
+            Course.updated_at,
+            score,
+        )
+        .join(Course, Course.id == CourseSearch.course_id)
+        .where(CourseSearch.user_id == user_id, _document().bool_op("@@")(tsquery))
+        .order_by(score.desc(), Course.id)
+        .offset(offset)
+        .limit(limit)
+    )
+    return [dict(row) for row in session.exec(statement).mappings()]
+
+
+def semantic_search_courses(
+    *,
+    session: Session,
+    user_id: int,
+    embedding: list[float],
+    offset: int = 0,
+    limit: int = 20,
+) -> list[dict]:
+    """
+    Rank a user's embedded courses by cosine similarity to a query embedding
+
+    Returns:
+        list: CourseSearchHit fields of the closest courses
+    """
+    query = cast(
+        literal(embedding, Vector(EMBEDDING_DIMENSIONS)), Vector(EMBEDDING_DIMENSIONS)
+    )
+    distance = CourseEmbedding.embedding.cosine_distance(query)
+    statement = (
+        select(
+            Course.id,
+            Course.title,
+            Course.ai_summary,
+            Course.status,
+            Course.created_at,
+            Course.updated_at,
+            (1 - distance).label("score"),
+        )
+        .join(Course, Course.id == CourseEmbedding.course_id)
+        .where(CourseEmbedding.user_id == user_id)
+        .order_by(distance, Course.id)
+        .offset(offset)
+        .limit(limit)
+    )
+    # The HNSW index is filtered after the fact; keep scanning it until the
+    # page is full instead of returning fewer rows (pgvector 0.8)
+    session.exec(select(func.set_config("hnsw.iterative_scan", "relaxed_order", True)))
+    return [dict(row) for row in session.exec(statement).mappings()]
+
+
+def get_unembedded_courses(*, session: Session, limit: int) -> list:
+    """
+    Courses that have no embedding yet or changed since they were embedded
+
+    Returns:
+        list: Rows of id, user_id, title, ai_summary, description and
+            updated_at
+    """
+    statement = (
+        select(
+            Course.id,
+            Course.user_id,
+            Course.title,
+            Course.ai_summary,
+            Course.description,
+            Course.updated_at,
+        )
+        .outerjoin(CourseEmbedding, CourseEmbedding.course_id == Course.id)
+        .where(
+            or_(
+                CourseEmbedding.course_id.is_(None),
+                CourseEmbedding.embedded_at < Course.updated_at,
+            )
+        )
+        .limit(limit)
+    )
+    return session.exec(statement).all()
+
+
+def store_embeddings(*, session: Session, embeddings: list[dict]) -> None:
+    """
+    Insert or replace course embeddings
+
+    Args:
+        embeddings: Dicts with course_id, user_id, embedding and embedded_at,
+            the updated_at of the course that was embedded
+    """
+    if not embeddings:
+        return
+    statement = pg_insert(CourseEmbedding)
+    session.exec(
+        statement.on_conflict_do_update(
+            index_elements=[CourseEmbedding.course_id],
+            set_={
+                "embedding": statement.excluded.embedding,
+                "embedded_at": statement.excluded.embedded_at,
+            },
+        ),
+        params=embeddings,
+    )
+    session.commit()
+
+
+def get_course_ids_to_index(
+    *, session: Session, after_id: int, limit: int, missing_only: bool = False
+) -> list[int]:
+    """The next `limit` course IDs after `after_id`, optionally only unindexed ones"""
+    statement = (
+        select(Course.id).where(Course.id > after_id).order_by(Course.id).limit(limit)
+    )
+    if missing_only:
+        statement = statement.outerjoin(
+            CourseSearch, CourseSearch.course_id == Course.id
+        ).where(CourseSearch.course_id.is_(None))
+    return list(session.exec(statement).all())
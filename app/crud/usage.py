@@ -0,0 +1,51 @@
+from datetime import date
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, select
+
+from app.models import TokenUsage
+
+
+def add_token_usage(*, session: Session, rows: list[dict]) -> None:
+    """
+    Add token counts to the daily usage rows, creating them as needed.
+
+    Args:
+        session: Database session
+        rows: Dicts with user_id, day (ISO date), prompt and completion counts
+    """
+    if not rows:
+        return
+
+    statement = insert(TokenUsage).values(
+        [
+            {
+                "user_id": row["user_id"],
+                "day": date.fromisoformat(row["day"]),
+                "prompt_tokens": row["prompt"],
+                "completion_tokens": row["completion"],
+            }
+            for row in rows
+        ]
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[TokenUsage.user_id, TokenUsage.day],
+        set_={
+            "prompt_tokens": TokenUsage.prompt_tokens
+            + statement.excluded.prompt_tokens,
+            "completion_tokens": TokenUsage.completion_tokens
+            + statement.excluded.completion_tokens,
+        },
+    )
+    session.exec(statement)
+    session.commit()
+
+
+def get_token_usage(*, session: Session, user_id: int, since: date) -> list[TokenUsage]:
+    """Get a user's flushed daily usage from `since` on, oldest first"""
+    statement = (
+        select(TokenUsage)
+        .where(TokenUsage.user_id == user_id, TokenUsage.day >= since)
+        .order_by(TokenUsage.day)
+    )
+    return session.exec(statement).all()
@@ -2,39 +2,35 @@ from collections.abc import Generator
 from typing import Annotated
 import time
 
-import jwt
 import redis
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
 from sqlmodel import Session
 
 from app.core import security
 from app.core.config import settings
 from app.core.db import engine
+from app.core.redis import get_redis
 from app.models import TokenPayload, User
 from app.protocols import LLMService
-from app.services.llm import OpenAILLMService
+from app.services import registry
 
 
 def get_redis_client() -> redis.Redis:
     """Dependency for getting the Redis client"""
-    return redis.Redis(
-        host=settings.REDIS_HOST,
-        port=settings.REDIS_PORT,
-        decode_responses=True,
-    )
+    return get_redis()
 
 
-def get_openai_service() -> LLMService:
-    """Dependency for getting the LLM service"""
-    if not settings.OPENAI_API_KEY:
+def get_llm_service() -> LLMService:
+    """Dependency for getting the configured LLM service"""
+    try:
+        return registry.get_llm_service()
+    except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="OpenAI API key not configured",
+            detail=str(e),
         )
-    return OpenAILLMService(api_key=settings.OPENAI_API_KEY)
 
 
 reusable_oauth2 = OAuth2PasswordBearer(tokenUrl="/login/access-token")
@@ -87,17 +83,19 @@ def check_rate_limit(
 
 SessionDep = Annotated[Session, Depends(get_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
-OpenAILLMServiceDep = Annotated[OpenAILLMService, Depends(get_openai_service)]
+LLMServiceDep = Annotated[LLMService, Depends(get_llm_service)]
 RedisDep = Annotated[redis.Redis, Depends(get_redis_client)]
 
 
 def get_current_user(session: SessionDep, token: TokenDep) -> User:
+    import jwt
+
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
         )
         token_data = TokenPayload(**payload)
-    except (InvalidTokenError, ValidationError):
+    except (jwt.InvalidTokenError, ValidationError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
@@ -1,5 +1,8 @@
 from fastapi import FastAPI
-from app.routers import auth, users, courses, batch
+from app.core.config import settings
+from app.core.tracing import setup_tracing
+from app.middleware import CompressionMiddleware, MetricsMiddleware
+from app.routers import auth, users, courses, batch, prompts
 
 
 app = FastAPI(
@@ -12,3 +15,16 @@ app.include_router(auth.router)
 app.include_router(courses.router)
 app.include_router(users.router)
 app.include_router(batch.router)
+app.include_router(prompts.router)
+
+app.add_middleware(
+    CompressionMiddleware, minimum_size=settings.RESPONSE_COMPRESSION_MIN_BYTES
+)
+if settings.METRICS_ENABLED:
+    # Added last so it runs outermost and times the compression too
+    from app.routers import metrics
+
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(metrics.router)
+
+setup_tracing("api", app=app)
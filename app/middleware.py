@@ -0,0 +1,194 @@
+import gzip
+import time
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import HTTP_REQUEST_DURATION
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+class MetricsMiddleware:
+    """
+    Records request latency labelled with the route template rather than the
+    raw path, so `/courses/1` and `/courses/2` share one series.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"], self._route(scope), str(status_code)
+            ).observe(time.perf_counter() - start)
+
+    def _route(self, scope: Scope) -> str:
+        route = scope.get("route")
+        if route is not None:
+            return route.path
+        # Older Starlette versions don't store the matched route in the scope
+        for route in scope["app"].router.routes:
+            if route.matches(scope)[0] == Match.FULL:
+                return route.path
+        return "unmatched"
+
+
+def _compress_gzip(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=6)
+
+
+def _compress_br(body: bytes) -> bytes:
+    return brotli.compress(body, quality=4)
+
+
+def _compress_zstd(body: bytes) -> bytes:
+    # Level 3 is zstd's default and costs less CPU than gzip at a better ratio
+    return zstandard.ZstdCompressor(level=3).compress(body)
+
+
+# Content codings by server preference, for when the client accepts several
+ENCODINGS = {
+    name: compress
+    for name, compress, available in (
+        ("zstd", _compress_zstd, zstandard is not None),
+        ("br", _compress_br, brotli is not None),
+        ("gzip", _compress_gzip, True),
+    )
+    if available
+}
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+# Bodies above this size are compressed off the event loop
+THREAD_THRESHOLD_BYTES = 64 * 1024
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    """
+    Pick the content coding for an Accept-Encoding header: the highest q-value
+    wins, and ties go to the first coding in ENCODINGS
+    """
+    weights: dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                continue
+        weights[name.strip()] = q
+
+    best, best_q = None, 0.0
+    for name in ENCODINGS:
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Compresses JSON and text responses of at least `minimum_size` bytes with
+    the best coding the client accepts: zstd and br when their packages are
+    installed, gzip otherwise. Streaming responses pass through untouched.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        encoding = choose_encoding(request_headers.get("accept-encoding", ""))
+
+        start_message: Message | None = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                # Caches must key every response that could have been compressed
+                # on Accept-Encoding, including the ones sent uncompressed
+                if message["status"] == 304 or headers.get(
+                    "content-type", ""
+                ).startswith(COMPRESSIBLE_TYPES):
+                    headers.add_vary_header("Accept-Encoding")
+                if encoding is None:
+                    passthrough = True
+                    await send(message)
+                    return
+                if message["status"] == 304:
+                    # Echo the ETag of the compressed copy the client holds
+                    passthrough = True
+                    tag = headers.get("etag")
+                    if tag and tag.startswith('"'):
+                        encoded_tag = f'{tag[:-1]}-{encoding}"'
+                        if encoded_tag in request_headers.get("if-none-match", ""):
+                            headers["ETag"] = encoded_tag
+                    await send(message)
+                    return
+                start_message = message
+                return
+
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start_message["headers"])
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+                or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+            ):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compress = ENCODINGS[encoding]
+            if len(body) > THREAD_THRESHOLD_BYTES:
+                body = await anyio.to_thread.run_sync(compress, body)
+            else:
+                body = compress(body)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            # A strong ETag must differ between codings of the same resource
+            tag = headers.get("etag")
+            if tag and tag.startswith('"'):
+                headers["ETag"] = f'{tag[:-1]}-{encoding}"'
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,6 +1,14 @@
+from pydantic import field_validator, model_validator
+from sqlalchemy import Index, UniqueConstraint, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlmodel import SQLModel, Field, Column, TEXT
-from datetime import datetime, UTC
+from datetime import date, datetime, UTC
 from enum import Enum
+from typing import Literal
+
+from app.core.compression import CompressedText
+from app.core.vector import Vector
+from app.services.embeddings import DIMENSIONS as EMBEDDING_DIMENSIONS
 
 
 class TokenPayload(SQLModel):
@@ -35,17 +43,217 @@ class UserPublic(SQLModel):
     email: str
 
 
+class UserScheduling(SQLModel):
+    """Overrides of a user's batch scheduling; None restores the default"""
+
+    max_in_flight: int | None = Field(default=None, ge=0)  # 0 for no cap
+    weight: int | None = Field(default=None, ge=1)
+
+
+class UserSchedulingPublic(SQLModel):
+    max_in_flight: int
+    weight: int
+    queued: int  # Tasks waiting in the user's ready queue
+    running: int  # Tasks sent to the workers and not finished yet
+
+
 # Course model
 class Course(SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
     title: str = Field(max_length=255)
-    description: str = Field(sa_column=Column(TEXT))
-    ai_summary: str = Field(sa_column=Column(TEXT), default="")
+    # Stored compressed; see app.core.compression
+    description: str = Field(sa_column=Column(CompressedText))
+    ai_summary: str = Field(sa_column=Column(CompressedText), default="")
     status: str = Field(default="pending", max_length=50)
+    description_hash: str = Field(default="", max_length=64)
+    description_tokens: int = Field(default=0)  # For token budget admission
+    # Provenance of ai_summary: the model, prompt version and description hash
+    # it was generated from
+    summary_model: str | None = Field(default=None, max_length=255)
+    summary_prompt_version: str | None = Field(
+        default=None, max_length=50, foreign_key="prompttemplate.version"
+    )
+    summary_source_hash: str | None = Field(default=None, max_length=64)
+    # Latest SummaryRevision of ai_summary; 0 before the first summary
+    summary_revision: int = Field(default=0)
     created_at: datetime = Field(
         default_factory=lambda: datetime.now(UTC),
     )
+    # Bumped on every change; the ETag of the course is derived from it
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+
+
+# Search
+class CourseSearch(SQLModel, table=True):
+    """
+    Full-text search document of a course, kept apart from the course so its
+    rows stay small. Written with the course; see app.crud.search.
+    """
+
+    __table_args__ = (
+        # Needs btree_gin; the expression is what search queries match on
+        Index(
+            "ix_coursesearch_document",
+            "user_id",
+            text("(content_vector || summary_vector)"),
+            postgresql_using="gin",
+        ),
+    )
+
+    course_id: int = Field(primary_key=True, foreign_key="course.id")
+    user_id: int
+    content_vector: str = Field(sa_column=Column(TSVECTOR, nullable=False))
+    summary_vector: str = Field(sa_column=Column(TSVECTOR, nullable=False))
+
+
+class CourseEmbedding(SQLModel, table=True):
+    """
+    Embedding of a course for semantic search. The table only exists when the
+    pgvector extension was available to the migration.
+    """
+
+    __table_args__ = (
+        Index(
+            "ix_courseembedding_embedding",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+        ),
+    )
+
+    course_id: int = Field(primary_key=True, foreign_key="course.id")
+    user_id: int = Field(index=True)
+    embedding: list[float] = Field(
+        sa_column=Column(Vector(EMBEDDING_DIMENSIONS), nullable=False)
+    )
+    # updated_at of the course when it was embedded
+    embedded_at: datetime
+
+
+class CourseSearchHit(SQLModel):
+    id: int
+    title: str
+    ai_summary: str
+    status: str
+    created_at: datetime
+    updated_at: datetime
+    score: float  # Higher is better; only comparable within one search
+
+
+class CourseSearchResults(SQLModel):
+    results: list[CourseSearchHit]
+    # Pass as `offset` to get the next page; None on the last page
+    next_offset: int | None
+
+
+# Summary history
+class SummaryRevision(SQLModel, table=True):
+    """
+    One version of a course summary. Rows are only ever appended; the latest
+    version is also kept in Course.ai_summary.
+    """
+
+    __table_args__ = (UniqueConstraint("course_id", "revision"),)
+
+    id: int | None = Field(default=None, primary_key=True)
+    course_id: int = Field(foreign_key="course.id")
+    revision: int  # 1, 2, ... per course
+    source: str = Field(max_length=20)  # "ai", "batch" or "user"
+    # Keyframes hold the full text, other revisions a delta against the
+    # previous one; see app.core.textdelta
+    keyframe: bool
+    content: str = Field(sa_column=Column(CompressedText))
+    summary_model: str | None = Field(default=None, max_length=255)
+    summary_prompt_version: str | None = Field(default=None, max_length=50)
+    summary_source_hash: str | None = Field(default=None, max_length=64)
+    prompt_tokens: int = Field(default=0)
+    completion_tokens: int = Field(default=0)
+    edited_by: int | None = Field(default=None, foreign_key="user.id")
+    created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+
+
+class SummaryRevisionPublic(SQLModel):
+    revision: int
+    source: str
+    summary_model: str | None
+    summary_prompt_version: str | None
+    summary_source_hash: str | None
+    prompt_tokens: int
+    completion_tokens: int
+    edited_by: int | None
+    created_at: datetime
+
+
+class SummaryRevisionText(SummaryRevisionPublic):
+    ai_summary: str
+
+
+class SummaryRevisionsPublic(SQLModel):
+    revisions: list[SummaryRevisionPublic]  # Newest first
+    # Pass as `before` to get the next page; None on the last page
+    next_before: int | None
+
+
+# Prompt templates
+class PromptTemplate(SQLModel, table=True):
+    """A versioned prompt; summaries reference the version they were made with"""
+
+    id: int | None = Field(default=None, primary_key=True)
+    version: str = Field(max_length=50, unique=True)
+    system_prompt: str = Field(sa_column=Column(TEXT))
+    summary_prompt: str = Field(sa_column=Column(TEXT))  # Formatted with {text}
+    # Formatted with {part}, {parts} and {text} for long descriptions
+    chunk_prompt: str = Field(sa_column=Column(TEXT))
+    weight: int = Field(default=0)  # Share of traffic; 0 disables the prompt
+    created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+
+
+class PromptTemplateCreate(SQLModel):
+    version: str = Field(max_length=50)
+    system_prompt: str
+    summary_prompt: str
+    chunk_prompt: str
+    weight: int = Field(default=0, ge=0)
+
+    @field_validator("summary_prompt", "chunk_prompt")
+    @classmethod
+    def check_text_placeholder(cls, value: str) -> str:
+        if "{text}" not in value:
+            raise ValueError("Prompt must contain a {text} placeholder")
+        return value
+
+
+class PromptTemplateUpdate(SQLModel):
+    weight: int = Field(ge=0)
+
+
+# Token usage
+class TokenUsage(SQLModel, table=True):
+    """LLM tokens spent by a user on one UTC day, flushed from Redis"""
+
+    __table_args__ = (UniqueConstraint("user_id", "day"),)
+
+    id: int | None = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id")
+    day: date
+    prompt_tokens: int = Field(default=0)
+    completion_tokens: int = Field(default=0)
+
+
+class TokenBudget(SQLModel):
+    """Spend against one token budget"""
+
+    scope: str  # "user" or "org"
+    period: str  # "day" or "month"
+    used: int
+    limit: int | None  # None when unlimited
+    remaining: int | None
+
+
+class TokenUsagePublic(SQLModel):
+    budgets: list[TokenBudget]
+    history: list[TokenUsage]
 
 
 class CourseCreate(SQLModel):
@@ -68,17 +276,30 @@ class BatchStatus(str, Enum):
     PROCESSING = "processing"
     COMPLETED = "completed"
     FAILED = "failed"
+    PAUSED = "paused"
+    CANCELLED = "cancelled"
 
 
+# batchjob and batchtask are partitioned by month on created_at in the database,
+# with a primary key of (id, created_at); see app.crud.partitions
 class BatchJob(SQLModel, table=True):
     """A batch job represents a collection of tasks to be processed asynchronously"""
 
+    __table_args__ = (
+        Index(
+            "ix_batchjob_active",
+            "id",
+            postgresql_where=text("status IN ('PENDING', 'PROCESSING')"),
+        ),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
     name: str = Field(max_length=255)
     status: BatchStatus = Field(default=BatchStatus.PENDING)
     total_tasks: int = Field(default=0)
-    completed_tasks: int = Field(default=0)
+    completed_tasks: int = Field(default=0)  # Finished tasks, failed ones included
+    failed_tasks: int = Field(default=0)
     created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
 
@@ -86,21 +307,75 @@ class BatchJob(SQLModel, table=True):
 class BatchTask(SQLModel, table=True):
     """A single task within a batch job"""
 
+    __table_args__ = (
+        Index(
+            "ix_batchtask_pending", "id", postgresql_where=text("status = 'PENDING'")
+        ),
+        Index(
+            "ix_batchtask_processing_lease",
+            "lease_expires_at",
+            postgresql_where=text("status = 'PROCESSING'"),
+        ),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
-    batch_job_id: int = Field(foreign_key="batchjob.id")
+    # No foreign key: a partitioned batchjob has no unique constraint on id alone
+    batch_job_id: int = Field(index=True)
     course_id: int = Field(foreign_key="course.id")
     status: BatchStatus = Field(default=BatchStatus.PENDING)
-    result: str = Field(sa_column=Column(TEXT), default="")
     error: str = Field(sa_column=Column(TEXT), default="")
+    prompt_tokens: int = Field(default=0)
+    completion_tokens: int = Field(default=0)
+    llm_calls: int = Field(default=0)
+    # How the summary passed validation, see app.services.postprocess
+    postprocess_outcome: str = Field(default="", max_length=20)
+    attempts: int = Field(default=0)
+    lease_expires_at: datetime | None = Field(default=None)
     created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
 
 
+class CourseFilter(SQLModel):
+    """Selects the current user's courses; unset fields match everything"""
+
+    status: str | None = Field(default=None, max_length=50)
+    created_after: datetime | None = None
+    created_before: datetime | None = None
+
+
+class BatchTaskPublic(SQLModel):
+    """A batch task; the result is read from the course summary"""
+
+    id: int
+    batch_job_id: int
+    course_id: int
+    status: BatchStatus
+    result: str = ""
+    error: str
+    prompt_tokens: int
+    completion_tokens: int
+    llm_calls: int
+    postprocess_outcome: str
+    attempts: int
+    created_at: datetime
+    updated_at: datetime
+
+
 class BatchJobCreate(SQLModel):
-    """Payload for creating a new batch job"""
+    """Payload for creating a new batch job from either course IDs or a filter"""
 
     name: str = Field(max_length=255)
-    course_ids: list[int]
+    course_ids: list[int] | None = None
+    filter: CourseFilter | None = None
+    # "stale" leaves out courses whose summary is current for their description,
+    # the configured model and the prompt version
+    mode: Literal["all", "stale"] = "all"
+
+    @model_validator(mode="after")
+    def check_course_selection(self) -> "BatchJobCreate":
+        if (self.course_ids is None) == (self.filter is None):
+            raise ValueError("Provide exactly one of course_ids and filter")
+        return self
 
 
 class BatchJobStatus(SQLModel):
@@ -111,6 +386,7 @@ class BatchJobStatus(SQLModel):
     status: BatchStatus
     total_tasks: int
     completed_tasks: int
+    failed_tasks: int
     progress: float  # Calculated as completed_tasks / total_tasks
     created_at: datetime
     updated_at: datetime
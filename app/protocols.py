@@ -1,11 +1,18 @@
-from typing import Protocol
+from typing import TYPE_CHECKING, Protocol
+
+if TYPE_CHECKING:
+    from app.services.llm import Prompt, SummaryResult
 
 
 class LLMService(Protocol):
     """Protocol for LLM service"""
 
-    def generate_summary(self, text: str) -> str:
+    model: str
+
+    def generate_summary(self, text: str, prompt: "Prompt" = ...) -> "SummaryResult":
         """Generate a summary of the given text"""
 
-    def generate_course_summary(self, course_description: str) -> str:
+    def generate_course_summary(
+        self, course_description: str, prompt: "Prompt" = ...
+    ) -> "SummaryResult":
         """Generate a summary of the given course description"""
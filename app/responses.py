@@ -0,0 +1,46 @@
+import hashlib
+
+from fastapi import Request, Response, status
+
+# Codings CompressionMiddleware may append to an ETag
+CONTENT_CODINGS = ("zstd", "br", "gzip")
+
+# A finished batch job never changes again
+CACHE_IMMUTABLE = "private, max-age=31536000, immutable"
+# Cacheable, but revalidated with If-None-Match on every use
+CACHE_REVALIDATE = "private, no-cache"
+
+
+def etag(*parts) -> str:
+    """Strong ETag from the values that version a resource, e.g. its updated_at"""
+    digest = hashlib.blake2b(
+        "|".join(str(part) for part in parts).encode(), digest_size=12
+    )
+    return f'"{digest.hexdigest()}"'
+
+
+def cache_headers(tag: str, cache_control: str = CACHE_REVALIDATE) -> dict[str, str]:
+    return {"ETag": tag, "Cache-Control": cache_control}
+
+
+def etag_matches(request: Request, tag: str) -> bool:
+    """
+    Whether If-None-Match holds `tag`. The suffix CompressionMiddleware adds to
+    the ETag of a compressed response is ignored.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip().removeprefix("W/")
+        if candidate == tag or any(
+            candidate == f'{tag[:-1]}-{encoding}"' for encoding in CONTENT_CODINGS
+        ):
+            return True
+    return False
+
+
+def not_modified(headers: dict[str, str]) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
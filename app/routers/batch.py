@@ -1,41 +1,129 @@
 from typing import Any
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.responses import ORJSONResponse
 
+from app.core.config import settings
 from app.crud import batch
-from app.dependencies import CurrentUser, SessionDep
-from app.models import BatchJob, BatchJobCreate, BatchJobStatus, BatchTask
-from app.tasks.batch_tasks import process_batch_courses
+from app.dependencies import CurrentUser, RedisDep, SessionDep
+from app.models import (
+    BatchJob,
+    BatchJobCreate,
+    BatchJobStatus,
+    BatchStatus,
+    BatchTaskPublic,
+)
+from app.responses import (
+    CACHE_IMMUTABLE,
+    CACHE_REVALIDATE,
+    cache_headers,
+    etag,
+    etag_matches,
+    not_modified,
+)
+from app.services import batch_control, budgets, prompts, registry
+from app.tasks.batch_tasks import (
+    enqueue_batch_tasks,
+    process_batch_job,
+    unqueue_batch_job,
+)
 
 
 router = APIRouter(prefix="/batch", tags=["batch"])
 
+FINISHED_STATUSES = (BatchStatus.COMPLETED, BatchStatus.FAILED, BatchStatus.CANCELLED)
+# Tasks that were running when a job was cancelled still finish and update the
+# job, so only these statuses are final
+IMMUTABLE_STATUSES = (BatchStatus.COMPLETED, BatchStatus.FAILED)
+
 
 @router.post("/", response_model=BatchJob)
 def create_batch_job(
-    *, session: SessionDep, current_user: CurrentUser, batch_job_in: BatchJobCreate
+    *,
+    session: SessionDep,
+    current_user: CurrentUser,
+    batch_job_in: BatchJobCreate,
+    redis_client: RedisDep,
 ) -> Any:
     """
     Create a new batch job.
+
+    The courses are given either as a list of IDs or as a filter over the
+    user's courses, which is expanded in the database. In "stale" mode only
+    courses without a current summary get a task, hand-written summaries
+    counting as current; a job left without tasks is created as completed. The job is only accepted if its estimated token cost
+    fits in the user's remaining token budget.
     """
-    for course_id in batch_job_in.course_ids:
-        if not batch.verify_course_ownership(
-            session=session, course_id=course_id, user_id=current_user.id
-        ):
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail=f"Course {course_id} does not belong to you",
+    model = prompt_versions = None
+    if batch_job_in.mode == "stale":
+        # Looked up only here, so other modes work without LLM credentials
+        model = registry.get_llm_service().model
+        prompt_versions = prompts.get_active_versions()
+
+    if batch_job_in.filter is not None:
+        courses, description_tokens = batch.count_filtered_courses(
+            session=session,
+            user_id=current_user.id,
+            course_filter=batch_job_in.filter,
+            cap=budgets.max_input_tokens(),
+            model=model,
+            prompt_versions=prompt_versions,
+        )
+    else:
+        for course_id in batch_job_in.course_ids:
+            if not batch.verify_course_ownership(
+                session=session, course_id=course_id, user_id=current_user.id
+            ):
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail=f"Course {course_id} does not belong to you",
+                )
+
+        if batch_job_in.mode == "stale":
+            stale_course_ids = batch.get_stale_course_ids(
+                session=session,
+                course_ids=batch_job_in.course_ids,
+                model=model,
+                prompt_versions=prompt_versions,
+            )
+            batch_job_in = batch_job_in.model_copy(
+                update={"course_ids": stale_course_ids}
             )
 
-    batch_job = batch.create_batch_job(
-        session=session, batch_in=batch_job_in, user_id=current_user.id
-    )
+        courses = len(batch_job_in.course_ids)
+        description_tokens = batch.sum_description_tokens(
+            session=session,
+            course_ids=batch_job_in.course_ids,
+            cap=budgets.max_input_tokens(),
+        )
 
-    process_batch_courses.delay(
-        course_ids=batch_job_in.course_ids,
-        job_name=batch_job_in.name,
-        user_id=current_user.id,
-    )
+    estimate = budgets.estimate_tokens(description_tokens, courses=courses)
+    remaining = budgets.remaining_tokens(redis_client, current_user.id)
+    if remaining is not None and estimate > remaining:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=(
+                f"Token budget exceeded: this batch needs up to {estimate} tokens, "
+                f"{remaining} remaining"
+            ),
+        )
+
+    if batch_job_in.filter is not None:
+        batch_job = batch.create_batch_job_from_filter(
+            session=session,
+            name=batch_job_in.name,
+            user_id=current_user.id,
+            course_filter=batch_job_in.filter,
+            model=model,
+            prompt_versions=prompt_versions,
+        )
+    else:
+        batch_job = batch.create_batch_job(
+            session=session, batch_in=batch_job_in, user_id=current_user.id
+        )
+
+    if batch_job.total_tasks:
+        process_batch_job.delay(batch_job.id)
 
     return batch_job
 
@@ -46,73 +134,199 @@ def get_batch_jobs(*, session: SessionDep, current_user: CurrentUser) -> Any:
     Get all batch jobs for the current user.
     """
     jobs = batch.get_batch_jobs(session=session, user_id=current_user.id)
-
-    result = []
-    for job in jobs:
-        progress = job.completed_tasks / job.total_tasks if job.total_tasks > 0 else 0.0
-        result.append(
-            BatchJobStatus(
-                id=job.id,
-                name=job.name,
-                status=job.status,
-                total_tasks=job.total_tasks,
-                completed_tasks=job.completed_tasks,
-                progress=progress,
-                created_at=job.created_at,
-                updated_at=job.updated_at,
-            )
-        )
-
-    return result
+    return [_job_status(job) for job in jobs]
 
 
 @router.get("/{batch_job_id}", response_model=BatchJobStatus)
 def get_batch_job(
-    *, session: SessionDep, current_user: CurrentUser, batch_job_id: int
+    *,
+    session: SessionDep,
+    current_user: CurrentUser,
+    batch_job_id: int,
+    request: Request,
+    response: Response,
 ) -> Any:
     """
     Get a batch job by ID.
+
+    Answers 304 Not Modified while If-None-Match holds its current ETag. A
+    completed or failed job never changes, so clients may cache it
+    indefinitely; a cancelled one is revalidated until its running tasks end.
     """
-    job = batch.get_batch_job(
-        session=session, batch_job_id=batch_job_id, user_id=current_user.id
+    job = _get_own_job(session, current_user, batch_job_id)
+
+    headers = cache_headers(
+        etag("batch", job.id, job.updated_at),
+        CACHE_IMMUTABLE if job.status in IMMUTABLE_STATUSES else CACHE_REVALIDATE,
     )
+    if etag_matches(request, headers["ETag"]):
+        return not_modified(headers)
 
-    if not job:
+    response.headers.update(headers)
+    return _job_status(job)
+
+
+@router.post("/{batch_job_id}/cancel", response_model=BatchJobStatus)
+def cancel_batch_job(
+    *,
+    session: SessionDep,
+    current_user: CurrentUser,
+    redis_client: RedisDep,
+    batch_job_id: int,
+) -> Any:
+    """
+    Cancel a batch job.
+
+    Tasks that have not started are cancelled in one statement; workers drop
+    queued tasks of the job before calling the LLM.
+    """
+    job = _get_own_job(session, current_user, batch_job_id)
+
+    batch_control.set_job_state(redis_client, job.id, BatchStatus.CANCELLED)
+    if batch.cancel_batch_job(session=session, batch_job_id=job.id) is None:
+        batch_control.set_job_state(redis_client, job.id, None)
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Batch job {batch_job_id} not found",
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Batch job {batch_job_id} has already finished",
         )
+    if settings.BATCH_WORKER_MODE == "celery":
+        unqueue_batch_job(job.user_id, job.id)
 
-    progress = job.completed_tasks / job.total_tasks if job.total_tasks > 0 else 0.0
+    session.refresh(job)
+    return _job_status(job)
 
-    return BatchJobStatus(
-        id=job.id,
-        name=job.name,
-        status=job.status,
-        total_tasks=job.total_tasks,
-        completed_tasks=job.completed_tasks,
-        progress=progress,
-        created_at=job.created_at,
-        updated_at=job.updated_at,
-    )
 
+@router.post("/{batch_job_id}/pause", response_model=BatchJobStatus)
+def pause_batch_job(
+    *,
+    session: SessionDep,
+    current_user: CurrentUser,
+    redis_client: RedisDep,
+    batch_job_id: int,
+) -> Any:
+    """
+    Pause a batch job. Tasks already being processed are finished.
+    """
+    job = _get_own_job(session, current_user, batch_job_id)
 
-@router.get("/{batch_job_id}/tasks", response_model=list[BatchTask])
+    batch_control.set_job_state(redis_client, job.id, BatchStatus.PAUSED)
+    if not batch.transition_batch_job(
+        session=session,
+        batch_job_id=job.id,
+        from_statuses=[BatchStatus.PENDING, BatchStatus.PROCESSING],
+        to_status=BatchStatus.PAUSED,
+    ):
+        if job.status != BatchStatus.PAUSED:
+            batch_control.set_job_state(redis_client, job.id, None)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Batch job {batch_job_id} is not running",
+        )
+    # Resuming queues every pending task again
+    if settings.BATCH_WORKER_MODE == "celery":
+        unqueue_batch_job(job.user_id, job.id)
+
+    session.refresh(job)
+    return _job_status(job)
+
+
+@router.post("/{batch_job_id}/resume", response_model=BatchJobStatus)
+def resume_batch_job(
+    *,
+    session: SessionDep,
+    current_user: CurrentUser,
+    redis_client: RedisDep,
+    batch_job_id: int,
+) -> Any:
+    """
+    Resume a paused batch job; only its remaining tasks are enqueued again.
+    """
+    job = _get_own_job(session, current_user, batch_job_id)
+
+    if not batch.transition_batch_job(
+        session=session,
+        batch_job_id=job.id,
+        from_statuses=[BatchStatus.PAUSED],
+        to_status=BatchStatus.PROCESSING,
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Batch job {batch_job_id} is not paused",
+        )
+    batch_control.set_job_state(redis_client, job.id, None)
+
+    # Pull workers pick the pending tasks up on their own. Tasks the reaper
+    # requeued while the job was paused are dropped first, not queued twice
+    if settings.BATCH_WORKER_MODE == "celery":
+        unqueue_batch_job(job.user_id, job.id)
+        enqueue_batch_tasks(
+            batch.get_pending_tasks(session=session, batch_job_id=job.id)
+        )
+
+    session.refresh(job)
+    return _job_status(job)
+
+
+@router.get(
+    "/{batch_job_id}/tasks",
+    response_model=list[BatchTaskPublic],
+    response_class=ORJSONResponse,
+)
 def get_batch_tasks(
-    *, session: SessionDep, current_user: CurrentUser, batch_job_id: int
+    *,
+    session: SessionDep,
+    current_user: CurrentUser,
+    batch_job_id: int,
+    request: Request,
 ) -> Any:
     """
     Get all tasks for a batch job.
+
+    The task list of a finished job has an ETag and answers 304 Not Modified
+    while If-None-Match holds it. Results are read from the courses, whose
+    summaries can still be edited, so it is revalidated rather than immutable.
     """
+    job = _get_own_job(session, current_user, batch_job_id)
+
+    headers = {}
+    if job.status in FINISHED_STATUSES:
+        courses_updated_at = batch.get_batch_tasks_version(
+            session=session, batch_job_id=job.id
+        )
+        headers = cache_headers(
+            etag("batch-tasks", job.id, job.updated_at, courses_updated_at)
+        )
+        if etag_matches(request, headers["ETag"]):
+            return not_modified(headers)
+
+    tasks = batch.get_batch_tasks(session=session, batch_job_id=batch_job_id)
+    return ORJSONResponse(tasks, headers=headers)
+
+
+def _get_own_job(
+    session: SessionDep, current_user: CurrentUser, batch_job_id: int
+) -> BatchJob:
     job = batch.get_batch_job(
         session=session, batch_job_id=batch_job_id, user_id=current_user.id
     )
-
     if not job:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Batch job {batch_job_id} not found",
         )
+    return job
 
-    tasks = batch.get_batch_tasks(session=session, batch_job_id=batch_job_id)
-    return tasks
+
+def _job_status(job: BatchJob) -> BatchJobStatus:
+    progress = job.completed_tasks / job.total_tasks if job.total_tasks > 0 else 0.0
+    return BatchJobStatus(
+        id=job.id,
+        name=job.name,
+        status=job.status,
+        total_tasks=job.total_tasks,
+        completed_tasks=job.completed_tasks,
+        failed_tasks=job.failed_tasks,
+        progress=progress,
+        created_at=job.created_at,
+        updated_at=job.updated_at,
+    )
@@ -1,16 +1,58 @@
-from typing import Any
+import math
+from datetime import datetime
+from typing import Annotated, Any, Literal
 
-from fastapi import APIRouter, HTTPException, status
-from sqlmodel import select
+from fastapi import (
+    APIRouter,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import ORJSONResponse
+
+from app.core.config import settings
+from app.core.hashing import text_hash
+from app.core.metrics import record_cache
 from app.dependencies import (
     CurrentUser,
     SessionDep,
-    OpenAILLMServiceDep,
+    LLMServiceDep,
     RedisDep,
     check_rate_limit,
 )
-from app.models import CourseCreate, Course, CoursesPublic, CourseSummaryEdit
+from app.models import (
+    CourseCreate,
+    Course,
+    CoursesPublic,
+    CourseSearchResults,
+    CourseSummaryEdit,
+    SummaryRevisionsPublic,
+    SummaryRevisionText,
+)
 from app.crud import courses as courses_crud
+from app.crud import revisions as revisions_crud
+from app.crud import search as search_crud
+from app.services import backoff, budgets, embeddings, prompts
+from app.responses import (
+    CACHE_IMMUTABLE,
+    cache_headers,
+    etag,
+    etag_matches,
+    not_modified,
+)
+from app.services.errors import (
+    ContentFiltered,
+    ContextTooLong,
+    LLMError,
+    Permanent,
+    RateLimited,
+    Timeout,
+    Unavailable,
+)
+from app.services.singleflight import SingleFlight
 
 router = APIRouter(prefix="/courses", tags=["courses"])
 
@@ -28,13 +70,152 @@ def create_course(
     return course
 
 
-@router.get("/", response_model=CoursesPublic)
-def get_courses(*, session: SessionDep, current_user: CurrentUser) -> Any:
+@router.get("/", response_model=CoursesPublic, response_class=ORJSONResponse)
+def get_courses(
+    *, session: SessionDep, current_user: CurrentUser, request: Request
+) -> Any:
     """
     Get all courses.
+
+    Answers 304 Not Modified, without loading the courses, while If-None-Match
+    holds the current ETag of the list.
     """
-    courses = session.exec(select(Course).where(Course.user_id == current_user.id))
-    return CoursesPublic(courses=courses)
+    count, updated_at = courses_crud.get_user_courses_version(
+        session=session, user_id=current_user.id
+    )
+    headers = cache_headers(etag("courses", current_user.id, count, updated_at))
+    if etag_matches(request, headers["ETag"]):
+        return not_modified(headers)
+
+    courses = courses_crud.get_user_courses(session=session, user_id=current_user.id)
+    return ORJSONResponse({"courses": courses}, headers=headers)
+
+
+@router.get(
+    "/search", response_model=CourseSearchResults, response_class=ORJSONResponse
+)
+def search_courses(
+    *,
+    session: SessionDep,
+    current_user: CurrentUser,
+    q: Annotated[str, Query(min_length=1, max_length=500)],
+    mode: Literal["text", "semantic"] = "text",
+    offset: Annotated[int, Query(ge=0, le=1000)] = 0,
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+) -> Any:
+    """
+    Search the current user's courses, best matches first.
+
+    "text" matches words of the title, summary and description, with web search
+    syntax ("quoted phrases", or, -excluded); "semantic" ranks courses by the
+    meaning of their title and summary and needs SEARCH_EMBEDDINGS.
+    """
+    if mode == "semantic":
+        if not embeddings.enabled():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Semantic search is not enabled",
+            )
+        results = search_crud.semantic_search_courses(
+            session=session,
+            user_id=current_user.id,
+            embedding=embeddings.embed_query(q),
+            offset=offset,
+            limit=limit,
+        )
+    else:
+        results = search_crud.search_courses(
+            session=session,
+            user_id=current_user.id,
+            query=q,
+            offset=offset,
+            limit=limit,
+        )
+
+    next_offset = offset + limit if len(results) == limit else None
+    return ORJSONResponse({"results": results, "next_offset": next_offset})
+
+
+@router.get("/{course_id}", response_model=Course)
+def get_course(
+    *,
+    session: SessionDep,
+    current_user: CurrentUser,
+    course_id: int,
+    request: Request,
+    response: Response,
+) -> Any:
+    """
+    Get a course by ID.
+
+    Answers 304 Not Modified, without loading the course, while If-None-Match
+    holds its current ETag.
+    """
+    updated_at = _check_course_access(session, current_user, course_id)
+
+    headers = cache_headers(etag("course", course_id, updated_at))
+    if etag_matches(request, headers["ETag"]):
+        return not_modified(headers)
+
+    response.headers.update(headers)
+    return courses_crud.get_course_by_id(session=session, course_id=course_id)
+
+
+@router.get("/{course_id}/revisions", response_model=SummaryRevisionsPublic)
+def get_summary_revisions(
+    *,
+    session: SessionDep,
+    current_user: CurrentUser,
+    course_id: int,
+    before: int | None = None,
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+) -> Any:
+    """
+    Get the summary history of a course, newest first, `limit` revisions at a
+    time. Pass `next_before` of a page as `before` to get the next one.
+    """
+    _check_course_access(session, current_user, course_id)
+    revisions = revisions_crud.get_summary_revisions(
+        session=session, course_id=course_id, before=before, limit=limit
+    )
+    next_before = revisions[-1].revision if len(revisions) == limit else None
+    return SummaryRevisionsPublic(revisions=revisions, next_before=next_before)
+
+
+@router.get("/{course_id}/revisions/{revision}", response_model=SummaryRevisionText)
+def get_summary_revision(
+    *,
+    session: SessionDep,
+    current_user: CurrentUser,
+    course_id: int,
+    revision: int,
+    request: Request,
+    response: Response,
+) -> Any:
+    """
+    Get one version of a course summary. Revisions never change, so clients may
+    cache them indefinitely.
+    """
+    _check_course_access(session, current_user, course_id)
+
+    headers = cache_headers(etag("revision", course_id, revision), CACHE_IMMUTABLE)
+    if etag_matches(request, headers["ETag"]):
+        return not_modified(headers)
+
+    found = revisions_crud.get_summary_revision(
+        session=session, course_id=course_id, revision=revision
+    )
+    if not found:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Revision {revision} of course {course_id} not found",
+        )
+
+    summary_revision, text = found
+    response.headers.update(headers)
+    return SummaryRevisionText.model_validate(
+        summary_revision, update={"ai_summary": text}
+    )
 
 
 @router.post("/generate_summary/{course_id}", response_model=Course)
@@ -43,26 +224,41 @@ def generate_summary(
     session: SessionDep,
     current_user: CurrentUser,
     course_id: int,
-    llm_service: OpenAILLMServiceDep,
+    llm_service: LLMServiceDep,
     redis_client: RedisDep,
-) -> Course:
+    idempotency_key: Annotated[str | None, Header()] = None,
+) -> Any:
     """
     Generate an AI summary for a course.
 
     This endpoint:
-    1. Checks if the user has exceeded their rate limit (max 3 summaries per hour)
+    1. Returns the stored response if this Idempotency-Key was already used
     2. Fetches the course description from the database
-    3. Calls OpenAI's GPT API to generate a short summary
-    4. Stores the AI-generated summary in the database
-    5. Updates the status to "draft" for user to review
-    6. Returns the summarized course description
+    3. Joins an in-flight generation for the same course and description, if any
+    4. Otherwise checks the rate limit (max 3 summaries per hour) and calls
+       OpenAI's GPT API to generate a short summary
+    5. Stores the AI-generated summary in the database
+    6. Updates the status to "draft" for user to review
+    7. Returns the summarized course description
     """
-    # Check rate limiting (max 3 summaries per hour per user)
-    if not check_rate_limit(current_user.id, redis_client):
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail="Rate limit exceeded. Maximum 3 AI summaries per hour.",
-        )
+    # A hash of the course ID, status code and body of the first response
+    replay_key = (
+        f"idempotency:generate_summary:response:{current_user.id}:{idempotency_key}"
+    )
+    if idempotency_key:
+        replayed = redis_client.hgetall(replay_key)
+        record_cache("idempotency", bool(replayed))
+        if replayed:
+            if int(replayed["course_id"]) != course_id:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Idempotency-Key was already used for another course",
+                )
+            return Response(
+                content=replayed["body"],
+                status_code=int(replayed["status_code"]),
+                media_type="application/json",
+            )
 
     # Get the course from the database
     course = courses_crud.get_course_by_id(session=session, course_id=course_id)
@@ -81,21 +277,97 @@ def generate_summary(
             detail="Not enough permissions to access this course",
         )
 
-    # Generate the summary using OpenAI
-    summary = llm_service.generate_course_summary(course.description)
+    def generate() -> str:
+        # The provider is rate limiting us; don't use up the caller's quota
+        wait = backoff.get_backoff(redis_client)
+        if wait:
+            raise _llm_http_error(RateLimited("LLM provider is busy", wait))
 
-    # Update the course with the summary, but don't finalize yet
-    updated_course = courses_crud.update_course_with_summary(
-        session=session, course_id=course_id, ai_summary=summary, finalize=False
-    )
+        # Check rate limiting (max 3 summaries per hour per user); callers that
+        # share an in-flight generation don't use up quota
+        if not check_rate_limit(current_user.id, redis_client):
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded. Maximum 3 AI summaries per hour.",
+            )
 
-    if not updated_course:
+        estimate = budgets.estimate_tokens(
+            min(course.description_tokens, budgets.max_input_tokens())
+        )
+        if not budgets.has_budget(redis_client, current_user.id, estimate):
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Token budget exceeded",
+            )
+
+        # Generate the summary using OpenAI
+        try:
+            summary = llm_service.generate_course_summary(
+                course.description, prompts.choose_prompt(course_id)
+            )
+        except LLMError as e:
+            if isinstance(e, RateLimited):
+                backoff.set_backoff(
+                    redis_client, e.retry_after or settings.BATCH_RETRY_BASE_SECONDS
+                )
+            raise _llm_http_error(e)
+        budgets.record_usage(
+            redis_client,
+            current_user.id,
+            summary.prompt_tokens,
+            summary.completion_tokens,
+        )
+
+        # Update the course with the summary, but don't finalize yet
+        updated_course = courses_crud.update_course_with_summary(
+            session=session,
+            course_id=course_id,
+            ai_summary=summary.text,
+            finalize=False,
+            summary_model=summary.model,
+            summary_prompt_version=summary.prompt_version,
+            summary_source_hash=text_hash(course.description),
+            prompt_tokens=summary.prompt_tokens,
+            completion_tokens=summary.completion_tokens,
+        )
+
+        if not updated_course:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to update course with summary",
+            )
+        return summary.text
+
+    flight = SingleFlight(
+        redis_client,
+        namespace="generate_summary",
+        lock_seconds=settings.SUMMARY_SINGLEFLIGHT_LOCK_SECONDS,
+        wait_seconds=settings.SUMMARY_SINGLEFLIGHT_WAIT_SECONDS,
+    )
+    try:
+        _, shared = flight.run(f"{course_id}:{text_hash(course.description)}", generate)
+    except TimeoutError:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to update course with summary",
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Timed out waiting for the summary to be generated",
         )
+    record_cache("summary_singleflight", shared)
 
-    return updated_course
+    if shared:
+        session.refresh(course)
+
+    # Serialized here so a replay returns exactly these bytes
+    body = course.model_dump_json()
+    if idempotency_key:
+        pipe = redis_client.pipeline()
+        pipe.hset(
+            replay_key,
+            mapping={"course_id": course_id, "status_code": 200, "body": body},
+        )
+        pipe.expire(replay_key, settings.IDEMPOTENCY_TTL_SECONDS)
+        pipe.execute()
+
+    return Response(content=body, media_type="application/json")
 
 
 @router.put("/edit_summary/{course_id}", response_model=Course)
@@ -136,7 +408,10 @@ def edit_summary(
 
     if summary_edit.finalize:
         updated_course = courses_crud.finalize_course_summary(
-            session=session, course_id=course_id, ai_summary=summary_edit.ai_summary
+            session=session,
+            course_id=course_id,
+            ai_summary=summary_edit.ai_summary,
+            edited_by=current_user.id,
         )
     else:
         updated_course = courses_crud.update_course_with_summary(
@@ -144,6 +419,7 @@ def edit_summary(
             course_id=course_id,
             ai_summary=summary_edit.ai_summary,
             finalize=False,
+            edited_by=current_user.id,
         )
 
     if not updated_course:
@@ -153,3 +429,70 @@ def edit_summary(
         )
 
     return updated_course
+
+
+def _check_course_access(
+    session: SessionDep, current_user: CurrentUser, course_id: int
+) -> datetime:
+    """
+    Make sure the course exists and belongs to the current user, without
+    loading it
+
+    Returns:
+        datetime: updated_at of the course
+    """
+    version = courses_crud.get_course_version(session=session, course_id=course_id)
+    if not version:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Course with ID {course_id} not found",
+        )
+
+    user_id, updated_at = version
+    if user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions to access this course",
+        )
+    return updated_at
+
+
+def _llm_http_error(error: LLMError) -> HTTPException:
+    """Translate an LLM service error into the response for the caller"""
+    if isinstance(error, RateLimited):
+        headers = None
+        if error.retry_after:
+            headers = {"Retry-After": str(math.ceil(error.retry_after))}
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The summary service is busy, try again later",
+            headers=headers,
+        )
+    if isinstance(error, Timeout):
+        return HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Generating the summary timed out",
+        )
+    if isinstance(error, Unavailable):
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The summary service is unavailable, try again later",
+        )
+    if isinstance(error, ContextTooLong):
+        return HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="The course description is too long to summarize",
+        )
+    if isinstance(error, ContentFiltered):
+        return HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="The course description was rejected by the content filter",
+        )
+    if isinstance(error, Permanent):
+        return HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail="The summary service rejected the request",
+        )
+    return HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(error)
+    )
@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Response
+
+from app.core.metrics import render_latest
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics() -> Response:
+    """
+    Prometheus metrics for this API process, or for all of them when
+    PROMETHEUS_MULTIPROC_DIR is set.
+    """
+    content, content_type = render_latest()
+    return Response(content=content, media_type=content_type)
@@ -0,0 +1,82 @@
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from app.crud import prompts as prompts_crud
+from app.dependencies import SessionDep, get_current_active_superuser
+from app.models import PromptTemplate, PromptTemplateCreate, PromptTemplateUpdate
+from app.tasks.resummarize import resummarize_outdated
+
+
+router = APIRouter(
+    prefix="/prompts",
+    tags=["prompts"],
+    dependencies=[Depends(get_current_active_superuser)],
+)
+
+
+@router.get("/", response_model=list[PromptTemplate])
+def get_prompt_templates(*, session: SessionDep) -> Any:
+    """
+    Get all prompt template versions.
+    """
+    return prompts_crud.get_prompt_templates(session=session)
+
+
+@router.post("/", response_model=PromptTemplate)
+def create_prompt_template(
+    *, session: SessionDep, prompt_in: PromptTemplateCreate
+) -> Any:
+    """
+    Create a new prompt template version.
+
+    With a non-zero weight the prompt starts receiving its share of traffic
+    within PROMPT_CACHE_SECONDS.
+    """
+    if prompts_crud.get_prompt_template(session=session, version=prompt_in.version):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Prompt version {prompt_in.version} already exists",
+        )
+
+    try:
+        prompt_in.summary_prompt.format(text="")
+        prompt_in.chunk_prompt.format(part=1, parts=1, text="")
+    except (KeyError, IndexError, ValueError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid prompt template: {e}",
+        )
+
+    return prompts_crud.create_prompt_template(session=session, prompt_in=prompt_in)
+
+
+@router.patch("/{version}", response_model=PromptTemplate)
+def update_prompt_template(
+    *, session: SessionDep, version: str, prompt_update: PromptTemplateUpdate
+) -> Any:
+    """
+    Change the traffic weight of a prompt version; 0 retires it.
+    """
+    prompt = prompts_crud.update_prompt_weight(
+        session=session, version=version, weight=prompt_update.weight
+    )
+
+    if not prompt:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Prompt version {version} not found",
+        )
+
+    return prompt
+
+
+@router.post("/resummarize", status_code=status.HTTP_202_ACCEPTED)
+def resummarize() -> Any:
+    """
+    Re-summarize every course whose summary was made with an inactive prompt.
+
+    The courses are queued through the batch pipeline in chunks, newest first.
+    """
+    result = resummarize_outdated.delay()
+    return {"task_id": result.id}
@@ -1,14 +1,25 @@
+from datetime import datetime, timedelta, UTC
 from typing import Any
 
 from fastapi import APIRouter, Depends, HTTPException
 
 from app import crud
+from app.crud import usage as usage_crud
 from app.dependencies import (
     CurrentUser,
+    RedisDep,
     SessionDep,
     get_current_active_superuser,
 )
-from app.models import User, UserCreate, UserPublic
+from app.models import (
+    TokenUsagePublic,
+    User,
+    UserCreate,
+    UserPublic,
+    UserScheduling,
+    UserSchedulingPublic,
+)
+from app.services import budgets, fair_scheduler
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -30,6 +41,23 @@ def create_user(*, session: SessionDep, user_in: UserCreate) -> Any:
     return user
 
 
+@router.get("/me/usage", response_model=TokenUsagePublic)
+def read_own_usage(
+    session: SessionDep, current_user: CurrentUser, redis_client: RedisDep
+) -> Any:
+    """
+    Get the current user's token budgets and daily usage over the last 30 days.
+    """
+    return TokenUsagePublic(
+        budgets=budgets.get_usage(redis_client, current_user.id),
+        history=usage_crud.get_token_usage(
+            session=session,
+            user_id=current_user.id,
+            since=datetime.now(UTC).date() - timedelta(days=30),
+        ),
+    )
+
+
 @router.get("/{user_id}", response_model=UserPublic)
 def read_user_by_id(
     user_id: int, session: SessionDep, current_user: CurrentUser
@@ -46,3 +74,40 @@ def read_user_by_id(
             detail="The user doesn't have enough privileges",
         )
     return user
+
+
+@router.get(
+    "/{user_id}/scheduling",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_model=UserSchedulingPublic,
+)
+def read_user_scheduling(user_id: int, redis_client: RedisDep) -> Any:
+    """
+    Get a user's batch concurrency cap and weight, and their queued and running
+    tasks.
+    """
+    return fair_scheduler.get_user_state(redis_client, user_id)
+
+
+@router.put(
+    "/{user_id}/scheduling",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_model=UserSchedulingPublic,
+)
+def update_user_scheduling(
+    user_id: int,
+    scheduling: UserScheduling,
+    session: SessionDep,
+    redis_client: RedisDep,
+) -> Any:
+    """
+    Override a user's batch concurrency cap and weight. A user with weight 2
+    gets twice the share of the workers of a user with weight 1 while both have
+    tasks queued.
+    """
+    if not session.get(User, user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    fair_scheduler.set_user_limits(
+        redis_client, user_id, scheduling.max_in_flight, scheduling.weight
+    )
+    return fair_scheduler.get_user_state(redis_client, user_id)
@@ -0,0 +1,23 @@
+"""
+Provider-wide backoff after the LLM provider rate limited a call.
+
+The deadline is shared through Redis, so no API process or worker spends a
+call that is bound to be rejected while it lasts.
+"""
+
+import redis
+
+BACKOFF_KEY = "llm:backoff"
+
+
+def set_backoff(redis_client: redis.Redis, seconds: float) -> None:
+    """Hold off LLM calls for `seconds`, unless a longer backoff is running"""
+    milliseconds = int(seconds * 1000)
+    if milliseconds > 0 and redis_client.pttl(BACKOFF_KEY) < milliseconds:
+        redis_client.set(BACKOFF_KEY, 1, px=milliseconds)
+
+
+def get_backoff(redis_client: redis.Redis) -> float:
+    """Seconds left until LLM calls may be made again, 0 if they may now"""
+    milliseconds = redis_client.pttl(BACKOFF_KEY)
+    return milliseconds / 1000 if milliseconds > 0 else 0.0
@@ -0,0 +1,32 @@
+"""
+Paused and cancelled flags of batch jobs, cached in Redis so workers can check
+them before every LLM call without querying Postgres. The job status in the
+database stays the source of truth.
+"""
+
+import redis
+
+from app.core.config import settings
+from app.models import BatchStatus
+
+
+def _key(batch_job_id: int) -> str:
+    return f"batch:state:{batch_job_id}"
+
+
+def set_job_state(
+    redis_client: redis.Redis, batch_job_id: int, state: BatchStatus | None
+) -> None:
+    """Flag a job as paused or cancelled; None clears the flag"""
+    if state is None:
+        redis_client.delete(_key(batch_job_id))
+    else:
+        redis_client.set(
+            _key(batch_job_id), state.value, ex=settings.BATCH_STATE_TTL_SECONDS
+        )
+
+
+def get_job_state(redis_client: redis.Redis, batch_job_id: int) -> BatchStatus | None:
+    """The flagged state of a job, or None if it may run"""
+    state = redis_client.get(_key(batch_job_id))
+    return BatchStatus(state) if state else None
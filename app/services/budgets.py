@@ -0,0 +1,142 @@
+"""
+LLM token budgets per user and for the whole deployment ("org"), per UTC day
+and month.
+
+Spend is counted in Redis as it happens, so admission checks never touch
+Postgres; the flush_token_usage beat task moves the counts into the
+tokenusage table for reporting. A limit of 0 means unlimited.
+"""
+
+from datetime import datetime, UTC
+
+import redis
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.crud import usage as usage_crud
+from app.models import TokenBudget
+
+# Token counts waiting to be flushed, as "user_id:YYYY-MM-DD:direction" fields
+UNFLUSHED_KEY = "tokens:unflushed"
+FLUSHING_KEY = "tokens:flushing"
+
+_PERIOD_FORMATS = {"day": "%Y%m%d", "month": "%Y%m"}
+_PERIOD_TTLS = {"day": 2 * 24 * 3600, "month": 32 * 24 * 3600}
+
+
+def _limits() -> dict[tuple[str, str], int]:
+    return {
+        ("user", "day"): settings.TOKEN_BUDGET_USER_DAILY,
+        ("user", "month"): settings.TOKEN_BUDGET_USER_MONTHLY,
+        ("org", "day"): settings.TOKEN_BUDGET_ORG_DAILY,
+        ("org", "month"): settings.TOKEN_BUDGET_ORG_MONTHLY,
+    }
+
+
+def _key(scope: str, period: str, user_id: int, now: datetime) -> str:
+    owner = f"user:{user_id}" if scope == "user" else "org"
+    return f"tokens:{owner}:{period}:{now.strftime(_PERIOD_FORMATS[period])}"
+
+
+def max_input_tokens() -> int:
+    """Most input tokens one course can cost, see BaseLLMService"""
+    return max(
+        settings.LLM_MAX_INPUT_TOKENS,
+        settings.LLM_CHUNK_TOKENS * settings.LLM_MAX_CHUNKS,
+    )
+
+
+def estimate_tokens(description_tokens: int, courses: int = 1) -> int:
+    """
+    Upper estimate of the tokens needed to summarize `courses` descriptions
+    that have `description_tokens` tokens in total
+    """
+    return description_tokens + courses * settings.LLM_MAX_OUTPUT_TOKENS
+
+
+def get_usage(redis_client: redis.Redis, user_id: int) -> list[TokenBudget]:
+    """Current spend against every budget that applies to the user"""
+    now = datetime.now(UTC)
+    limits = _limits()
+    used = redis_client.mget(
+        [_key(scope, period, user_id, now) for scope, period in limits]
+    )
+    budgets = []
+    for ((scope, period), limit), spent in zip(limits.items(), used):
+        spent = int(spent or 0)
+        budgets.append(
+            TokenBudget(
+                scope=scope,
+                period=period,
+                used=spent,
+                limit=limit or None,
+                remaining=max(limit - spent, 0) if limit else None,
+            )
+        )
+    return budgets
+
+
+def remaining_tokens(redis_client: redis.Redis, user_id: int) -> int | None:
+    """Tokens the user may still spend, or None if no budget applies"""
+    remaining = [
+        budget.remaining
+        for budget in get_usage(redis_client, user_id)
+        if budget.remaining is not None
+    ]
+    return min(remaining) if remaining else None
+
+
+def has_budget(redis_client: redis.Redis, user_id: int, tokens: int = 1) -> bool:
+    remaining = remaining_tokens(redis_client, user_id)
+    return remaining is None or remaining >= tokens
+
+
+def record_usage(
+    redis_client: redis.Redis, user_id: int, prompt_tokens: int, completion_tokens: int
+) -> None:
+    """Count spent tokens against the user's and the org's budgets"""
+    total = prompt_tokens + completion_tokens
+    if not total:
+        return
+
+    now = datetime.now(UTC)
+    day = now.date().isoformat()
+    pipe = redis_client.pipeline()
+    for scope, period in _limits():
+        key = _key(scope, period, user_id, now)
+        pipe.incrby(key, total)
+        pipe.expire(key, _PERIOD_TTLS[period])
+    pipe.hincrby(UNFLUSHED_KEY, f"{user_id}:{day}:prompt", prompt_tokens)
+    pipe.hincrby(UNFLUSHED_KEY, f"{user_id}:{day}:completion", completion_tokens)
+    pipe.execute()
+
+
+def flush_usage(redis_client: redis.Redis, session: Session) -> int:
+    """
+    Move the counts recorded since the last flush into the tokenusage table.
+
+    The pending hash is renamed before it is read, so counts recorded during
+    the flush go to a fresh hash. A batch left behind by a failed flush is
+    written first.
+
+    Returns:
+        int: Number of (user, day) rows written
+    """
+    if not redis_client.exists(FLUSHING_KEY):
+        try:
+            redis_client.rename(UNFLUSHED_KEY, FLUSHING_KEY)
+        except redis.ResponseError:  # Nothing recorded since the last flush
+            return 0
+
+    rows: dict[tuple[int, str], dict] = {}
+    for field, tokens in redis_client.hgetall(FLUSHING_KEY).items():
+        user_id, day, direction = field.split(":")
+        row = rows.setdefault(
+            (int(user_id), day),
+            {"user_id": int(user_id), "day": day, "prompt": 0, "completion": 0},
+        )
+        row[direction] += int(tokens)
+
+    usage_crud.add_token_usage(session=session, rows=list(rows.values()))
+    redis_client.delete(FLUSHING_KEY)
+    return len(rows)
@@ -0,0 +1,51 @@
+"""
+Local text embeddings for semantic course search.
+
+Embeddings are computed on the CPU with fastembed (the `search` extra), which
+runs small ONNX models without a GPU or an API call. Courses are embedded by
+their title and summary, queries as they are; both with the same model, so
+their cosine distance ranks courses by meaning rather than by shared words.
+"""
+
+import logging
+from functools import lru_cache
+
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+# Dimensions of SEARCH_EMBEDDING_MODEL and of the courseembedding column
+DIMENSIONS = 384
+# Descriptions stand in for missing summaries, cut to this length
+DESCRIPTION_CHARS = 1000
+
+
+@lru_cache
+def _model():
+    try:
+        from fastembed import TextEmbedding
+    except ImportError:
+        logger.warning("SEARCH_EMBEDDINGS is set but the search extra is not installed")
+        return None
+    return TextEmbedding(settings.SEARCH_EMBEDDING_MODEL)
+
+
+def enabled() -> bool:
+    """Whether semantic search is configured and the model can be loaded"""
+    return settings.SEARCH_EMBEDDINGS and _model() is not None
+
+
+def course_text(title: str, ai_summary: str, description: str) -> str:
+    """The text a course is embedded by"""
+    return f"{title}\n{ai_summary or description[:DESCRIPTION_CHARS]}"
+
+
+def embed_courses(texts: list[str]) -> list[list[float]]:
+    """Embed course texts made by course_text()"""
+    return [vector.tolist() for vector in _model().passage_embed(texts)]
+
+
+def embed_query(query: str) -> list[float]:
+    """Embed a search query"""
+    return next(iter(_model().query_embed(query))).tolist()
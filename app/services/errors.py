@@ -0,0 +1,48 @@
+"""
+Errors raised by the LLM service.
+
+They carry no HTTP semantics, so the workers can use the service without
+loading the web stack and decide from the class alone whether another attempt
+can succeed; the routers translate them into responses.
+"""
+
+
+class LLMError(Exception):
+    """Generating a summary failed"""
+
+    # Whether the same request may succeed when tried again later
+    retryable = False
+
+
+class RateLimited(LLMError):
+    """The provider is rate limiting us; retry after `retry_after` seconds"""
+
+    retryable = True
+
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Timeout(LLMError):
+    """The call did not finish within LLM_TIMEOUT_SECONDS"""
+
+    retryable = True
+
+
+class Unavailable(LLMError):
+    """The provider failed or could not be reached"""
+
+    retryable = True
+
+
+class ContextTooLong(LLMError):
+    """The prompt does not fit the model's context window"""
+
+
+class ContentFiltered(LLMError):
+    """The provider's content filter rejected the prompt or the summary"""
+
+
+class Permanent(LLMError):
+    """The request is invalid or not authorized; retrying cannot help"""
@@ -0,0 +1,326 @@
+"""
+Fair scheduling of batch tasks across users.
+
+With one broker queue, the first user to submit a large batch would hold every
+worker until it finished. Instead, tasks wait in a ready queue per user in
+Redis and are released to the broker by deficit round-robin: users take turns,
+and each turn a user may send tasks worth up to BATCH_SCHEDULER_QUANTUM_TOKENS
+times their weight of estimated LLM tokens, so users get equal shares of LLM
+work, not of task counts. Only about as many tasks as the workers can run
+(BATCH_SCHEDULER_MAX_IN_FLIGHT) are in the broker or running at a time, so a
+small batch waits at most for one round of turns, and no user has more than
+their cap of tasks running.
+
+Every released task holds a slot until its worker releases it, or until
+BATCH_LEASE_SECONDS have passed in case the worker died. Dispatching runs
+whenever tasks are submitted or released and on every maintenance sweep.
+
+All keys share the {sched} hash tag and the scripts only touch the keys passed
+to them, so the scheduler also runs on Redis Cluster.
+"""
+
+import time
+from functools import lru_cache
+
+import redis
+
+from app.core.config import settings
+
+ACTIVE_KEY = "{sched}:active"  # Users with queued tasks, in turn order
+MEMBERS_KEY = "{sched}:members"  # The same users, as a set
+DEFICIT_KEY = "{sched}:deficit"  # User -> unused tokens of their turns
+CAPS_KEY = "{sched}:caps"  # User -> max tasks in flight, overriding the default
+WEIGHTS_KEY = "{sched}:weights"  # User -> weight, 1 when unset
+RUNNING_KEY = "{sched}:running"  # Task ID -> slot expiry, all users
+# Arguments per RPUSH when submitting
+SUBMIT_CHUNK = 1000
+# Turns per dispatch script call; the script only sees the queues of the users
+# at the front of the active list, and keeping it short keeps Redis responsive
+VISITS_PER_CALL = 16
+# Turns per dispatch at most, in case every user is still saving up credit
+MAX_VISITS = 10_000
+
+# KEYS: the user's queue, MEMBERS_KEY, ACTIVE_KEY
+_SUBMIT = """
+local user = ARGV[1]
+redis.call('RPUSH', KEYS[1], unpack(ARGV, 2))
+if redis.call('SADD', KEYS[2], user) == 1 then
+    redis.call('RPUSH', KEYS[3], user)
+end
+"""
+
+# KEYS: ACTIVE_KEY, MEMBERS_KEY, DEFICIT_KEY, CAPS_KEY, WEIGHTS_KEY, RUNNING_KEY,
+# then the queue and running keys of every user in ARGV[8:]. Stops at the first
+# turn of a user whose keys were not passed. Returns whether to call again, the
+# number of users blocked by their cap in a row, and "user:task:job" for every
+# task to send to the broker
+_DISPATCH = """
+local now = tonumber(ARGV[1])
+local lease = tonumber(ARGV[2])
+local max_in_flight = tonumber(ARGV[3])
+local default_cap = tonumber(ARGV[4])
+local quantum = tonumber(ARGV[5])
+local max_visits = tonumber(ARGV[6])
+-- Users visited in a row that could not send anything because of their cap
+local blocked = tonumber(ARGV[7])
+
+local active_key, members_key, deficit_key = KEYS[1], KEYS[2], KEYS[3]
+local caps_key, weights_key, all_running = KEYS[4], KEYS[5], KEYS[6]
+local declared = {}
+for i = 8, #ARGV do
+    declared[ARGV[i]] = 7 + 2 * (i - 8)
+end
+
+local function leave(user)
+    redis.call('LPOP', active_key)
+    redis.call('SREM', members_key, user)
+    redis.call('HDEL', deficit_key, user)
+end
+
+redis.call('ZREMRANGEBYSCORE', all_running, '-inf', now)
+local in_flight = redis.call('ZCARD', all_running)
+local dispatched = {}
+local visits = 0
+local more = 0
+
+while in_flight < max_in_flight do
+    local active = redis.call('LLEN', active_key)
+    if active == 0 or blocked >= active then
+        break
+    end
+    local user = redis.call('LINDEX', active_key, 0)
+    if visits >= max_visits or not declared[user] then
+        more = 1
+        break
+    end
+    visits = visits + 1
+
+    local queue = KEYS[declared[user]]
+    local running = KEYS[declared[user] + 1]
+    redis.call('ZREMRANGEBYSCORE', running, '-inf', now)
+    local cap = tonumber(redis.call('HGET', caps_key, user) or default_cap)
+    local weight = math.max(tonumber(redis.call('HGET', weights_key, user) or 1), 1)
+    local head = redis.call('LINDEX', queue, 0)
+
+    if not head then
+        leave(user)
+    elseif cap > 0 and redis.call('ZCARD', running) >= cap then
+        redis.call('LMOVE', active_key, active_key, 'LEFT', 'RIGHT')
+        blocked = blocked + 1
+    else
+        blocked = 0
+        local deficit = tonumber(redis.call('HGET', deficit_key, user) or 0)
+        deficit = deficit + quantum * weight
+        local capped = false
+        while head and in_flight < max_in_flight do
+            if cap > 0 and redis.call('ZCARD', running) >= cap then
+                capped = true
+                break
+            end
+            local task, job, cost = string.match(head, '^(%d+):(%d+):(%d+)$')
+            cost = tonumber(cost)
+            if cost > deficit then
+                break
+            end
+            redis.call('LPOP', queue)
+            deficit = deficit - cost
+            redis.call('ZADD', all_running, now + lease, task)
+            redis.call('ZADD', running, now + lease, task)
+            in_flight = in_flight + 1
+            table.insert(dispatched, user .. ':' .. task .. ':' .. job)
+            head = redis.call('LINDEX', queue, 0)
+        end
+
+        if head then
+            -- Unused credit carries over, but a user stopped by their cap keeps
+            -- no more than one turn's worth, so they can't save up for a burst
+            if capped then
+                deficit = math.min(deficit, quantum * weight)
+            end
+            redis.call('HSET', deficit_key, user, deficit)
+            redis.call('LMOVE', active_key, active_key, 'LEFT', 'RIGHT')
+        else
+            leave(user)
+        end
+    end
+end
+return {more, blocked, unpack(dispatched)}
+"""
+
+
+# KEYS: the user's queue. Rewrites it without the entries of one job; returns
+# how many were dropped
+_DROP = """
+local queue = KEYS[1]
+local job = ':' .. ARGV[1] .. ':'
+local chunk = tonumber(ARGV[2])
+local entries = redis.call('LRANGE', queue, 0, -1)
+local kept = {}
+for _, entry in ipairs(entries) do
+    if not string.find(entry, job, 1, true) then
+        table.insert(kept, entry)
+    end
+end
+if #kept < #entries then
+    redis.call('DEL', queue)
+    for start = 1, #kept, chunk do
+        local stop = math.min(start + chunk - 1, #kept)
+        redis.call('RPUSH', queue, unpack(kept, start, stop))
+    end
+end
+return #entries - #kept
+"""
+
+
+@lru_cache
+def _scripts(redis_client: redis.Redis) -> tuple:
+    return (
+        redis_client.register_script(_SUBMIT),
+        redis_client.register_script(_DISPATCH),
+        redis_client.register_script(_DROP),
+    )
+
+
+def _queue_key(user_id: int | str) -> str:
+    return f"{{sched}}:queue:{user_id}"
+
+
+def _running_key(user_id: int | str) -> str:
+    return f"{{sched}}:running:{user_id}"
+
+
+def submit(redis_client: redis.Redis, tasks: list[tuple[int, int, int, int]]) -> None:
+    """
+    Append tasks to the ready queues of their users
+
+    Args:
+        tasks: (task ID, batch job ID, user ID, estimated tokens) of each task,
+            queued in this order
+    """
+    submit_script, _, _ = _scripts(redis_client)
+    by_user: dict[int, list[str]] = {}
+    for task_id, batch_job_id, user_id, cost in tasks:
+        by_user.setdefault(user_id, []).append(f"{task_id}:{batch_job_id}:{cost}")
+    for user_id, entries in by_user.items():
+        for start in range(0, len(entries), SUBMIT_CHUNK):
+            submit_script(
+                keys=[_queue_key(user_id), MEMBERS_KEY, ACTIVE_KEY],
+                args=[user_id, *entries[start : start + SUBMIT_CHUNK]],
+            )
+
+
+def dispatch(redis_client: redis.Redis) -> list[tuple[int, int, int]]:
+    """
+    Take the tasks that may run now off the ready queues; the caller sends them
+    to the workers
+
+    Returns:
+        list: (task ID, batch job ID, user ID) of each task, in dispatch order
+    """
+    _, dispatch_script, _ = _scripts(redis_client)
+    tasks = []
+    blocked = 0
+    for _ in range(0, MAX_VISITS, VISITS_PER_CALL):
+        # The users whose turns this call may take; the script stops early if
+        # the active list changed in the meantime
+        users = redis_client.lrange(ACTIVE_KEY, 0, VISITS_PER_CALL - 1)
+        if not users:
+            break
+        more, blocked, *dispatched = dispatch_script(
+            keys=[
+                ACTIVE_KEY,
+                MEMBERS_KEY,
+                DEFICIT_KEY,
+                CAPS_KEY,
+                WEIGHTS_KEY,
+                RUNNING_KEY,
+                *(
+                    key
+                    for user in users
+                    for key in (_queue_key(user), _running_key(user))
+                ),
+            ],
+            args=[
+                int(time.time() * 1000),
+                settings.BATCH_LEASE_SECONDS * 1000,
+                settings.BATCH_SCHEDULER_MAX_IN_FLIGHT,
+                settings.BATCH_SCHEDULER_USER_MAX_IN_FLIGHT,
+                settings.BATCH_SCHEDULER_QUANTUM_TOKENS,
+                VISITS_PER_CALL,
+                blocked,
+                *users,
+            ],
+        )
+        for entry in dispatched:
+            user_id, task_id, batch_job_id = entry.split(":")
+            tasks.append((int(task_id), int(batch_job_id), int(user_id)))
+        if not more:
+            break
+    return tasks
+
+
+def drop_job(redis_client: redis.Redis, user_id: int, batch_job_id: int) -> int:
+    """
+    Take the tasks of a job out of its user's ready queue, e.g. when the job
+    is paused, so that resuming it doesn't queue them a second time
+
+    Returns:
+        int: Number of dropped tasks
+    """
+    _, _, drop_script = _scripts(redis_client)
+    return drop_script(keys=[_queue_key(user_id)], args=[batch_job_id, SUBMIT_CHUNK])
+
+
+def release(redis_client: redis.Redis, user_id: int, task_id: int) -> None:
+    """Free the slot of a task whose worker is done with it"""
+    pipeline = redis_client.pipeline()
+    pipeline.zrem(RUNNING_KEY, task_id)
+    pipeline.zrem(_running_key(user_id), task_id)
+    pipeline.execute()
+
+
+def queued_count(redis_client: redis.Redis) -> int:
+    """Number of tasks waiting in the ready queues of all users"""
+    pipeline = redis_client.pipeline()
+    for user_id in redis_client.smembers(MEMBERS_KEY):
+        pipeline.llen(_queue_key(user_id))
+    return sum(pipeline.execute())
+
+
+def set_user_limits(
+    redis_client: redis.Redis,
+    user_id: int,
+    max_in_flight: int | None,
+    weight: int | None,
+) -> None:
+    """Override a user's cap and weight; None restores the default"""
+    pipeline = redis_client.pipeline()
+    for key, value in ((CAPS_KEY, max_in_flight), (WEIGHTS_KEY, weight)):
+        if value is None:
+            pipeline.hdel(key, user_id)
+        else:
+            pipeline.hset(key, user_id, value)
+    pipeline.execute()
+
+
+def get_user_state(redis_client: redis.Redis, user_id: int) -> dict[str, int]:
+    """
+    A user's effective cap and weight, and their queued and running tasks
+
+    Returns:
+        dict: max_in_flight, weight, queued and running
+    """
+    pipeline = redis_client.pipeline()
+    pipeline.hget(CAPS_KEY, user_id)
+    pipeline.hget(WEIGHTS_KEY, user_id)
+    pipeline.llen(_queue_key(user_id))
+    pipeline.zcount(_running_key(user_id), int(time.time() * 1000), "+inf")
+    max_in_flight, weight, queued, running = pipeline.execute()
+    return {
+        "max_in_flight": int(
+            max_in_flight or settings.BATCH_SCHEDULER_USER_MAX_IN_FLIGHT
+        ),
+        "weight": int(weight or 1),
+        "queued": queued,
+        "running": running,
+    }
@@ -1,50 +1,352 @@
-from fastapi import HTTPException, status
+import contextvars
+import random
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 
+from app.core.config import settings
+from app.core.metrics import LLM_CALL_DURATION, LLM_ERRORS, LLM_TOKENS
+from app.core.tracing import start_span
+from app.services import postprocess, tokens
+from app.services.errors import (
+    ContentFiltered,
+    ContextTooLong,
+    LLMError,
+    Permanent,
+    RateLimited,
+    Timeout,
+    Unavailable,
+)
 
-class OpenAILLMService:
-    """OpenAI implementation of the LLM service"""
+SYSTEM_PROMPT = (
+    "You are a helpful assistant that creates concise, informative summaries of "
+    "online courses."
+)
+SUMMARY_PROMPT = "Summarize this online course in 2-3 sentences: {text}"
+CHUNK_PROMPT = (
+    "This is part {part} of {parts} of a long online course description. "
+    "Summarize the key topics it covers in 2-3 sentences: {text}"
+)
 
-    def __init__(self, api_key: str):
-        self.api_key = api_key
 
-    def generate_summary(self, text: str) -> str:
-        """Generate a summary using OpenAI's API"""
-        from openai import OpenAI
-
-        client = OpenAI(api_key=self.api_key)
-
-        response = client.chat.completions.create(
-            model="gpt-4o-mini-2024-07-18",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a helpful assistant that creates concise, informative summaries of online courses.",
-                },
-                {
-                    "role": "user",
-                    "content": f"Summarize this online course in 2-3 sentences: {text}",
-                },
-            ],
-            max_tokens=150,
-            temperature=0.5,
+@dataclass(frozen=True)
+class Prompt:
+    """
+    A versioned set of prompt templates. The version is stored with every
+    summary; `weight` is its share of traffic among the active prompts.
+    """
+
+    version: str
+    system_prompt: str
+    summary_prompt: str
+    chunk_prompt: str
+    weight: int = 1
+
+
+# Version "1" is seeded into the prompttemplate table and used whenever no
+# template can be loaded from the database
+DEFAULT_PROMPT = Prompt(
+    version="1",
+    system_prompt=SYSTEM_PROMPT,
+    summary_prompt=SUMMARY_PROMPT,
+    chunk_prompt=CHUNK_PROMPT,
+)
+
+
+@dataclass
+class SummaryResult:
+    """A generated summary and the tokens spent producing it"""
+
+    text: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    llm_calls: int = 1
+    model: str = ""
+    prompt_version: str = ""
+    finish_reason: str = "stop"
+    postprocess_outcome: str = ""
+
+
+class BaseLLMService(ABC):
+    """
+    Shared summarization logic; backends only implement a single completion
+    call in `_complete`, which is always invoked through `complete`.
+    """
+
+    model: str
+
+    def generate_summary(
+        self, text: str, prompt: Prompt = DEFAULT_PROMPT
+    ) -> SummaryResult:
+        """Generate a summary of the given text with a single LLM call"""
+        return self.complete(
+            prompt.summary_prompt.format(text=text), prompt.system_prompt
         )
-        return response.choices[0].message.content
 
-    def generate_course_summary(self, course_description: str) -> str:
+    def generate_course_summary(
+        self, course_description: str, prompt: Prompt = DEFAULT_PROMPT
+    ) -> SummaryResult:
         """
-        Generate a summary of a course description using OpenAI's GPT API.
+        Generate a summary of a course description.
+
+        Descriptions over LLM_MAX_INPUT_TOKENS are truncated. Above
+        LLM_MAP_REDUCE_THRESHOLD_TOKENS the description is split into chunks that
+        are summarized in parallel, and the chunk summaries are then summarized,
+        so the cost per course stays bounded.
 
         Args:
             course_description: The full course description to summarize
-            llm_service: The LLM service to use for generating the summary
+            prompt: The prompt templates to use
 
         Returns:
             A concise summary of the course description
         """
+        with start_span(
+            "llm.generate_course_summary",
+            model=self.model,
+            prompt_version=prompt.version,
+        ):
+            result = self._generate_course_summary(course_description, prompt)
+            result = postprocess.postprocess_summary(
+                result,
+                lambda text: self.complete(
+                    text, prompt.system_prompt, settings.LLM_CONTINUATION_TOKENS
+                ),
+            )
+        result.model = self.model
+        result.prompt_version = prompt.version
+        return result
+
+    def _generate_course_summary(
+        self, course_description: str, prompt: Prompt
+    ) -> SummaryResult:
         try:
-            return self.generate_summary(course_description)
+            input_tokens = tokens.count_tokens(course_description, self.model)
+            if input_tokens <= settings.LLM_MAX_INPUT_TOKENS:
+                return self.generate_summary(course_description, prompt)
+            if input_tokens <= settings.LLM_MAP_REDUCE_THRESHOLD_TOKENS:
+                return self.generate_summary(
+                    tokens.truncate_to_tokens(
+                        course_description, settings.LLM_MAX_INPUT_TOKENS, self.model
+                    ),
+                    prompt,
+                )
+            return self._map_reduce(course_description, prompt)
+        except LLMError:
+            raise
         except Exception as e:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Failed to generate summary: {str(e)}",
+            raise LLMError(f"Failed to generate summary: {str(e)}") from e
+
+    def _map_reduce(self, text: str, prompt: Prompt) -> SummaryResult:
+        budget = settings.LLM_CHUNK_TOKENS * settings.LLM_MAX_CHUNKS
+        text = tokens.truncate_to_tokens(text, budget, self.model)
+        chunks = tokens.split_into_chunks(text, settings.LLM_CHUNK_TOKENS, self.model)
+        chunks = chunks[: settings.LLM_MAX_CHUNKS]
+
+        def summarize_chunk(part: int, chunk: str) -> SummaryResult:
+            return self.complete(
+                prompt.chunk_prompt.format(part=part, parts=len(chunks), text=chunk),
+                prompt.system_prompt,
+            )
+
+        # Pool threads start with an empty context; run each chunk in a copy of
+        # the caller's, so its span stays under the current trace
+        with ThreadPoolExecutor(max_workers=settings.LLM_MAP_CONCURRENCY) as pool:
+            futures = [
+                pool.submit(
+                    contextvars.copy_context().run, summarize_chunk, part, chunk
+                )
+                for part, chunk in enumerate(chunks, start=1)
+            ]
+            partials = [future.result() for future in futures]
+
+        combined = self.generate_summary("\n\n".join(p.text for p in partials), prompt)
+        combined.prompt_tokens += sum(p.prompt_tokens for p in partials)
+        combined.completion_tokens += sum(p.completion_tokens for p in partials)
+        combined.llm_calls += len(partials)
+        return combined
+
+    def complete(
+        self,
+        prompt: str,
+        system_prompt: str = SYSTEM_PROMPT,
+        max_tokens: int | None = None,
+    ) -> SummaryResult:
+        """Run one completion call, recording its latency, tokens and errors"""
+        start = time.perf_counter()
+        with start_span("llm.complete", model=self.model) as span:
+            try:
+                result = self._complete(
+                    prompt, system_prompt, max_tokens or settings.LLM_MAX_OUTPUT_TOKENS
+                )
+            except Exception as e:
+                LLM_ERRORS.labels(self.model, type(e).__name__).inc()
+                raise
+            finally:
+                LLM_CALL_DURATION.labels(self.model).observe(
+                    time.perf_counter() - start
+                )
+
+            if span is not None:
+                span.set_attribute("llm.prompt_tokens", result.prompt_tokens)
+                span.set_attribute("llm.completion_tokens", result.completion_tokens)
+
+        LLM_TOKENS.labels(self.model, "in").inc(result.prompt_tokens)
+        LLM_TOKENS.labels(self.model, "out").inc(result.completion_tokens)
+        return result
+
+    @abstractmethod
+    def _complete(
+        self, prompt: str, system_prompt: str, max_tokens: int
+    ) -> SummaryResult: ...
+
+
+class OpenAILLMService(BaseLLMService):
+    """
+    OpenAI implementation of the LLM service. With a base_url it talks to any
+    OpenAI-compatible server, such as a local vLLM or llama.cpp instance.
+    """
+
+    def __init__(
+        self, api_key: str, model: str | None = None, base_url: str | None = None
+    ):
+        self.api_key = api_key
+        self.model = model or settings.LLM_MODEL
+        self.base_url = base_url or None
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import OpenAI
+
+            self._client = OpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                timeout=settings.LLM_TIMEOUT_SECONDS,
+                max_retries=settings.LLM_CLIENT_MAX_RETRIES,
+            )
+        return self._client
+
+    def _complete(
+        self, prompt: str, system_prompt: str, max_tokens: int
+    ) -> SummaryResult:
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt},
+                ],
+                max_tokens=max_tokens,
+                temperature=0.5,
             )
+        except Exception as e:
+            raise _openai_error(e) from e
+        usage = response.usage
+        choice = response.choices[0]
+        if choice.finish_reason == "content_filter":
+            raise ContentFiltered("The summary was withheld by the content filter")
+        return SummaryResult(
+            text=choice.message.content or "",
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+            finish_reason=choice.finish_reason or "stop",
+        )
+
+
+def _openai_error(e: Exception) -> LLMError:
+    """Classify an exception raised by the openai client"""
+    import openai
+
+    message = f"{type(e).__name__}: {e}"
+    if isinstance(e, openai.APITimeoutError):
+        return Timeout(message)
+    if isinstance(e, openai.APIConnectionError):
+        return Unavailable(message)
+    if not isinstance(e, openai.APIStatusError):
+        return LLMError(message)
+
+    code = getattr(e, "code", None) or ""
+    if isinstance(e, openai.RateLimitError):
+        # An exhausted quota is reported as 429 too, but waiting won't fix it
+        if code == "insufficient_quota":
+            return Permanent(message)
+        return RateLimited(message, _retry_after(e.response.headers))
+    if code == "context_length_exceeded":
+        return ContextTooLong(message)
+    if code in ("content_filter", "content_policy_violation"):
+        return ContentFiltered(message)
+    if e.status_code >= 500:
+        return Unavailable(message)
+    return Permanent(message)
+
+
+def _retry_after(headers) -> float | None:
+    """Seconds to wait from the retry-after-ms or retry-after header"""
+    for name, scale in (("retry-after-ms", 1000), ("retry-after", 1)):
+        try:
+            return float(headers.get(name)) / scale
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+class StubLLMService(BaseLLMService):
+    """
+    Offline stand-in for load testing. Summaries are derived from the input
+    text, so they are deterministic; latency follows a log-normal distribution
+    plus generation time at `tokens_per_second`, and a share of calls fail.
+    """
+
+    def __init__(
+        self,
+        model: str = "stub",
+        latency_ms: float = 800.0,
+        latency_sigma: float = 0.5,
+        error_rate: float = 0.0,
+        tokens_per_second: float = 50.0,
+        seed: int | None = None,
+    ):
+        self.model = model
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.tokens_per_second = tokens_per_second
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _complete(
+        self, prompt: str, system_prompt: str, max_tokens: int
+    ) -> SummaryResult:
+        with self._lock:
+            latency = self._random.lognormvariate(0, self.latency_sigma)
+            failed = self._random.random() < self.error_rate
+
+        text = prompt.split(": ", 1)[-1]
+        sentences = [s for s in re.split(r"(?<=[.!?])\s+", text) if s][:2]
+        summary = " ".join(sentences)[:600] or "This course has no description."
+        completion_tokens = tokens.count_tokens(summary, self.model)
+        finish_reason = "stop"
+        if completion_tokens > max_tokens:
+            # Cut off like a real model, at roughly max_tokens
+            summary = summary[: len(summary) * max_tokens // completion_tokens]
+            completion_tokens = max_tokens
+            finish_reason = "length"
+
+        time.sleep(
+            latency * self.latency_ms / 1000
+            + completion_tokens / self.tokens_per_second
+        )
+        if failed:
+            raise Unavailable("Stub LLM backend injected failure")
+
+        return SummaryResult(
+            text=summary,
+            prompt_tokens=tokens.count_tokens(prompt, self.model),
+            completion_tokens=completion_tokens,
+            finish_reason=finish_reason,
+        )
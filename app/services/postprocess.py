@@ -0,0 +1,104 @@
+"""
+Local validation of generated summaries.
+
+A summary that was cut off by max_tokens, or that does not end with a full
+sentence, is trimmed to its last full sentence. Only when that would leave less
+than SUMMARY_MIN_CHARS is the model asked for a short continuation, which is far
+cheaper than regenerating the whole summary. Summaries over SUMMARY_MAX_CHARS
+are trimmed the same way, or cut at the limit when no sentence ends before it.
+"""
+
+import re
+from collections.abc import Callable
+from typing import TYPE_CHECKING
+
+from app.core.config import settings
+from app.core.metrics import SUMMARY_POSTPROCESS
+
+if TYPE_CHECKING:
+    from app.services.llm import SummaryResult
+
+CONTINUATION_PROMPT = (
+    "This course summary was cut off mid-sentence. Reply with only the words "
+    "that complete its last sentence: {text}"
+)
+
+# A sentence ends with . ! or ?, optionally followed by closing quotes or brackets
+_SENTENCE_END = re.compile(r"[.!?][\"')\]]*(?=\s|$)")
+
+
+def ends_with_sentence(text: str) -> bool:
+    return bool(text) and trim_to_sentence(text) == text
+
+
+def trim_to_sentence(text: str) -> str:
+    """Cut the text after its last complete sentence; empty if there is none"""
+    ends = list(_SENTENCE_END.finditer(text))
+    return text[: ends[-1].end()] if ends else ""
+
+
+def _fit(text: str) -> str:
+    """
+    Cut the text to SUMMARY_MAX_CHARS at its last complete sentence, or at the
+    limit itself if no sentence ends before it
+    """
+    head = text[: settings.SUMMARY_MAX_CHARS]
+    return trim_to_sentence(head) or head.rstrip()
+
+
+def postprocess_summary(
+    result: "SummaryResult", complete: Callable[[str], "SummaryResult"]
+) -> "SummaryResult":
+    """
+    Validate a summary and repair it if it was cut off or is too long.
+
+    Args:
+        result: The generated summary
+        complete: Runs the continuation prompt, only called when trimming is
+            not enough
+
+    Returns:
+        The summary with postprocess_outcome set to accepted, too_short,
+        trimmed, continued or incomplete; continuation tokens are included
+    """
+    text = result.text.strip()
+    cut_off = result.finish_reason == "length" or not ends_with_sentence(text)
+
+    if not text:
+        # Nothing to continue from
+        outcome = "too_short"
+    elif not cut_off and len(text) <= settings.SUMMARY_MAX_CHARS:
+        outcome = "accepted"
+    elif (
+        not cut_off
+        or len(trim_to_sentence(text)) >= settings.SUMMARY_MIN_CHARS
+        # A continuation could only make it longer
+        or len(text) >= settings.SUMMARY_MAX_CHARS
+    ):
+        text = _fit(text)
+        outcome = "trimmed" if ends_with_sentence(text) else "incomplete"
+    else:
+        continuation = complete(CONTINUATION_PROMPT.format(text=text))
+        result.prompt_tokens += continuation.prompt_tokens
+        result.completion_tokens += continuation.completion_tokens
+        result.llm_calls += continuation.llm_calls
+
+        candidate = f"{text} {continuation.text.strip()}"
+        if (
+            ends_with_sentence(candidate)
+            and len(candidate) <= settings.SUMMARY_MAX_CHARS
+        ):
+            text = candidate
+            outcome = "continued"
+        else:
+            text = _fit(candidate)
+            outcome = "incomplete"
+
+    # However it was repaired, this is too little to be a summary
+    if outcome != "incomplete" and len(text) < settings.SUMMARY_MIN_CHARS:
+        outcome = "too_short"
+
+    SUMMARY_POSTPROCESS.labels(outcome).inc()
+    result.text = text
+    result.postprocess_outcome = outcome
+    return result
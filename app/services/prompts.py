@@ -0,0 +1,73 @@
+"""
+Prompt selection. Active prompt templates (weight > 0) are loaded from the
+database and cached per process for PROMPT_CACHE_SECONDS; each course is
+assigned one of them in proportion to the weights, deterministically by course
+ID, so a course keeps its prompt while an A/B split is running.
+"""
+
+import logging
+import threading
+import time
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.hashing import text_hash
+from app.crud import prompts as prompts_crud
+from app.services.llm import DEFAULT_PROMPT, Prompt
+
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_cache: tuple[float, list[Prompt]] | None = None
+
+
+def get_active_prompts() -> list[Prompt]:
+    """The active prompts, or the built-in default when none can be loaded"""
+    global _cache
+    with _lock:
+        if _cache is not None and time.monotonic() < _cache[0]:
+            return _cache[1]
+
+        try:
+            with Session(engine) as session:
+                templates = prompts_crud.get_prompt_templates(
+                    session=session, active_only=True
+                )
+            active = [
+                Prompt(
+                    version=t.version,
+                    system_prompt=t.system_prompt,
+                    summary_prompt=t.summary_prompt,
+                    chunk_prompt=t.chunk_prompt,
+                    weight=t.weight,
+                )
+                for t in templates
+            ]
+        except Exception:
+            logger.exception("Failed to load prompt templates")
+            active = []
+
+        active = active or [DEFAULT_PROMPT]
+        _cache = (time.monotonic() + settings.PROMPT_CACHE_SECONDS, active)
+        return active
+
+
+def get_active_versions() -> list[str]:
+    return [prompt.version for prompt in get_active_prompts()]
+
+
+def choose_prompt(course_id: int) -> Prompt:
+    """Pick the prompt for a course according to the weights"""
+    active = get_active_prompts()
+    if len(active) == 1:
+        return active[0]
+
+    point = int(text_hash(str(course_id))[:8], 16) % sum(p.weight for p in active)
+    for prompt in active:
+        point -= prompt.weight
+        if point < 0:
+            return prompt
+    return active[-1]
@@ -0,0 +1,68 @@
+"""
+Registry of LLM backends. The backend is chosen with Settings.LLM_BACKEND, and
+both the API and the workers resolve their service through get_llm_service.
+"""
+
+from collections.abc import Callable
+from functools import lru_cache
+
+from app.core.config import Settings, settings
+from app.protocols import LLMService
+from app.services.llm import OpenAILLMService, StubLLMService
+
+LLM_BACKENDS: dict[str, Callable[[Settings], LLMService]] = {}
+
+
+def register_backend(name: str):
+    """Register a factory that builds an LLM service from the settings"""
+
+    def decorator(factory: Callable[[Settings], LLMService]):
+        LLM_BACKENDS[name] = factory
+        return factory
+
+    return decorator
+
+
+@register_backend("openai")
+def _openai(config: Settings) -> LLMService:
+    if not config.OPENAI_API_KEY:
+        raise ValueError("OpenAI API key not configured")
+    return OpenAILLMService(api_key=config.OPENAI_API_KEY, model=config.LLM_MODEL)
+
+
+@register_backend("openai_compatible")
+def _openai_compatible(config: Settings) -> LLMService:
+    if not config.LLM_BASE_URL:
+        raise ValueError("LLM_BASE_URL not configured")
+    # Local servers usually ignore the key, but the client requires one
+    return OpenAILLMService(
+        api_key=config.OPENAI_API_KEY or "not-needed",
+        model=config.LLM_MODEL,
+        base_url=config.LLM_BASE_URL,
+    )
+
+
+@register_backend("stub")
+def _stub(config: Settings) -> LLMService:
+    return StubLLMService(
+        latency_ms=config.LLM_STUB_LATENCY_MS,
+        latency_sigma=config.LLM_STUB_LATENCY_SIGMA,
+        error_rate=config.LLM_STUB_ERROR_RATE,
+        tokens_per_second=config.LLM_STUB_TOKENS_PER_SECOND,
+        seed=config.LLM_STUB_SEED,
+    )
+
+
+@lru_cache
+def get_llm_service(backend: str | None = None) -> LLMService:
+    """
+    Build the configured LLM service once per process, so its HTTP client and
+    connection pool are reused.
+
+    Raises:
+        ValueError: If the backend is unknown or not configured
+    """
+    name = backend or settings.LLM_BACKEND
+    if name not in LLM_BACKENDS:
+        raise ValueError(f"Unknown LLM backend: {name}")
+    return LLM_BACKENDS[name](settings)
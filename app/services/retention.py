@@ -0,0 +1,102 @@
+"""
+Partition maintenance for batchjob and batchtask: monthly partitions are
+created ahead of time, and finished months past the retention period are
+archived to gzipped CSV files and dropped, so the hot tables stay small.
+"""
+
+import gzip
+import logging
+import os
+from datetime import datetime, UTC
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.crud import partitions
+
+
+logger = logging.getLogger(__name__)
+
+
+def ensure_partitions(session: Session) -> list[str]:
+    """
+    Create the partitions for the current month and the months ahead.
+
+    Returns:
+        The names of the partitions that now exist for those months
+    """
+    today = datetime.now(UTC).date()
+    created = []
+    for months in range(settings.BATCH_PARTITION_MONTHS_AHEAD + 1):
+        month = partitions.month_start(today, months)
+        for table in partitions.PARTITIONED_TABLES:
+            try:
+                created.append(
+                    partitions.create_partition(
+                        session=session, table=table, month=month
+                    )
+                )
+            except Exception:
+                # E.g. rows for the month already landed in the default partition
+                session.rollback()
+                logger.exception(f"Failed to create the {month} partition of {table}")
+    return created
+
+
+def archive_partition(session: Session, name: str, archive_dir: str) -> str:
+    """
+    Copy a partition to <archive_dir>/<name>.csv.gz.
+
+    The file is written under a temporary name and renamed once complete, so
+    a partial archive is never mistaken for a finished one.
+
+    Returns:
+        The path of the archive file
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.csv.gz")
+    partial = f"{path}.partial"
+
+    dbapi_connection = session.connection().connection.dbapi_connection
+    with dbapi_connection.cursor() as cursor, gzip.open(partial, "wb") as f:
+        with cursor.copy(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)") as copy:
+            for data in copy:
+                f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(partial, path)
+    return path
+
+
+def archive_expired_partitions(session: Session) -> list[str]:
+    """
+    Archive and drop the partitions of months older than BATCH_RETENTION_MONTHS.
+
+    A month is only archived once no job created in or before it is still
+    running.
+
+    Returns:
+        The paths of the archive files written
+    """
+    if not settings.BATCH_RETENTION_MONTHS:
+        return []
+
+    cutoff = partitions.month_start(
+        datetime.now(UTC).date(), -settings.BATCH_RETENTION_MONTHS
+    )
+    archived = []
+    for table in partitions.PARTITIONED_TABLES:
+        for name, month in partitions.get_partitions(session=session, table=table):
+            end = partitions.month_start(month, 1)
+            if end > cutoff:
+                break
+            if partitions.has_unfinished_jobs(session=session, before=end):
+                logger.warning(f"Not archiving {name}: it has unfinished batch jobs")
+                break
+
+            path = archive_partition(session, name, settings.BATCH_ARCHIVE_DIR)
+            partitions.drop_partition(session=session, table=table, name=name)
+            logger.info(f"Archived {name} to {path}")
+            archived.append(path)
+    return archived
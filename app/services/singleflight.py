@@ -0,0 +1,78 @@
+"""Redis-backed single-flight: one caller does the work, concurrent callers share it"""
+
+import time
+import uuid
+from collections.abc import Callable
+
+import redis
+
+# Delete the lock only if we still own it
+_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key across processes.
+
+    The first caller takes a Redis lock and runs the function; callers that
+    arrive while it is running, or shortly after it finished, wait for and
+    share its result instead of running the function again. If the leader
+    fails, one of the waiting callers takes over.
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        namespace: str,
+        lock_seconds: float,
+        wait_seconds: float,
+        result_seconds: float = 10,
+        poll_seconds: float = 0.1,
+    ):
+        self.redis = redis_client
+        self.namespace = namespace
+        self.lock_seconds = lock_seconds
+        self.wait_seconds = wait_seconds
+        self.result_seconds = result_seconds
+        self.poll_seconds = poll_seconds
+
+    def run(self, key: str, fn: Callable[[], str]) -> tuple[str, bool]:
+        """
+        Run `fn` once for all concurrent callers using `key`.
+
+        Returns:
+            The result and whether it was shared from another caller
+
+        Raises:
+            TimeoutError: If no result arrived within wait_seconds
+        """
+        lock_key = f"{self.namespace}:lock:{key}"
+        result_key = f"{self.namespace}:result:{key}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.wait_seconds
+
+        while True:
+            result = self.redis.get(result_key)
+            if result is not None:
+                return result, True
+
+            if self.redis.set(
+                lock_key, token, nx=True, px=int(self.lock_seconds * 1000)
+            ):
+                try:
+                    result = fn()
+                    self.redis.set(
+                        result_key, result, px=int(self.result_seconds * 1000)
+                    )
+                    return result, False
+                finally:
+                    self.redis.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Timed out waiting for {key}")
+            time.sleep(self.poll_seconds)
@@ -0,0 +1,132 @@
+"""
+Local token counting used to keep LLM prompts within budget.
+
+tiktoken is used when it is installed and its encoding can be loaded (it is
+fetched once and cached, see TIKTOKEN_CACHE_DIR). Otherwise token counts are
+approximated from the text length, which is good enough for budgeting.
+"""
+
+import logging
+import re
+from functools import lru_cache
+
+
+logger = logging.getLogger(__name__)
+
+# Rough average for English text with OpenAI tokenizers
+CHARS_PER_TOKEN = 4
+
+_BOUNDARY = re.compile(r"\n\s*\n|(?<=[.!?])\s+")
+
+
+class _ApproximateEncoding:
+    """Stand-in for a tiktoken encoding: one token per CHARS_PER_TOKEN chars"""
+
+    def encode(self, text: str) -> list[str]:
+        return [
+            text[i : i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)
+        ]
+
+    def decode(self, tokens: list[str]) -> str:
+        return "".join(tokens)
+
+
+@lru_cache
+def get_encoding(model: str):
+    """Return the tokenizer for a model, falling back to an approximation"""
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"Using approximate token counts for {model}: {e}")
+        return _ApproximateEncoding()
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Count the tokens `text` uses for `model`"""
+    return len(get_encoding(model).encode(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str) -> str:
+    """
+    Shorten `text` to at most `max_tokens` tokens.
+
+    Most of the budget goes to the start of the text, where course descriptions
+    put their overview, and the rest to the end. Both parts are cut back to a
+    paragraph or sentence boundary when one is close.
+
+    Args:
+        text: The text to shorten
+        max_tokens: Token budget for the result
+        model: Model whose tokenizer is used
+
+    Returns:
+        The text itself if it fits, otherwise its head and tail joined by "[...]"
+    """
+    encoding = get_encoding(model)
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+
+    head_tokens = max_tokens * 4 // 5
+    tail_tokens = max_tokens - head_tokens - 3  # Room for the separator
+    head = _cut_to_boundary(encoding.decode(tokens[:head_tokens]), from_end=False)
+    tail = ""
+    if tail_tokens > 0:
+        tail = _cut_to_boundary(encoding.decode(tokens[-tail_tokens:]), from_end=True)
+    return f"{head}\n[...]\n{tail}".rstrip()
+
+
+def split_into_chunks(text: str, chunk_tokens: int, model: str) -> list[str]:
+    """
+    Split `text` into pieces of at most `chunk_tokens` tokens, preferring to
+    break between paragraphs and sentences.
+    """
+    encoding = get_encoding(model)
+    chunks: list[str] = []
+    current: list[str] = []
+    current_tokens = 0
+
+    for segment in _segments(text):
+        tokens = encoding.encode(segment)
+        if len(tokens) > chunk_tokens:
+            # A single oversized segment is split on token boundaries
+            pieces = [
+                encoding.decode(tokens[i : i + chunk_tokens])
+                for i in range(0, len(tokens), chunk_tokens)
+            ]
+        else:
+            pieces = [segment]
+
+        for piece in pieces:
+            # Count the joining space too, so chunks stay within budget
+            piece_tokens = min(len(encoding.encode(f" {piece}")), chunk_tokens)
+            if current and current_tokens + piece_tokens > chunk_tokens:
+                chunks.append(" ".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def _segments(text: str) -> list[str]:
+    return [s.strip() for s in _BOUNDARY.split(text) if s.strip()]
+
+
+def _cut_to_boundary(text: str, from_end: bool) -> str:
+    """Drop a partial sentence at the cut, unless that loses most of the text"""
+    matches = list(_BOUNDARY.finditer(text))
+    if not matches:
+        return text.strip()
+    if from_end:
+        cut = matches[0].end()
+        return text[cut:].strip() if cut < len(text) // 2 else text.strip()
+    cut = matches[-1].start()
+    return text[:cut].strip() if cut > len(text) // 2 else text.strip()
@@ -0,0 +1,156 @@
+"""
+Write-behind buffering of batch task outcomes.
+
+With BATCH_WRITE_MODE=stream, workers append the outcome of each task to a
+Redis stream instead of committing it themselves, and app.tasks.outcome_flusher
+writes the stream to Postgres in batches, so the job row is updated once per
+job and flush rather than once per task. Entries are acknowledged only after
+the transaction has committed, and writing an outcome twice has no effect, so a
+crashed flusher loses nothing that reached Redis. Until then the task stays
+PROCESSING, and its ID is kept in PENDING_KEY so the reaper leaves it alone
+however far the flushers lag behind. How much reaches Redis is up
+to its persistence settings, plus BATCH_WRITE_BEHIND_REPLICAS.
+"""
+
+import logging
+from dataclasses import asdict, dataclass, fields
+
+import redis
+
+from app.core.config import settings
+from app.core.metrics import WRITE_BEHIND_REPLICA_SHORTFALL
+from app.models import BatchStatus
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = "batch:outcomes"
+# IDs of the tasks whose outcome is in the stream but not yet in Postgres
+PENDING_KEY = "batch:outcomes:pending"
+GROUP = "flushers"
+# Fields stored as "" in the stream that mean None
+_OPTIONAL = {"summary_model", "summary_prompt_version", "summary_source_hash"}
+
+
+@dataclass
+class TaskOutcome:
+    task_id: int
+    batch_job_id: int
+    course_id: int
+    status: BatchStatus  # COMPLETED or FAILED
+    result: str = ""
+    error: str = ""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    llm_calls: int = 0
+    postprocess_outcome: str = ""
+    summary_model: str | None = None
+    summary_prompt_version: str | None = None
+    summary_source_hash: str | None = None
+
+    def to_fields(self) -> dict[str, str | int]:
+        entry = asdict(self)
+        entry["status"] = self.status.value
+        return {name: "" if value is None else value for name, value in entry.items()}
+
+    @classmethod
+    def from_fields(cls, entry: dict[str, str]) -> "TaskOutcome":
+        values = {}
+        for field in fields(cls):
+            value = entry.get(field.name, "")
+            if field.type is int:
+                value = int(value or 0)
+            elif field.name == "status":
+                value = BatchStatus(value)
+            elif field.name in _OPTIONAL:
+                value = value or None
+            values[field.name] = value
+        return cls(**values)
+
+
+def push_outcome(redis_client: redis.Redis, outcome: TaskOutcome) -> None:
+    """
+    Append an outcome to the stream. With BATCH_WRITE_BEHIND_REPLICAS set, wait
+    until that many replicas have it, so losing the primary loses nothing; a
+    shortfall is logged and counted, not raised.
+    """
+    pipe = redis_client.pipeline()
+    pipe.xadd(STREAM_KEY, outcome.to_fields())
+    pipe.sadd(PENDING_KEY, outcome.task_id)
+    pipe.execute()
+    if settings.BATCH_WRITE_BEHIND_REPLICAS:
+        acknowledged = redis_client.wait(
+            settings.BATCH_WRITE_BEHIND_REPLICAS,
+            settings.BATCH_WRITE_BEHIND_WAIT_MS,
+        )
+        # The entry is in the stream either way; failing the task now would
+        # only queue a second, contradicting outcome
+        if acknowledged < settings.BATCH_WRITE_BEHIND_REPLICAS:
+            WRITE_BEHIND_REPLICA_SHORTFALL.inc()
+            logger.warning(
+                f"Task {outcome.task_id} outcome reached {acknowledged} of "
+                f"{settings.BATCH_WRITE_BEHIND_REPLICAS} replicas"
+            )
+
+
+def ensure_group(redis_client: redis.Redis) -> None:
+    """Create the stream and its consumer group if they don't exist yet"""
+    try:
+        redis_client.xgroup_create(STREAM_KEY, GROUP, id="0", mkstream=True)
+    except redis.ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def read_outcomes(
+    redis_client: redis.Redis, consumer: str, count: int, block_ms: int
+) -> list[tuple[str, TaskOutcome]]:
+    """
+    Read up to `count` new entries for this consumer, waiting up to `block_ms`
+    for the first one
+
+    Returns:
+        (entry ID, outcome) pairs
+    """
+    response = redis_client.xreadgroup(
+        GROUP, consumer, {STREAM_KEY: ">"}, count=count, block=block_ms
+    )
+    if not response:
+        return []
+    _, entries = response[0]
+    return [(entry_id, TaskOutcome.from_fields(entry)) for entry_id, entry in entries]
+
+
+def claim_stale_outcomes(
+    redis_client: redis.Redis, consumer: str, count: int, min_idle_ms: int
+) -> list[tuple[str, TaskOutcome]]:
+    """
+    Take over entries that another consumer read but never acknowledged,
+    e.g. because its flusher crashed mid-flush
+    """
+    # Redis 7 appends the IDs of deleted entries to the reply
+    entries = redis_client.xautoclaim(
+        STREAM_KEY, GROUP, consumer, min_idle_time=min_idle_ms, count=count
+    )[1]
+    return [
+        (entry_id, TaskOutcome.from_fields(entry))
+        for entry_id, entry in entries
+        if entry
+    ]
+
+
+def acknowledge(
+    redis_client: redis.Redis, entries: list[tuple[str, TaskOutcome]]
+) -> None:
+    """Drop entries whose outcomes have been committed to Postgres"""
+    if entries:
+        entry_ids = [entry_id for entry_id, _ in entries]
+        pipe = redis_client.pipeline()
+        pipe.xack(STREAM_KEY, GROUP, *entry_ids)
+        pipe.xdel(STREAM_KEY, *entry_ids)
+        pipe.srem(PENDING_KEY, *{outcome.task_id for _, outcome in entries})
+        pipe.execute()
+
+
+def pending_task_ids(redis_client: redis.Redis) -> list[int]:
+    """IDs of the tasks whose outcome is waiting in the stream"""
+    return [int(task_id) for task_id in redis_client.smembers(PENDING_KEY)]
@@ -1,12 +1,28 @@
 import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import asdict
 
+from sqlalchemy import Row
 from sqlmodel import Session
 
 from app.celery_app import celery_app
 from app.core.db import engine
+from app.core.hashing import text_hash
+from app.core.redis import get_redis
+from app.core.metrics import BATCH_TASKS, track_phase
 from app.crud import batch
-from app.models import BatchStatus, BatchTask, Course
-from app.services.llm import OpenAILLMService
+from app.models import BatchStatus
+from app.services import (
+    backoff,
+    batch_control,
+    budgets,
+    fair_scheduler,
+    prompts,
+    registry,
+)
+from app.services.write_behind import TaskOutcome, push_outcome
+from app.services.errors import LLMError, RateLimited
 from app.core.config import settings
 
 
@@ -27,113 +43,328 @@ def process_batch_job(batch_job_id: int) -> str:
     logger.info(f"Processing batch job {batch_job_id}")
 
     with Session(engine) as session:
-        batch.update_batch_job_status(
-            session=session, batch_job_id=batch_job_id, status=BatchStatus.PROCESSING
-        )
+        # A job that was paused or cancelled before it started stays that way
+        if not batch.transition_batch_job(
+            session=session,
+            batch_job_id=batch_job_id,
+            from_statuses=[BatchStatus.PENDING],
+            to_status=BatchStatus.PROCESSING,
+        ):
+            return f"Batch job {batch_job_id} is not pending"
 
-        tasks = batch.get_batch_tasks(session=session, batch_job_id=batch_job_id)
+        # Pull workers claim the tasks straight from Postgres
+        if settings.BATCH_WORKER_MODE == "pull":
+            return f"Batch job {batch_job_id} queued for pull workers"
 
-        for task in tasks:
-            process_batch_task.delay(task.id)
+        tasks = batch.get_pending_tasks(session=session, batch_job_id=batch_job_id)
 
+    enqueue_batch_tasks(tasks)
     return f"Batch job {batch_job_id} processing started"
 
 
+def enqueue_batch_tasks(tasks: list[Row]) -> None:
+    """
+    Queue tasks for the Celery workers: with BATCH_SCHEDULER=fair in their
+    users' ready queues, otherwise straight in the broker
+
+    Args:
+        tasks: Rows returned by crud.batch.get_pending_tasks
+    """
+    if settings.BATCH_SCHEDULER == "fifo":
+        for task in tasks:
+            process_batch_task.delay(task.id, task.batch_job_id)
+        return
+
+    max_input_tokens = budgets.max_input_tokens()
+    fair_scheduler.submit(
+        get_redis(),
+        [
+            (
+                task.id,
+                task.batch_job_id,
+                task.user_id,
+                budgets.estimate_tokens(min(task.description_tokens, max_input_tokens)),
+            )
+            for task in tasks
+        ],
+    )
+    dispatch_batch_tasks()
+
+
+def unqueue_batch_job(user_id: int, batch_job_id: int) -> None:
+    """
+    Drop the tasks of a job that are still waiting in the fair scheduler's
+    ready queue. Tasks already in the broker are skipped by the workers while
+    the job is paused or cancelled.
+    """
+    if settings.BATCH_SCHEDULER == "fair":
+        fair_scheduler.drop_job(get_redis(), user_id, batch_job_id)
+
+
+def dispatch_batch_tasks() -> int:
+    """
+    Send the tasks the fair scheduler lets run now to the workers
+
+    Returns:
+        int: Number of sent tasks
+    """
+    dispatched = fair_scheduler.dispatch(get_redis())
+    for task_id, batch_job_id, user_id in dispatched:
+        process_batch_task.delay(task_id, batch_job_id, user_id)
+    return len(dispatched)
+
+
 @celery_app.task(name="process_batch_task")
-def process_batch_task(batch_task_id: int) -> str:
+def process_batch_task(
+    batch_task_id: int, batch_job_id: int | None = None, user_id: int | None = None
+) -> str:
     """
     Process a single batch task
 
     Args:
         batch_task_id: The ID of the batch task to process
+        batch_job_id: The ID of its job, to skip the task without claiming it
+            while the job is paused or cancelled
+        user_id: The owner of the task, when the fair scheduler sent it; its
+            slot is released for the next task once this one is done
 
     Returns:
         str: Status message
     """
+    if user_id is None:
+        return _process_batch_task(batch_task_id, batch_job_id)
+    try:
+        return _process_batch_task(batch_task_id, batch_job_id)
+    finally:
+        fair_scheduler.release(get_redis(), user_id, batch_task_id)
+        dispatch_batch_tasks()
+
+
+def _process_batch_task(batch_task_id: int, batch_job_id: int | None) -> str:
     logger.info(f"Processing batch task {batch_task_id}")
 
+    # Paused tasks stay pending and are enqueued again on resume
+    if batch_job_id is not None:
+        state = batch_control.get_job_state(get_redis(), batch_job_id)
+        if state is not None:
+            return f"Task {batch_task_id} skipped: batch job is {state.value}"
+
+    with track_phase("claim"), Session(engine) as session:
+        claimed = batch.claim_batch_task(
+            session=session,
+            task_id=batch_task_id,
+            lease_seconds=settings.BATCH_LEASE_SECONDS,
+        )
+    if not claimed:
+        return f"Task {batch_task_id} not found or already claimed"
+
+    # A map-reduce call can outlive a single lease, so keep extending it like
+    # the pull worker does until the outcome is stored
+    with lease_heartbeat([claimed.id]):
+        return run_claimed_task(claimed)
+
+
+@contextmanager
+def lease_heartbeat(
+    task_ids: list[int],
+    lease_seconds: int = settings.BATCH_LEASE_SECONDS,
+    heartbeat_seconds: float = settings.BATCH_HEARTBEAT_SECONDS,
+):
+    """
+    Extend the leases of claimed tasks from a background thread while the
+    block runs, so the reaper does not requeue tasks that are still in flight.
+
+    Args:
+        task_ids: IDs of the claimed tasks
+        lease_seconds: Lease length set on every heartbeat
+        heartbeat_seconds: Interval between heartbeats
+    """
+    stopped = threading.Event()
+
+    def beat() -> None:
+        while not stopped.wait(heartbeat_seconds):
+            try:
+                with Session(engine) as session:
+                    batch.extend_task_leases(
+                        session=session, task_ids=task_ids, lease_seconds=lease_seconds
+                    )
+            except Exception:
+                logger.exception(f"Failed to extend leases of tasks {task_ids}")
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
     try:
-        with Session(engine) as session:
-            task = session.get(BatchTask, batch_task_id)
-            if not task:
-                return f"Task {batch_task_id} not found"
+        yield
+    finally:
+        stopped.set()
+        thread.join()
 
-            batch.update_task_status(
-                session=session, task_id=batch_task_id, status=BatchStatus.PROCESSING
-            )
 
-            course = session.get(Course, task.course_id)
-            if not course:
-                error_msg = f"Course {task.course_id} not found"
-                batch.update_task_status(
+def run_claimed_task(claimed: Row) -> str:
+    """
+    Generate the summary for a claimed task and store the outcome
+
+    Args:
+        claimed: Row returned by one of the claim functions in crud.batch
+
+    Returns:
+        str: Status message
+    """
+    try:
+        # The job may have been paused or cancelled since the task was claimed
+        state = batch_control.get_job_state(get_redis(), claimed.batch_job_id)
+        if state is not None:
+            with Session(engine) as session:
+                batch.release_batch_task(
                     session=session,
-                    task_id=batch_task_id,
-                    status=BatchStatus.FAILED,
-                    error=error_msg,
+                    task_id=claimed.id,
+                    status=(
+                        BatchStatus.PENDING
+                        if state == BatchStatus.PAUSED
+                        else BatchStatus.CANCELLED
+                    ),
                 )
-                return error_msg
+            BATCH_TASKS.labels(state.value).inc()
+            return f"Task {claimed.id} released: batch job is {state.value}"
+
+        # Batches are admitted against the budget up front; this stops a job
+        # once the owner's budget has run out while it was being processed
+        if not budgets.has_budget(get_redis(), claimed.user_id):
+            _store_outcome(_failed(claimed, "Token budget exhausted"))
+            BATCH_TASKS.labels("over_budget").inc()
+            return f"Task {claimed.id} skipped: token budget exhausted"
+
+        # Don't spend an attempt on a call the provider is bound to reject
+        wait = backoff.get_backoff(get_redis())
+        if wait:
+            with Session(engine) as session:
+                batch.defer_batch_task(
+                    session=session,
+                    task_id=claimed.id,
+                    delay_seconds=wait,
+                    error="Waiting for the LLM rate limit",
+                    refund_attempt=True,
+                )
+            BATCH_TASKS.labels("deferred").inc()
+            return f"Task {claimed.id} deferred for {wait:.0f}s: LLM rate limited"
 
-            llm_service = OpenAILLMService(api_key=settings.OPENAI_API_KEY)
-            summary = llm_service.generate_course_summary(course.description)
+        with track_phase("llm"):
+            llm_service = registry.get_llm_service()
+            summary = llm_service.generate_course_summary(
+                claimed.description, prompts.choose_prompt(claimed.course_id)
+            )
 
-            course.ai_summary = summary
-            course.status = "draft"
-            session.add(course)
+    except LLMError as e:
+        return _handle_llm_error(claimed, e)
 
-            # Update he task as completed with the result
-            batch.update_task_status(
-                session=session,
-                task_id=batch_task_id,
+    except Exception as e:
+        logger.exception(f"Error processing task {claimed.id}: {str(e)}")
+
+        _store_outcome(_failed(claimed, str(e)))
+        BATCH_TASKS.labels("failed").inc()
+
+        return f"Task {claimed.id} failed: {str(e)}"
+
+    # Course summary, task result and job progress are written together. This
+    # stays out of the try above: an error storing a summary that was already
+    # paid for must not turn it into a failure; the reaper requeues the task
+    # once its lease runs out instead
+    with track_phase("persist"):
+        stored = _store_outcome(
+            TaskOutcome(
+                task_id=claimed.id,
+                batch_job_id=claimed.batch_job_id,
+                course_id=claimed.course_id,
                 status=BatchStatus.COMPLETED,
-                result=summary,
+                result=summary.text,
+                prompt_tokens=summary.prompt_tokens,
+                completion_tokens=summary.completion_tokens,
+                llm_calls=summary.llm_calls,
+                postprocess_outcome=summary.postprocess_outcome,
+                summary_model=summary.model,
+                summary_prompt_version=summary.prompt_version,
+                summary_source_hash=text_hash(claimed.description),
             )
+        )
+    budgets.record_usage(
+        get_redis(),
+        claimed.user_id,
+        summary.prompt_tokens,
+        summary.completion_tokens,
+    )
 
-            session.commit()
+    # The lease expired and the task was reaped while the LLM call ran
+    if not stored:
+        BATCH_TASKS.labels("lost_lease").inc()
+        return f"Task {claimed.id} lost its lease before completing"
 
-        return f"Task {batch_task_id} processed successfully"
+    BATCH_TASKS.labels("completed").inc()
+    return f"Task {claimed.id} processed successfully"
 
-    except Exception as e:
-        logger.exception(f"Error processing task {batch_task_id}: {str(e)}")
 
+def _handle_llm_error(claimed: Row, error: LLMError) -> str:
+    """
+    Retry a task after a retryable LLM error, with exponential backoff and
+    while it has attempts left; fail it right away otherwise
+
+    Returns:
+        str: Status message
+    """
+    message = f"{type(error).__name__}: {error}"
+    if isinstance(error, RateLimited):
+        backoff.set_backoff(
+            get_redis(), error.retry_after or settings.BATCH_RETRY_BASE_SECONDS
+        )
+
+    if error.retryable and claimed.attempts < settings.BATCH_MAX_ATTEMPTS:
+        delay = min(
+            settings.BATCH_RETRY_BASE_SECONDS * 2 ** (claimed.attempts - 1),
+            settings.BATCH_RETRY_MAX_SECONDS,
+        )
+        if isinstance(error, RateLimited) and error.retry_after:
+            delay = max(delay, error.retry_after)
         with Session(engine) as session:
-            batch.update_task_status(
-                session=session,
-                task_id=batch_task_id,
-                status=BatchStatus.FAILED,
-                error=str(e),
+            batch.defer_batch_task(
+                session=session, task_id=claimed.id, delay_seconds=delay, error=message
             )
+        BATCH_TASKS.labels("retried").inc()
+        logger.warning(f"Task {claimed.id} will be retried in {delay:.0f}s: {message}")
+        return f"Task {claimed.id} will be retried in {delay:.0f}s: {message}"
 
-        return f"Task {batch_task_id} failed: {str(e)}"
+    logger.warning(f"Task {claimed.id} failed: {message}")
+    _store_outcome(_failed(claimed, message))
+    BATCH_TASKS.labels("failed").inc()
+    return f"Task {claimed.id} failed: {message}"
 
 
-@celery_app.task(name="process_batch_courses")
-def process_batch_courses(course_ids: list[int], job_name: str, user_id: int) -> str:
-    """
-    Create a batch job and process courses in batch
+def _failed(claimed: Row, error: str) -> TaskOutcome:
+    return TaskOutcome(
+        task_id=claimed.id,
+        batch_job_id=claimed.batch_job_id,
+        course_id=claimed.course_id,
+        status=BatchStatus.FAILED,
+        error=error,
+    )
 
-    Args:
-        course_ids: list of course IDs to process
-        job_name: Name of the batch job
-        user_id: ID of the user who owns the courses
+
+def _store_outcome(outcome: TaskOutcome) -> bool:
+    """
+    Write the outcome of a task, or with BATCH_WRITE_MODE=stream hand it to the
+    outcome flusher
 
     Returns:
-        str: Status message
+        bool: False if the task was no longer ours to finish; always True in
+        stream mode, where the flusher skips such outcomes
     """
-    logger.info(f"Creating batch job for {len(course_ids)} courses")
+    if settings.BATCH_WRITE_MODE == "stream":
+        push_outcome(get_redis(), outcome)
+        return True
 
     with Session(engine) as session:
-        for course_id in course_ids:
-            if not batch.verify_course_ownership(
-                session=session, course_id=course_id, user_id=user_id
-            ):
-                return f"Course {course_id} does not belong to user {user_id}"
-
-        batch_job = batch.create_batch_job(
-            session=session,
-            batch_in={"name": job_name, "course_ids": course_ids},
-            user_id=user_id,
-        )
-
-        process_batch_job.delay(batch_job.id)
-
-        return f"Batch job {batch_job.id} created and scheduled"
+        if outcome.status == BatchStatus.FAILED:
+            return batch.fail_batch_task(
+                session=session, task_id=outcome.task_id, error=outcome.error
+            )
+        fields = asdict(outcome)
+        del fields["status"], fields["error"]
+        return batch.complete_batch_task(session=session, **fields)
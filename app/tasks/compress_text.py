@@ -0,0 +1,120 @@
+"""
+Maintenance of compressed course text.
+
+Train a zstd dictionary on a sample of course descriptions, then rewrite
+existing rows in chunks so they use the current compression settings:
+
+    python -m app.tasks.compress_text train --samples 5000
+    python -m app.tasks.compress_text recompress --chunk-size 500
+
+After training, copy the dictionary file to TEXT_COMPRESSION_DICTIONARY_DIR on
+every API and worker host and set TEXT_COMPRESSION_DICTIONARY_ID before
+recompressing. Keep old dictionaries there until no row uses them anymore.
+"""
+
+import argparse
+import logging
+import os
+import time
+
+from sqlalchemy import func, update
+from sqlmodel import Session, select
+
+from app.core.compression import (
+    DICTIONARY_SUFFIX,
+    dictionary_id,
+    train_dictionary,
+)
+from app.core.config import settings
+from app.core.db import engine
+from app.models import Course
+
+
+logger = logging.getLogger(__name__)
+
+
+def train(samples: int, size: int, output_dir: str) -> str:
+    """
+    Train a dictionary on a random sample of descriptions.
+
+    Returns:
+        Path of the written dictionary file
+    """
+    with Session(engine) as session:
+        texts = session.exec(
+            select(Course.description).order_by(func.random()).limit(samples)
+        ).all()
+    data = train_dictionary([text for text in texts if text], size)
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"{dictionary_id(data)}{DICTIONARY_SUFFIX}")
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def recompress(chunk_size: int, pause_seconds: float) -> int:
+    """
+    Rewrite every course's description and summary with the current settings,
+    one chunk per transaction so locks and WAL bursts stay short.
+
+    Returns:
+        Number of rewritten courses
+    """
+    last_id = 0
+    rewritten = 0
+    while True:
+        with Session(engine) as session:
+            rows = session.exec(
+                select(Course.id, Course.description, Course.ai_summary)
+                .where(Course.id > last_id)
+                .order_by(Course.id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                return rewritten
+
+            session.exec(
+                update(Course),
+                params=[
+                    {"id": id, "description": description, "ai_summary": ai_summary}
+                    for id, description, ai_summary in rows
+                ],
+            )
+            session.commit()
+
+        last_id = rows[-1][0]
+        rewritten += len(rows)
+        logger.info(f"Recompressed {rewritten} courses, up to ID {last_id}")
+        time.sleep(pause_seconds)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compressed course text")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = commands.add_parser("train", help="Train a zstd dictionary")
+    train_parser.add_argument("--samples", type=int, default=5000)
+    train_parser.add_argument("--size", type=int, default=112 * 1024)
+    train_parser.add_argument(
+        "--output-dir", default=settings.TEXT_COMPRESSION_DICTIONARY_DIR or "."
+    )
+
+    recompress_parser = commands.add_parser(
+        "recompress", help="Rewrite existing rows with the current settings"
+    )
+    recompress_parser.add_argument("--chunk-size", type=int, default=500)
+    recompress_parser.add_argument("--pause-seconds", type=float, default=0.1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "train":
+        path = train(args.samples, args.size, args.output_dir)
+        logger.info(f"Wrote {path}")
+    else:
+        rewritten = recompress(args.chunk_size, args.pause_seconds)
+        logger.info(f"Done, recompressed {rewritten} courses")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import logging
+
+from sqlmodel import Session
+
+from app.celery_app import celery_app
+from app.core.config import settings
+from app.core.db import engine
+from app.core.redis import get_redis
+from app.crud import batch
+from app.services import budgets, embeddings, retention, write_behind
+from app.tasks import search_index
+from app.tasks.batch_tasks import dispatch_batch_tasks, enqueue_batch_tasks
+
+
+logger = logging.getLogger(__name__)
+
+FINALIZE_CURSOR_KEY = "batch:finalize:cursor"
+
+
+@celery_app.task(name="reap_stale_batch_tasks")
+def reap_stale_batch_tasks() -> str:
+    """
+    Requeue or fail tasks whose worker stopped heartbeating
+
+    Returns:
+        str: Status message
+    """
+    # Tasks whose outcome is buffered in the stream are done, however long
+    # their lease has been expired
+    flushing = write_behind.pending_task_ids(get_redis())
+
+    with Session(engine) as session:
+        requeued, failed = batch.reap_stale_tasks(
+            session=session,
+            max_attempts=settings.BATCH_MAX_ATTEMPTS,
+            limit=settings.BATCH_SWEEP_LIMIT,
+            exclude=flushing,
+        )
+
+        # Pull workers pick requeued tasks up on their own
+        if settings.BATCH_WORKER_MODE == "celery" and requeued:
+            enqueue_batch_tasks(
+                batch.get_pending_tasks(session=session, task_ids=requeued)
+            )
+
+    return f"Requeued {len(requeued)} and failed {failed} stale tasks"
+
+
+@celery_app.task(name="dispatch_stalled_batch_tasks")
+def dispatch_stalled_batch_tasks() -> str:
+    """
+    Hand queued tasks to the workers once slots of dead workers have expired or
+    user caps were raised; finishing tasks dispatch the next ones themselves
+
+    Returns:
+        str: Status message
+    """
+    if settings.BATCH_SCHEDULER != "fair" or settings.BATCH_WORKER_MODE != "celery":
+        return "Fair scheduling is off"
+
+    return f"Dispatched {dispatch_batch_tasks()} batch tasks"
+
+
+@celery_app.task(name="finalize_batch_jobs")
+def finalize_batch_jobs() -> str:
+    """
+    Reconcile the counters and final state of the next slice of unfinished jobs
+
+    Each run handles at most BATCH_SWEEP_LIMIT jobs and stores its position in
+    Redis, so consecutive runs walk through all active jobs.
+
+    Returns:
+        str: Status message
+    """
+    redis_client = get_redis()
+    after_id = int(redis_client.get(FINALIZE_CURSOR_KEY) or 0)
+
+    with Session(engine) as session:
+        updated, last_id = batch.finalize_batch_jobs(
+            session=session, after_id=after_id, limit=settings.BATCH_SWEEP_LIMIT
+        )
+
+    redis_client.set(FINALIZE_CURSOR_KEY, last_id or 0)
+    return f"Updated {updated} batch jobs"
+
+
+@celery_app.task(name="flush_token_usage")
+def flush_token_usage() -> str:
+    """
+    Persist the token spend counted in Redis since the last flush
+
+    Returns:
+        str: Status message
+    """
+    with Session(engine) as session:
+        rows = budgets.flush_usage(get_redis(), session)
+
+    return f"Flushed token usage for {rows} user days"
+
+
+@celery_app.task(name="maintain_batch_partitions")
+def maintain_batch_partitions() -> str:
+    """
+    Create upcoming batchjob/batchtask partitions and archive expired ones
+
+    Returns:
+        str: Status message
+    """
+    with Session(engine) as session:
+        retention.ensure_partitions(session)
+        archived = retention.archive_expired_partitions(session)
+
+    return f"Archived {len(archived)} partitions"
+
+
+@celery_app.task(name="embed_courses")
+def embed_courses() -> str:
+    """
+    Embed the next slice of new and changed courses for semantic search
+
+    Returns:
+        str: Status message
+    """
+    if not embeddings.enabled():
+        return "Semantic search is not enabled"
+
+    embedded = search_index.embed_stale_courses()
+    return f"Embedded {embedded} courses"
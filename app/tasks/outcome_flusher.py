@@ -0,0 +1,118 @@
+"""
+Flusher for write-behind task outcomes.
+
+Reads the outcomes workers append to the Redis stream when
+BATCH_WRITE_MODE=stream and writes them to Postgres with
+crud.batch.apply_task_outcomes, at most BATCH_WRITE_BEHIND_BATCH_SIZE per
+transaction and, while the stream is not backlogged, once every
+BATCH_WRITE_BEHIND_INTERVAL_MS. Several flushers can share the stream; entries
+left unacknowledged by a crashed one are taken over after
+BATCH_WRITE_BEHIND_CLAIM_IDLE_MS.
+
+Run with:
+
+    python -m app.tasks.outcome_flusher
+"""
+
+import argparse
+import logging
+import signal
+import socket
+import threading
+import time
+from dataclasses import asdict
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.metrics import start_worker_exporter, track_phase
+from app.core.redis import get_redis
+from app.crud import batch
+from app.services import write_behind
+
+
+logger = logging.getLogger(__name__)
+
+
+class OutcomeFlusher:
+    """Batches outcomes from the stream into multi-row updates"""
+
+    def __init__(
+        self,
+        consumer: str,
+        batch_size: int = settings.BATCH_WRITE_BEHIND_BATCH_SIZE,
+        interval_ms: int = settings.BATCH_WRITE_BEHIND_INTERVAL_MS,
+        claim_idle_ms: int = settings.BATCH_WRITE_BEHIND_CLAIM_IDLE_MS,
+    ):
+        self.consumer = consumer
+        self.batch_size = batch_size
+        self.interval_ms = interval_ms
+        self.claim_idle_ms = claim_idle_ms
+        self._stopping = threading.Event()
+
+    def stop(self, *args) -> None:
+        """Stop after the current flush"""
+        logger.info("Outcome flusher stopping")
+        self._stopping.set()
+
+    def run(self) -> None:
+        redis_client = get_redis()
+        write_behind.ensure_group(redis_client)
+        next_claim = 0.0
+
+        while not self._stopping.is_set():
+            started = time.monotonic()
+            entries = []
+            if started >= next_claim:
+                entries = write_behind.claim_stale_outcomes(
+                    redis_client, self.consumer, self.batch_size, self.claim_idle_ms
+                )
+                next_claim = started + self.claim_idle_ms / 1000
+            if not entries:
+                entries = write_behind.read_outcomes(
+                    redis_client, self.consumer, self.batch_size, self.interval_ms
+                )
+            if entries:
+                self.flush(redis_client, entries)
+
+            # A full batch means a backlog, so flush again right away
+            if len(entries) < self.batch_size:
+                remaining = self.interval_ms / 1000 - (time.monotonic() - started)
+                if remaining > 0:
+                    self._stopping.wait(remaining)
+
+        logger.info("Outcome flusher stopped")
+
+    def flush(self, redis_client, entries: list) -> None:
+        try:
+            with track_phase("flush"), Session(engine) as session:
+                written = batch.apply_task_outcomes(
+                    session=session,
+                    outcomes=[asdict(outcome) for _, outcome in entries],
+                )
+        except Exception:
+            # Left unacknowledged; claimed again after claim_idle_ms
+            logger.exception(f"Failed to flush {len(entries)} task outcomes")
+            return
+
+        write_behind.acknowledge(redis_client, entries)
+        logger.info(f"Flushed {written} of {len(entries)} task outcomes")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Write-behind outcome flusher")
+    parser.add_argument("--consumer", default=socket.gethostname())
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if settings.METRICS_ENABLED:
+        start_worker_exporter(settings.METRICS_WORKER_PORT)
+    flusher = OutcomeFlusher(consumer=args.consumer)
+    signal.signal(signal.SIGTERM, flusher.stop)
+    signal.signal(signal.SIGINT, flusher.stop)
+    flusher.run()
+
+
+if __name__ == "__main__":
+    main()
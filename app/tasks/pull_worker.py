@@ -0,0 +1,154 @@
+"""
+Pull-based batch worker.
+
+Instead of receiving one Celery message per task, the worker claims batches of
+BatchTask rows straight from Postgres with FOR UPDATE SKIP LOCKED. Claims carry
+a lease that a heartbeat thread keeps extending while the work is in flight, so
+a crashed worker's tasks become claimable again once the lease expires.
+
+Run with:
+
+    python -m app.tasks.pull_worker --concurrency 8
+"""
+
+import argparse
+import logging
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.metrics import start_worker_exporter, track_phase
+from app.core.tracing import setup_tracing
+from app.crud import batch
+from app.tasks.batch_tasks import run_claimed_task
+
+
+logger = logging.getLogger(__name__)
+
+
+class PullWorker:
+    """Claims tasks in batches and runs them on a thread pool"""
+
+    def __init__(
+        self,
+        concurrency: int,
+        claim_size: int = settings.BATCH_CLAIM_SIZE,
+        lease_seconds: int = settings.BATCH_LEASE_SECONDS,
+        heartbeat_seconds: int = settings.BATCH_HEARTBEAT_SECONDS,
+        poll_seconds: float = settings.BATCH_POLL_SECONDS,
+        max_attempts: int = settings.BATCH_MAX_ATTEMPTS,
+    ):
+        self.concurrency = concurrency
+        self.claim_size = claim_size
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+
+        self._in_flight: set[int] = set()
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(concurrency)
+        self._stopping = threading.Event()
+        self._stopped = threading.Event()
+
+    def stop(self, *args) -> None:
+        """Stop claiming new tasks; in-flight tasks are allowed to finish"""
+        logger.info("Pull worker stopping")
+        self._stopping.set()
+
+    def run(self) -> None:
+        heartbeat = threading.Thread(target=self._heartbeat, daemon=True)
+        heartbeat.start()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while not self._stopping.is_set():
+                claimed = self._claim()
+                if not claimed:
+                    self._stopping.wait(self.poll_seconds)
+                    continue
+
+                for row in claimed:
+                    executor.submit(self._run, row)
+
+        self._stopped.set()
+        logger.info("Pull worker stopped")
+
+    def _claim(self) -> list:
+        # Only claim as many tasks as there are free slots, so claimed tasks
+        # never sit in a local queue while their lease runs down
+        free = 0
+        while free < self.claim_size:
+            # Wait briefly for the first slot only
+            if not self._slots.acquire(timeout=0 if free else 1):
+                break
+            free += 1
+        if not free:
+            return []
+
+        try:
+            with track_phase("claim"), Session(engine) as session:
+                claimed = batch.claim_batch_tasks(
+                    session=session,
+                    limit=free,
+                    lease_seconds=self.lease_seconds,
+                    max_attempts=self.max_attempts,
+                )
+        except Exception:
+            logger.exception("Failed to claim batch tasks")
+            claimed = []
+
+        for _ in range(free - len(claimed)):
+            self._slots.release()
+
+        with self._lock:
+            self._in_flight.update(row.id for row in claimed)
+        return claimed
+
+    def _run(self, row) -> None:
+        try:
+            logger.info(run_claimed_task(row))
+        finally:
+            with self._lock:
+                self._in_flight.discard(row.id)
+            self._slots.release()
+
+    def _heartbeat(self) -> None:
+        # Keeps running after stop() until the in-flight tasks have finished
+        while not self._stopped.wait(self.heartbeat_seconds):
+            with self._lock:
+                task_ids = list(self._in_flight)
+            if not task_ids:
+                continue
+
+            try:
+                with Session(engine) as session:
+                    batch.extend_task_leases(
+                        session=session,
+                        task_ids=task_ids,
+                        lease_seconds=self.lease_seconds,
+                    )
+            except Exception:
+                logger.exception("Failed to extend task leases")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pull-based batch worker")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if settings.METRICS_ENABLED:
+        start_worker_exporter(settings.METRICS_WORKER_PORT)
+    setup_tracing("pull-worker")
+    worker = PullWorker(concurrency=args.concurrency)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import logging
+from collections import defaultdict
+
+from sqlmodel import Session
+
+from app.celery_app import celery_app
+from app.core.config import settings
+from app.core.db import engine
+from app.core.redis import get_redis
+from app.crud import batch
+from app.crud import prompts as prompts_crud
+from app.services import fair_scheduler, prompts
+from app.tasks.batch_tasks import process_batch_job
+
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(name="resummarize_outdated")
+def resummarize_outdated(before_id: int | None = None) -> str:
+    """
+    Queue batch jobs for the next chunk of courses whose summary was made with
+    a prompt that is no longer active, then schedule the following chunk
+
+    Courses are walked newest first, one batch job per user and chunk. While
+    more than RESUMMARIZE_MAX_QUEUE_DEPTH batch tasks are waiting for a worker
+    the chunk is postponed, so a prompt change never floods the workers.
+
+    Args:
+        before_id: Continue with courses below this ID; None starts at the newest
+
+    Returns:
+        str: Status message
+    """
+    if _backlog() > settings.RESUMMARIZE_MAX_QUEUE_DEPTH:
+        resummarize_outdated.apply_async(
+            (before_id,), countdown=settings.RESUMMARIZE_DELAY_SECONDS
+        )
+        return "Batch task backlog is full, re-summarizing later"
+
+    versions = prompts.get_active_versions()
+    with Session(engine) as session:
+        courses = prompts_crud.get_outdated_courses(
+            session=session,
+            prompt_versions=versions,
+            before_id=before_id,
+            limit=settings.RESUMMARIZE_CHUNK_SIZE,
+        )
+
+        course_ids_by_user: dict[int, list[int]] = defaultdict(list)
+        for course in courses:
+            course_ids_by_user[course.user_id].append(course.id)
+
+        jobs = [
+            batch.create_batch_job(
+                session=session,
+                batch_in={
+                    "name": f"Re-summarize with prompt {', '.join(versions)}",
+                    "course_ids": course_ids,
+                },
+                user_id=user_id,
+            )
+            for user_id, course_ids in course_ids_by_user.items()
+        ]
+
+    for job in jobs:
+        process_batch_job.delay(job.id)
+
+    if len(courses) == settings.RESUMMARIZE_CHUNK_SIZE:
+        resummarize_outdated.apply_async(
+            (courses[-1].id,), countdown=settings.RESUMMARIZE_DELAY_SECONDS
+        )
+        return f"Queued {len(courses)} courses, continuing below {courses[-1].id}"
+
+    return f"Queued {len(courses)} courses, re-summarizing finished"
+
+
+def _backlog() -> int:
+    """
+    Batch tasks waiting for a worker: pending rows for pull workers, otherwise
+    the broker queue plus, under the fair scheduler, its ready queues
+    """
+    if settings.BATCH_WORKER_MODE == "pull":
+        with Session(engine) as session:
+            return batch.count_pending_tasks(
+                session=session, limit=settings.RESUMMARIZE_MAX_QUEUE_DEPTH
+            )
+
+    redis_client = get_redis()
+    backlog = redis_client.llen("celery")
+    if settings.BATCH_SCHEDULER == "fair":
+        backlog += fair_scheduler.queued_count(redis_client)
+    return backlog
@@ -0,0 +1,132 @@
+"""
+Maintenance of the course search indexes.
+
+New and edited courses are indexed for full-text search as they are written.
+Courses that existed before search was added, and compressed ones the
+migration could not read, are indexed with `reindex`; `embed` embeds every
+course that is new or changed since it was embedded, which the Celery beat
+otherwise does a slice at a time while SEARCH_EMBEDDINGS is on:
+
+    python -m app.tasks.search_index reindex --missing-only
+    python -m app.tasks.search_index embed
+"""
+
+import argparse
+import logging
+import time
+
+from sqlmodel import Session, select
+
+from app.core.db import engine
+from app.core.config import settings
+from app.crud import search
+from app.models import Course
+from app.services import embeddings
+
+
+logger = logging.getLogger(__name__)
+
+
+def reindex(chunk_size: int, pause_seconds: float, missing_only: bool) -> int:
+    """
+    Rebuild the full-text search documents of all courses, or of those that
+    have none, one chunk per transaction
+
+    Returns:
+        Number of indexed courses
+    """
+    last_id = 0
+    indexed = 0
+    while True:
+        with Session(engine) as session:
+            course_ids = search.get_course_ids_to_index(
+                session=session,
+                after_id=last_id,
+                limit=chunk_size,
+                missing_only=missing_only,
+            )
+            if not course_ids:
+                return indexed
+
+            courses = session.exec(select(Course).where(Course.id.in_(course_ids)))
+            for course in courses:
+                search.index_course(session=session, course=course)
+            session.commit()
+
+        last_id = course_ids[-1]
+        indexed += len(course_ids)
+        logger.info(f"Indexed {indexed} courses, up to ID {last_id}")
+        time.sleep(pause_seconds)
+
+
+def embed_stale_courses(limit: int = settings.SEARCH_EMBEDDING_BATCH_SIZE) -> int:
+    """
+    Embed up to `limit` courses that are new or changed since they were
+    embedded
+
+    Returns:
+        Number of embedded courses
+    """
+    with Session(engine) as session:
+        courses = search.get_unembedded_courses(session=session, limit=limit)
+        if not courses:
+            return 0
+
+        vectors = embeddings.embed_courses(
+            [
+                embeddings.course_text(
+                    course.title, course.ai_summary, course.description
+                )
+                for course in courses
+            ]
+        )
+        search.store_embeddings(
+            session=session,
+            embeddings=[
+                {
+                    "course_id": course.id,
+                    "user_id": course.user_id,
+                    "embedding": vector,
+                    "embedded_at": course.updated_at,
+                }
+                for course, vector in zip(courses, vectors)
+            ],
+        )
+    return len(courses)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Course search indexes")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    reindex_parser = commands.add_parser(
+        "reindex", help="Rebuild full-text search documents"
+    )
+    reindex_parser.add_argument("--chunk-size", type=int, default=500)
+    reindex_parser.add_argument("--pause-seconds", type=float, default=0.1)
+    reindex_parser.add_argument(
+        "--missing-only", action="store_true", help="Only index unindexed courses"
+    )
+    embed_parser = commands.add_parser("embed", help="Embed new and changed courses")
+    embed_parser.add_argument(
+        "--batch-size", type=int, default=settings.SEARCH_EMBEDDING_BATCH_SIZE
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "reindex":
+        indexed = reindex(args.chunk_size, args.pause_seconds, args.missing_only)
+        logger.info(f"Done, indexed {indexed} courses")
+        return
+
+    if not embeddings.enabled():
+        parser.error("SEARCH_EMBEDDINGS is off or the search extra is not installed")
+    embedded = 0
+    while batch := embed_stale_courses(args.batch_size):
+        embedded += batch
+        logger.info(f"Embedded {embedded} courses")
+    logger.info(f"Done, embedded {embedded} courses")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+"""
+Benchmarks for the summary pipeline. They expect a local Postgres (and Redis
+where noted) configured through the usual environment variables.
+"""
@@ -0,0 +1,72 @@
+"""
+Compare two benchmark reports written by benchmarks.e2e.
+
+Prints the relative change of every latency, throughput and per-task metric
+and exits non-zero if any of them regressed by more than --threshold.
+
+    python -m benchmarks.compare base.json head.json --threshold 0.1
+"""
+
+import argparse
+import json
+import sys
+
+# Metrics where a larger value is an improvement
+HIGHER_IS_BETTER = {"throughput_rps", "tasks_per_second", "completion_rate"}
+COMPARED = {
+    "mean_ms",
+    "p50_ms",
+    "p95_ms",
+    "p99_ms",
+    "statements_per_task",
+    "transactions_per_task",
+} | HIGHER_IS_BETTER
+
+
+def flatten(report: dict) -> dict[str, float]:
+    metrics = {}
+    for endpoint, values in report.get("endpoints", {}).items():
+        for key, value in values.items():
+            metrics[f"{endpoint} {key}"] = value
+    for key, value in report.get("batch", {}).items():
+        metrics[f"batch {key}"] = value
+    return {
+        name: value
+        for name, value in metrics.items()
+        if name.rsplit(" ", 1)[-1] in COMPARED and isinstance(value, (int, float))
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = flatten(json.load(f))
+    with open(args.head) as f:
+        head = flatten(json.load(f))
+
+    regressions = []
+    for name in sorted(base.keys() & head.keys()):
+        if not base[name]:
+            continue
+        change = (head[name] - base[name]) / base[name]
+        worse = -change if name.rsplit(" ", 1)[-1] in HIGHER_IS_BETTER else change
+        flag = ""
+        if worse > args.threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:60} {base[name]:12.2f} {head[name]:12.2f} {change:+8.1%}{flag}")
+
+    if regressions:
+        print(
+            f"\n{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}"
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
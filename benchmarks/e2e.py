@@ -0,0 +1,310 @@
+"""
+End-to-end benchmark of the summary pipeline.
+
+Seeds users and courses into the configured Postgres, then drives a running API
+(with Celery or pull workers behind it) over HTTP and reports latency
+percentiles, batch throughput, task completion rate and DB statements per task
+as JSON. The LLM should be the mock server or the stub backend, see
+benchmarks/README.md.
+
+    python -m benchmarks.e2e --users 20 --courses-per-user 50 --output run.json
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, UTC
+
+import httpx
+from sqlalchemy import text
+from sqlmodel import Session
+
+from app.core.db import engine
+from app.core.security import get_password_hash
+from app.models import Course, User
+
+PASSWORD = "benchmark-password"
+SUMMARY_REQUESTS_PER_USER = 3  # The interactive route allows 3 per hour
+
+
+class Recorder:
+    """Collects request latencies and status codes per endpoint"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    def request(
+        self, client: httpx.Client, name: str, method: str, url: str, **kwargs
+    ) -> httpx.Response:
+        start = time.perf_counter()
+        response = client.request(method, url, **kwargs)
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.latencies[name].append(elapsed)
+            if response.status_code >= 400:
+                self.errors[name] += 1
+        return response
+
+    def report(self, name: str, wall_seconds: float) -> dict:
+        samples = self.latencies[name]
+        return {
+            "requests": len(samples),
+            "errors": self.errors[name],
+            "throughput_rps": len(samples) / wall_seconds if wall_seconds else 0.0,
+            **percentiles(samples),
+        }
+
+
+def percentiles(samples: list[float]) -> dict:
+    if not samples:
+        return {}
+    if len(samples) == 1:
+        cuts = samples * 99
+    else:
+        cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": cuts[49],
+        "p95_ms": cuts[94],
+        "p99_ms": cuts[98],
+    }
+
+
+def seed(
+    users: int, courses_per_user: int, description_chars: int
+) -> list[tuple[str, list[int]]]:
+    """Insert users and their courses; returns (email, course_ids) per user"""
+    run_id = uuid.uuid4().hex[:8]
+    hashed_password = get_password_hash(PASSWORD)
+    paragraph = (
+        "This module covers the fundamentals and works through practical examples. "
+        "Learners complete exercises and a project that applies each concept. "
+    )
+    description = (paragraph * (description_chars // len(paragraph) + 1))[
+        :description_chars
+    ]
+
+    with Session(engine) as session:
+        user_rows = [
+            User(
+                name=f"Benchmark user {i}",
+                email=f"bench-{run_id}-{i}@example.com",
+                hashed_password=hashed_password,
+            )
+            for i in range(users)
+        ]
+        session.add_all(user_rows)
+        session.flush()
+
+        seeded = []
+        for user in user_rows:
+            courses = [
+                Course(
+                    user_id=user.id,
+                    title=f"Benchmark course {j}",
+                    description=description,
+                )
+                for j in range(courses_per_user)
+            ]
+            session.add_all(courses)
+            session.flush()
+            seeded.append((user.email, [c.id for c in courses]))
+        session.commit()
+    return seeded
+
+
+def db_counter(sql: str) -> int | None:
+    try:
+        with engine.connect() as connection:
+            return connection.execute(text(sql)).scalar()
+    except Exception:
+        return None
+
+
+def statement_count() -> int | None:
+    """Total statements executed, if pg_stat_statements is installed"""
+    return db_counter("SELECT sum(calls)::bigint FROM pg_stat_statements")
+
+
+def transaction_count() -> int | None:
+    return db_counter(
+        "SELECT xact_commit + xact_rollback FROM pg_stat_database "
+        "WHERE datname = current_database()"
+    )
+
+
+def login(client: httpx.Client, email: str) -> dict[str, str]:
+    response = client.post(
+        "/login/access-token", data={"username": email, "password": PASSWORD}
+    )
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def run_phase(concurrency: int, jobs: list) -> float:
+    """Run callables on a thread pool; returns the wall time in seconds"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(job) for job in jobs]:
+            future.result()
+    return time.perf_counter() - start
+
+
+def wait_for_jobs(job_ids: list[int], timeout: float) -> tuple[int, int, int, int]:
+    """
+    Poll the job rows directly (one statement per poll) until every job has
+    finished or the timeout expires.
+
+    Returns:
+        Finished tasks, failed tasks, total tasks and the number of polls
+    """
+    query = text(
+        "SELECT coalesce(sum(completed_tasks), 0), coalesce(sum(failed_tasks), 0), "
+        "coalesce(sum(total_tasks), 0) FROM batchjob WHERE id = ANY(:ids)"
+    )
+    deadline = time.monotonic() + timeout
+    polls = 0
+    while True:
+        with engine.connect() as connection:
+            finished, failed, total = connection.execute(query, {"ids": job_ids}).one()
+        polls += 1
+        if finished >= total or time.monotonic() > deadline:
+            return finished, failed, total, polls
+        time.sleep(1)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--courses-per-user", type=int, default=50)
+    parser.add_argument("--description-chars", type=int, default=4000)
+    parser.add_argument("--list-requests-per-user", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch-timeout", type=float, default=600)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    recorder = Recorder()
+    seeded = seed(args.users, args.courses_per_user, args.description_chars)
+    client = httpx.Client(base_url=args.base_url, timeout=120)
+    headers = {email: login(client, email) for email, _ in seeded}
+    report: dict = {
+        "revision": git_revision(),
+        "started_at": datetime.now(UTC).isoformat(),
+        "config": vars(args),
+        "endpoints": {},
+    }
+
+    # GET /courses/
+    wall = run_phase(
+        args.concurrency,
+        [
+            lambda email=email: recorder.request(
+                client, "GET /courses/", "GET", "/courses/", headers=headers[email]
+            )
+            for email, _ in seeded
+            for _ in range(args.list_requests_per_user)
+        ],
+    )
+    report["endpoints"]["GET /courses/"] = recorder.report("GET /courses/", wall)
+
+    # POST /courses/generate_summary/{id}
+    name = "POST /courses/generate_summary"
+    wall = run_phase(
+        args.concurrency,
+        [
+            lambda email=email, course_id=course_id: recorder.request(
+                client,
+                name,
+                "POST",
+                f"/courses/generate_summary/{course_id}",
+                headers=headers[email],
+            )
+            for email, course_ids in seeded
+            for course_id in course_ids[:SUMMARY_REQUESTS_PER_USER]
+        ],
+    )
+    report["endpoints"][name] = recorder.report(name, wall)
+
+    # POST /batch/ and the batch pipeline behind it
+    statements_before = statement_count()
+    transactions_before = transaction_count()
+    job_ids: list[int] = []
+
+    def submit(email: str, course_ids: list[int]) -> None:
+        response = recorder.request(
+            client,
+            "POST /batch/",
+            "POST",
+            "/batch/",
+            headers=headers[email],
+            json={"name": "benchmark", "course_ids": course_ids},
+        )
+        if response.status_code < 400:
+            job_ids.append(response.json()["id"])
+
+    batch_start = time.perf_counter()
+    wall = run_phase(
+        args.concurrency,
+        [
+            lambda email=email, course_ids=course_ids: submit(
+                email, course_ids[SUMMARY_REQUESTS_PER_USER:]
+            )
+            for email, course_ids in seeded
+        ],
+    )
+    report["endpoints"]["POST /batch/"] = recorder.report("POST /batch/", wall)
+
+    finished, failed, total, polls = wait_for_jobs(job_ids, args.batch_timeout)
+    batch_seconds = time.perf_counter() - batch_start
+    statements_after = statement_count()
+    transactions_after = transaction_count()
+
+    report["batch"] = {
+        "jobs": len(job_ids),
+        "tasks": total,
+        "finished_tasks": finished,
+        "failed_tasks": failed,
+        "completion_rate": (finished - failed) / total if total else 0.0,
+        "seconds": batch_seconds,
+        "tasks_per_second": finished / batch_seconds if batch_seconds else 0.0,
+        # Statements issued anywhere during the batch phase, minus the polls
+        "statements_per_task": (
+            (statements_after - statements_before - polls) / finished
+            if finished and statements_before is not None
+            else None
+        ),
+        "transactions_per_task": (
+            (transactions_after - transactions_before - polls) / finished
+            if finished and transactions_before is not None
+            else None
+        ),
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
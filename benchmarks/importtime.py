@@ -0,0 +1,103 @@
+"""
+Cold start import profile of the API and the workers.
+
+Imports each entry point in fresh interpreters with `python -X importtime` and
+reports the median import time, the slowest modules by cumulative time and
+which web-stack modules a worker pulls in (it should pull in none). Only the
+regular settings are needed, no running services:
+
+    python -m benchmarks.importtime --runs 5 --output importtime.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+TARGETS = {
+    "api": ["app.main"],
+    "celery-worker": [
+        "app.celery_app",
+        "app.tasks.batch_tasks",
+        "app.tasks.maintenance",
+        "app.tasks.resummarize",
+    ],
+    "pull-worker": ["app.tasks.pull_worker"],
+    "outcome-flusher": ["app.tasks.outcome_flusher"],
+}
+WORKER_TARGETS = {"celery-worker", "pull-worker", "outcome-flusher"}
+# Modules a worker has no use for
+WEB_STACK = ("fastapi", "starlette", "passlib", "jwt")
+
+
+def profile(modules: list[str]) -> tuple[float, dict[str, int]]:
+    """
+    Import `modules` in a new interpreter.
+
+    Returns:
+        The wall time in seconds and the cumulative import time in microseconds
+        of every imported module
+    """
+    code = "; ".join(f"import {module}" for module in modules)
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env=os.environ,
+        check=True,
+    )
+    wall = time.perf_counter() - start
+
+    cumulative = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, total, name = line.split("|")
+        if total.strip().isdigit():
+            cumulative[name.strip()] = int(total)
+    return wall, cumulative
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report: dict = {"config": vars(args), "targets": {}}
+    for target, modules in TARGETS.items():
+        walls, import_ms = [], []
+        for _ in range(args.runs):
+            wall, cumulative = profile(modules)
+            walls.append(wall * 1000)
+            import_ms.append(
+                sum(cumulative.get(module, 0) for module in modules) / 1000
+            )
+
+        slowest = sorted(cumulative.items(), key=lambda item: item[1], reverse=True)
+        result = {
+            "wall_ms": statistics.median(walls),
+            "import_ms": statistics.median(import_ms),
+            "modules": len(cumulative),
+            "slowest": {name: us / 1000 for name, us in slowest[: args.top]},
+        }
+        if target in WORKER_TARGETS:
+            result["web_stack"] = sorted(
+                {name.split(".")[0] for name in cumulative} & set(WEB_STACK)
+            )
+        report["targets"][target] = result
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
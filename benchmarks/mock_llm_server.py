@@ -0,0 +1,73 @@
+"""
+Minimal OpenAI-compatible chat completions server for benchmarks.
+
+Point the app at it with LLM_BACKEND=openai_compatible and
+LLM_BASE_URL=http://<host>:9000/v1. Latency, error rate and token rate are set
+with MOCK_LLM_LATENCY_MS, MOCK_LLM_LATENCY_SIGMA, MOCK_LLM_ERROR_RATE and
+MOCK_LLM_TOKENS_PER_SECOND.
+
+    uvicorn benchmarks.mock_llm_server:app --port 9000
+"""
+
+import asyncio
+import os
+import random
+import re
+import time
+import uuid
+from typing import Any
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+LATENCY_MS = float(os.getenv("MOCK_LLM_LATENCY_MS", "800"))
+LATENCY_SIGMA = float(os.getenv("MOCK_LLM_LATENCY_SIGMA", "0.5"))
+ERROR_RATE = float(os.getenv("MOCK_LLM_ERROR_RATE", "0"))
+TOKENS_PER_SECOND = float(os.getenv("MOCK_LLM_TOKENS_PER_SECOND", "50"))
+CHARS_PER_TOKEN = 4
+
+app = FastAPI(title="Mock LLM")
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(body: dict[str, Any]) -> Any:
+    prompt = body["messages"][-1]["content"]
+    text = prompt.split(": ", 1)[-1]
+    sentences = [s for s in re.split(r"(?<=[.!?])\s+", text) if s][:2]
+    content = " ".join(sentences)[:600] or "This course has no description."
+
+    prompt_tokens = sum(len(m["content"]) for m in body["messages"]) // CHARS_PER_TOKEN
+    max_tokens = body.get("max_tokens", 150)
+    completion_tokens = min(len(content) // CHARS_PER_TOKEN, max_tokens)
+    finish_reason = "stop"
+    if len(content) > max_tokens * CHARS_PER_TOKEN:
+        content = content[: max_tokens * CHARS_PER_TOKEN]
+        finish_reason = "length"
+
+    latency = random.lognormvariate(0, LATENCY_SIGMA) * LATENCY_MS / 1000
+    await asyncio.sleep(latency + completion_tokens / TOKENS_PER_SECOND)
+
+    if random.random() < ERROR_RATE:
+        return JSONResponse(
+            status_code=500,
+            content={"error": {"message": "Injected failure", "type": "server_error"}},
+        )
+
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": finish_reason,
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
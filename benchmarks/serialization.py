@@ -0,0 +1,163 @@
+"""
+Serialization CPU time and wire bytes of large list responses.
+
+Serves in-memory courses and batch tasks through FastAPI's default response
+path (validating every row against the response model, then json.dumps) and
+through the orjson path used by GET /courses/ and GET /batch/{id}/tasks, then
+reports the CPU time per response and the response size for every content
+coding the CompressionMiddleware supports. No database is needed:
+
+    python -m benchmarks.serialization --rows 10000 --output serialization.json
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+import orjson
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from fastapi.testclient import TestClient
+
+from app.middleware import ENCODINGS, CompressionMiddleware
+from app.models import BatchStatus, BatchTaskPublic, Course, CoursesPublic
+
+SUMMARY = (
+    "This course introduces the core ideas step by step. Learners finish with a "
+    "project that applies them to a realistic problem. "
+) * 3
+
+
+def build_rows(rows: int, description_chars: int) -> tuple[list[dict], list[dict]]:
+    paragraph = (
+        "This module covers the fundamentals and works through practical examples. "
+        "Learners complete exercises and a project that applies each concept. "
+    )
+    description = (paragraph * (description_chars // len(paragraph) + 1))[
+        :description_chars
+    ]
+    created = datetime(2026, 1, 1, 12, 0, 0, 123456)
+
+    courses = [
+        {
+            "id": i,
+            "user_id": 1,
+            "title": f"Benchmark course {i}",
+            "description": description,
+            "ai_summary": SUMMARY,
+            "status": "completed",
+            "description_hash": f"{i:064x}",
+            "description_tokens": description_chars // 4,
+            "summary_model": "gpt-4o-mini-2024-07-18",
+            "summary_prompt_version": "1",
+            "summary_source_hash": f"{i:064x}",
+            "created_at": created + timedelta(seconds=i),
+        }
+        for i in range(1, rows + 1)
+    ]
+    tasks = [
+        {
+            "id": i,
+            "batch_job_id": 1,
+            "course_id": i,
+            "status": BatchStatus.COMPLETED,
+            "result": SUMMARY,
+            "error": "",
+            "prompt_tokens": 400,
+            "completion_tokens": 90,
+            "llm_calls": 1,
+            "postprocess_outcome": "accepted",
+            "attempts": 1,
+            "created_at": created,
+            "updated_at": created + timedelta(seconds=i),
+        }
+        for i in range(1, rows + 1)
+    ]
+    return courses, tasks
+
+
+def build_app(courses: list[dict], tasks: list[dict], minimum_size: int) -> FastAPI:
+    course_models = [Course.model_validate(course) for course in courses]
+    task_models = [BatchTaskPublic.model_validate(task) for task in tasks]
+
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=minimum_size)
+
+    @app.get("/default/courses", response_model=CoursesPublic)
+    def default_courses():
+        return CoursesPublic(courses=course_models)
+
+    @app.get("/orjson/courses", response_model=CoursesPublic)
+    def orjson_courses():
+        return ORJSONResponse({"courses": courses})
+
+    @app.get("/default/tasks", response_model=list[BatchTaskPublic])
+    def default_tasks():
+        return task_models
+
+    @app.get("/orjson/tasks", response_model=list[BatchTaskPublic])
+    def orjson_tasks():
+        return ORJSONResponse(tasks)
+
+    return app
+
+
+def cpu_ms(client: TestClient, url: str, repeat: int, encoding: str) -> float:
+    """Mean CPU time per request, measured over the whole process"""
+    headers = {"Accept-Encoding": encoding}
+    client.get(url, headers=headers)  # Warm up
+    start = time.process_time()
+    for _ in range(repeat):
+        client.get(url, headers=headers)
+    return (time.process_time() - start) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--description-chars", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--minimum-size", type=int, default=1024)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    courses, tasks = build_rows(args.rows, args.description_chars)
+    client = TestClient(build_app(courses, tasks, args.minimum_size))
+    report: dict = {"config": vars(args), "routes": {}}
+
+    for resource in ("courses", "tasks"):
+        default = client.get(f"/default/{resource}", headers={"Accept-Encoding": ""})
+        fast = client.get(f"/orjson/{resource}", headers={"Accept-Encoding": ""})
+        result = {
+            # Both paths must produce the same document
+            "identical": orjson.loads(default.content) == orjson.loads(fast.content),
+            "default_cpu_ms": cpu_ms(
+                client, f"/default/{resource}", args.repeat, "identity"
+            ),
+            "orjson_cpu_ms": cpu_ms(
+                client, f"/orjson/{resource}", args.repeat, "identity"
+            ),
+            "wire_bytes": {"identity": len(fast.content)},
+            "compressed_cpu_ms": {},
+        }
+        for encoding in ENCODINGS:
+            response = client.get(
+                f"/orjson/{resource}", headers={"Accept-Encoding": encoding}
+            )
+            # The test client decodes the body, so take the size from the header
+            result["wire_bytes"][encoding] = int(response.headers["content-length"])
+            result["compressed_cpu_ms"][encoding] = cpu_ms(
+                client, f"/orjson/{resource}", args.repeat, encoding
+            )
+        report["routes"][resource] = result
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Measure the database time spent per batch task, without calling the LLM.
+
+Compares the original per-task path (get task, update_task_status, get course,
+update_task_status, commit) with the claim/complete path used by
+process_batch_task. Run against a scratch database:
+
+    python -m benchmarks.task_db --tasks 500
+"""
+
+import argparse
+import json
+import statistics
+import time
+import uuid
+
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, delete
+
+from app.core.db import engine
+from app.crud import batch
+from app.models import BatchJob, BatchStatus, BatchTask, Course, User
+
+SUMMARY = "A short benchmark summary. It has two sentences."
+
+
+class StatementCounter:
+    """Counts statements and commits issued through the engine"""
+
+    def __init__(self) -> None:
+        self.statements = 0
+        self.commits = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+        event.listen(engine, "commit", self._on_commit)
+
+    def _on_execute(self, *args) -> None:
+        self.statements += 1
+
+    def _on_commit(self, *args) -> None:
+        self.commits += 1
+
+    def reset(self) -> None:
+        self.statements = 0
+        self.commits = 0
+
+
+def seed(session: Session, tasks: int) -> tuple[int, int, list[int]]:
+    user = User(
+        name="bench",
+        email=f"bench-{uuid.uuid4().hex}@example.com",
+        hashed_password="-",
+    )
+    session.add(user)
+    session.flush()
+
+    courses = [
+        Course(user_id=user.id, title=f"Course {i}", description="x" * 2000)
+        for i in range(tasks)
+    ]
+    session.add_all(courses)
+    session.flush()
+
+    job = BatchJob(user_id=user.id, name="bench", total_tasks=tasks)
+    session.add(job)
+    session.flush()
+
+    task_rows = [BatchTask(batch_job_id=job.id, course_id=c.id) for c in courses]
+    session.add_all(task_rows)
+    session.commit()
+    return user.id, job.id, [t.id for t in task_rows]
+
+
+def cleanup(session: Session, user_id: int, job_id: int) -> None:
+    session.exec(delete(BatchTask).where(BatchTask.batch_job_id == job_id))
+    session.exec(delete(BatchJob).where(BatchJob.id == job_id))
+    session.exec(delete(Course).where(Course.user_id == user_id))
+    session.exec(delete(User).where(User.id == user_id))
+    session.commit()
+
+
+def run_legacy(session: Session, task_id: int) -> None:
+    task = session.get(BatchTask, task_id)
+    batch.update_task_status(
+        session=session, task_id=task_id, status=BatchStatus.PROCESSING
+    )
+    course = session.get(Course, task.course_id)
+    course.ai_summary = SUMMARY
+    course.status = "draft"
+    session.add(course)
+    batch.update_task_status(
+        session=session, task_id=task_id, status=BatchStatus.COMPLETED
+    )
+    session.commit()
+
+
+def run_lean(session: Session, task_id: int) -> None:
+    claimed = batch.claim_batch_task(
+        session=session, task_id=task_id, lease_seconds=300
+    )
+    batch.complete_batch_task(
+        session=session,
+        task_id=task_id,
+        batch_job_id=claimed.batch_job_id,
+        course_id=claimed.course_id,
+        result=SUMMARY,
+    )
+
+
+def measure(name: str, runner, tasks: int, counter: StatementCounter) -> dict:
+    with Session(engine) as session:
+        user_id, job_id, task_ids = seed(session, tasks)
+
+    counter.reset()
+    timings = []
+    for task_id in task_ids:
+        # A fresh session per task, as in the Celery worker
+        with Session(engine) as session:
+            start = time.perf_counter()
+            runner(session, task_id)
+            timings.append((time.perf_counter() - start) * 1000)
+
+    stats = {
+        "path": name,
+        "tasks": tasks,
+        "statements_per_task": counter.statements / tasks,
+        "commits_per_task": counter.commits / tasks,
+        "mean_ms": statistics.fmean(timings),
+        "p50_ms": statistics.median(timings),
+        "p95_ms": statistics.quantiles(timings, n=20)[-1],
+    }
+
+    with Session(engine) as session:
+        cleanup(session, user_id, job_id)
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks", type=int, default=200)
+    args = parser.parse_args()
+
+    SQLModel.metadata.create_all(engine)
+    counter = StatementCounter()
+    results = [
+        measure("legacy", run_legacy, args.tasks, counter),
+        measure("lean", run_lean, args.tasks, counter),
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import functools
+import os
+from pathlib import Path
+
+# Settings are read on import. Tests that need Postgres get their own database,
+# which they migrate and empty after every test, never the one in POSTGRES_DB
+os.environ.setdefault("POSTGRES_SERVER", "localhost")
+os.environ.setdefault("POSTGRES_USER", "postgres")
+os.environ.setdefault("REDIS_HOST", "localhost")
+os.environ["POSTGRES_DB"] = os.environ.get("TEST_POSTGRES_DB", "ai_summary_test")
+
+import pytest
+import redis
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, SQLModel
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.redis import get_redis
+from app.crud import create_course
+from app.models import Course, CourseCreate, User
+
+ROOT = Path(__file__).parent.parent
+
+
+def _create_database() -> None:
+    server = create_engine(
+        str(settings.SQLALCHEMY_DATABASE_URI).rsplit("/", 1)[0] + "/postgres",
+        isolation_level="AUTOCOMMIT",
+    )
+    with server.connect() as connection:
+        exists = connection.execute(
+            text("SELECT 1 FROM pg_database WHERE datname = :name"),
+            {"name": settings.POSTGRES_DB},
+        ).scalar()
+        if not exists:
+            connection.execute(text(f'CREATE DATABASE "{settings.POSTGRES_DB}"'))
+    server.dispose()
+
+
+@pytest.fixture(scope="session")
+def database():
+    """The migrated test database; tests using it are skipped without Postgres"""
+    try:
+        _create_database()
+    except OperationalError:
+        pytest.skip("Postgres is not available")
+    config = Config(str(ROOT / "alembic.ini"))
+    config.set_main_option("script_location", str(ROOT / "app" / "alembic"))
+    command.upgrade(config, "head")
+    return engine
+
+
+@pytest.fixture
+def session(database):
+    with Session(database) as session:
+        yield session
+    tables = ", ".join(f'"{table.name}"' for table in SQLModel.metadata.sorted_tables)
+    with database.begin() as connection:
+        connection.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    """A fake Redis with Lua support, returned by get_redis() for the test"""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        redis, "Redis", functools.partial(fakeredis.FakeRedis, server=server)
+    )
+    get_redis.cache_clear()
+    yield get_redis()
+    get_redis.cache_clear()
+
+
+@pytest.fixture
+def user(session) -> User:
+    user = User(name="Test User", email="test@example.com", hashed_password="-")
+    session.add(user)
+    session.commit()
+    session.refresh(user)
+    return user
+
+
+@pytest.fixture
+def make_course(session, user):
+    def make(description: str = "A course about data analysis.", **fields) -> Course:
+        course = create_course(
+            session=session,
+            course_in=CourseCreate(title="Course", description=description),
+            user_id=user.id,
+        )
+        if fields:
+            for name, value in fields.items():
+                setattr(course, name, value)
+            session.add(course)
+            session.commit()
+            session.refresh(course)
+        return course
+
+    return make
@@ -0,0 +1,204 @@
+import time
+from datetime import UTC, datetime, timedelta
+
+from sqlmodel import select
+
+from app.crud import batch
+from app.models import BatchJob, BatchStatus, BatchTask, Course
+from app.tasks.batch_tasks import lease_heartbeat
+
+
+def _job(session, user, courses) -> BatchJob:
+    return batch.create_batch_job(
+        session=session,
+        batch_in={"name": "Job", "course_ids": [course.id for course in courses]},
+        user_id=user.id,
+    )
+
+
+def _tasks(session, job) -> list[BatchTask]:
+    session.expire_all()
+    statement = select(BatchTask).where(BatchTask.batch_job_id == job.id)
+    return session.exec(statement.order_by(BatchTask.id)).all()
+
+
+def test_claim_returns_the_description_and_starts_a_lease(
+    session, user, make_course
+) -> None:
+    course = make_course("Learn SQL from scratch.")
+    job = _job(session, user, [course])
+    task = _tasks(session, job)[0]
+
+    claimed = batch.claim_batch_task(session=session, task_id=task.id, lease_seconds=60)
+
+    assert claimed.course_id == course.id
+    assert claimed.user_id == user.id
+    assert claimed.description == "Learn SQL from scratch."
+    assert claimed.attempts == 1
+    task = _tasks(session, job)[0]
+    assert task.status == BatchStatus.PROCESSING
+    assert task.lease_expires_at is not None
+
+
+def test_task_is_claimed_only_once(session, user, make_course) -> None:
+    job = _job(session, user, [make_course()])
+    task = _tasks(session, job)[0]
+
+    assert batch.claim_batch_task(session=session, task_id=task.id, lease_seconds=60)
+    assert (
+        batch.claim_batch_task(session=session, task_id=task.id, lease_seconds=60)
+        is None
+    )
+
+
+def test_complete_stores_summary_and_finishes_job(session, user, make_course) -> None:
+    courses = [make_course(), make_course()]
+    job = _job(session, user, courses)
+
+    for task in _tasks(session, job):
+        claimed = batch.claim_batch_task(
+            session=session, task_id=task.id, lease_seconds=60
+        )
+        assert batch.complete_batch_task(
+            session=session,
+            task_id=claimed.id,
+            batch_job_id=job.id,
+            course_id=claimed.course_id,
+            result=f"Summary of course {claimed.course_id}.",
+            prompt_tokens=100,
+            completion_tokens=20,
+            summary_model="gpt-4o-mini",
+        )
+
+    session.expire_all()
+    job = session.get(BatchJob, job.id)
+    assert job.status == BatchStatus.COMPLETED
+    assert (job.completed_tasks, job.failed_tasks) == (2, 0)
+    assert [task.prompt_tokens for task in _tasks(session, job)] == [100, 100]
+    for course in courses:
+        course = session.get(Course, course.id)
+        assert course.ai_summary == f"Summary of course {course.id}."
+        assert course.summary_model == "gpt-4o-mini"
+        assert course.summary_revision == 1
+
+
+def test_complete_without_claim_writes_nothing(session, user, make_course) -> None:
+    course = make_course()
+    job = _job(session, user, [course])
+    task = _tasks(session, job)[0]
+
+    assert not batch.complete_batch_task(
+        session=session,
+        task_id=task.id,
+        batch_job_id=job.id,
+        course_id=course.id,
+        result="Too late.",
+    )
+
+    session.expire_all()
+    assert session.get(Course, course.id).ai_summary == ""
+    assert session.get(BatchJob, job.id).completed_tasks == 0
+
+
+def test_heartbeat_extends_the_lease_while_the_block_runs(
+    session, user, make_course
+) -> None:
+    job = _job(session, user, [make_course()])
+    task = _tasks(session, job)[0]
+    batch.claim_batch_task(session=session, task_id=task.id, lease_seconds=1)
+
+    with lease_heartbeat([task.id], lease_seconds=600, heartbeat_seconds=0.05):
+        time.sleep(0.3)
+
+    lease = _tasks(session, job)[0].lease_expires_at
+    assert lease > datetime.now(UTC) + timedelta(seconds=500)
+
+
+def _expire_leases(session, job) -> None:
+    for task in _tasks(session, job):
+        task.lease_expires_at = datetime.now(UTC) - timedelta(seconds=1)
+        session.add(task)
+    session.commit()
+
+
+def test_reaper_requeues_expired_tasks_and_fails_exhausted_ones(
+    session, user, make_course
+) -> None:
+    job = _job(session, user, [make_course(), make_course(), make_course()])
+    first, second, live = _tasks(session, job)
+    for task in (first, second, live):
+        batch.claim_batch_task(session=session, task_id=task.id, lease_seconds=600)
+    # The second task has used up its attempts, the third still holds its lease
+    second.attempts = 3
+    session.add(second)
+    session.commit()
+    for task in (first, second):
+        task.lease_expires_at = datetime.now(UTC) - timedelta(seconds=1)
+        session.add(task)
+    session.commit()
+
+    requeued, failed = batch.reap_stale_tasks(session=session, max_attempts=3, limit=10)
+
+    assert (requeued, failed) == ([first.id], 1)
+    statuses = [task.status for task in _tasks(session, job)]
+    assert statuses == [BatchStatus.PENDING, BatchStatus.FAILED, BatchStatus.PROCESSING]
+
+
+def test_reaped_task_cannot_be_completed_by_its_old_worker(
+    session, user, make_course
+) -> None:
+    course = make_course()
+    job = _job(session, user, [course])
+    task = _tasks(session, job)[0]
+    batch.claim_batch_task(session=session, task_id=task.id, lease_seconds=600)
+    _expire_leases(session, job)
+    batch.reap_stale_tasks(session=session, max_attempts=3, limit=10)
+
+    assert not batch.complete_batch_task(
+        session=session,
+        task_id=task.id,
+        batch_job_id=job.id,
+        course_id=course.id,
+        result="Late summary.",
+    )
+
+
+def test_finalize_recounts_jobs_and_finishes_them(session, user, make_course) -> None:
+    done = _job(session, user, [make_course(), make_course()])
+    failed = _job(session, user, [make_course()])
+    running = _job(session, user, [make_course(), make_course()])
+    statuses = {
+        done.id: [BatchStatus.COMPLETED, BatchStatus.FAILED],
+        failed.id: [BatchStatus.FAILED],
+        running.id: [BatchStatus.COMPLETED, BatchStatus.PENDING],
+    }
+    for job in (done, failed, running):
+        for task, status in zip(_tasks(session, job), statuses[job.id]):
+            task.status = status
+            session.add(task)
+        session.commit()
+
+    updated, last_id = batch.finalize_batch_jobs(session=session, after_id=0, limit=10)
+
+    assert (updated, last_id) == (3, None)
+    session.expire_all()
+    done, failed, running = (
+        session.get(BatchJob, job.id) for job in (done, failed, running)
+    )
+    assert (done.status, done.completed_tasks, done.failed_tasks) == (
+        BatchStatus.COMPLETED,
+        2,
+        1,
+    )
+    assert failed.status == BatchStatus.FAILED
+    assert running.status == BatchStatus.PENDING
+    assert running.completed_tasks == 1
+
+
+def test_finalize_pages_through_jobs(session, user, make_course) -> None:
+    jobs = [_job(session, user, [make_course()]) for _ in range(3)]
+
+    _, last_id = batch.finalize_batch_jobs(session=session, after_id=0, limit=2)
+    assert last_id == jobs[1].id
+    _, last_id = batch.finalize_batch_jobs(session=session, after_id=last_id, limit=2)
+    assert last_id is None
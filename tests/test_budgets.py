@@ -0,0 +1,41 @@
+from sqlmodel import select
+
+from app.core.config import settings
+from app.models import TokenUsage
+from app.services import budgets
+
+
+def test_budgets_are_unlimited_by_default(redis_client) -> None:
+    budgets.record_usage(redis_client, 1, prompt_tokens=10**9, completion_tokens=0)
+
+    assert budgets.remaining_tokens(redis_client, 1) is None
+    assert budgets.has_budget(redis_client, 1, tokens=10**9)
+
+
+def test_spend_counts_against_user_and_org_budgets(redis_client, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "TOKEN_BUDGET_USER_DAILY", 1000)
+    monkeypatch.setattr(settings, "TOKEN_BUDGET_ORG_MONTHLY", 1500)
+
+    budgets.record_usage(redis_client, 1, prompt_tokens=500, completion_tokens=100)
+    assert budgets.remaining_tokens(redis_client, 1) == 400
+    assert not budgets.has_budget(redis_client, 1, tokens=500)
+
+    # Another user's spend only counts against the org budget
+    budgets.record_usage(redis_client, 2, prompt_tokens=800, completion_tokens=0)
+    assert budgets.remaining_tokens(redis_client, 1) == 100
+    assert budgets.remaining_tokens(redis_client, 2) == 100
+
+
+def test_flush_moves_spend_to_postgres_once(session, redis_client, user) -> None:
+    budgets.record_usage(redis_client, user.id, prompt_tokens=300, completion_tokens=50)
+    budgets.record_usage(redis_client, user.id, prompt_tokens=200, completion_tokens=25)
+
+    assert budgets.flush_usage(redis_client, session) == 1
+    assert budgets.flush_usage(redis_client, session) == 0
+
+    usage = session.exec(select(TokenUsage)).one()
+    assert (usage.user_id, usage.prompt_tokens, usage.completion_tokens) == (
+        user.id,
+        500,
+        75,
+    )
@@ -0,0 +1,102 @@
+import pytest
+
+from app.core.config import settings
+from app.services import fair_scheduler
+
+
+@pytest.fixture(autouse=True)
+def scheduler_settings(monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_SCHEDULER_QUANTUM_TOKENS", 2000)
+    monkeypatch.setattr(settings, "BATCH_SCHEDULER_MAX_IN_FLIGHT", 6)
+    monkeypatch.setattr(settings, "BATCH_SCHEDULER_USER_MAX_IN_FLIGHT", 0)
+
+
+def _submit(redis_client, user_id: int, job_id: int, count: int, cost=1000) -> None:
+    first = user_id * 100 + job_id * 10
+    fair_scheduler.submit(
+        redis_client,
+        [(first + i, job_id, user_id, cost) for i in range(count)],
+    )
+
+
+def _users(tasks) -> list[int]:
+    return [user_id for _, _, user_id in tasks]
+
+
+def test_users_take_turns_worth_the_quantum(redis_client) -> None:
+    _submit(redis_client, user_id=1, job_id=1, count=8)
+    _submit(redis_client, user_id=2, job_id=1, count=2)
+
+    tasks = fair_scheduler.dispatch(redis_client)
+
+    assert _users(tasks) == [1, 1, 2, 2, 1, 1]
+    assert fair_scheduler.queued_count(redis_client) == 4
+
+
+def test_released_slots_are_dispatched_again(redis_client) -> None:
+    _submit(redis_client, user_id=1, job_id=1, count=8)
+    tasks = fair_scheduler.dispatch(redis_client)
+    assert fair_scheduler.dispatch(redis_client) == []
+
+    task_id, _, user_id = tasks[0]
+    fair_scheduler.release(redis_client, user_id, task_id)
+
+    assert len(fair_scheduler.dispatch(redis_client)) == 1
+
+
+def test_user_cap_leaves_room_for_others(redis_client) -> None:
+    fair_scheduler.set_user_limits(redis_client, 1, max_in_flight=1, weight=None)
+    _submit(redis_client, user_id=1, job_id=1, count=5)
+    _submit(redis_client, user_id=2, job_id=1, count=2)
+
+    tasks = fair_scheduler.dispatch(redis_client)
+
+    assert sorted(_users(tasks)) == [1, 2, 2]
+    state = fair_scheduler.get_user_state(redis_client, 1)
+    assert (state["max_in_flight"], state["queued"], state["running"]) == (1, 4, 1)
+
+
+def test_dispatch_stops_when_every_user_is_capped(redis_client, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "BATCH_SCHEDULER_USER_MAX_IN_FLIGHT", 1)
+    for user_id in (1, 2):
+        _submit(redis_client, user_id=user_id, job_id=1, count=3)
+
+    assert len(fair_scheduler.dispatch(redis_client)) == 2
+    assert fair_scheduler.dispatch(redis_client) == []
+
+
+def test_dispatch_reaches_users_beyond_one_script_call(
+    redis_client, monkeypatch
+) -> None:
+    users = 3 * fair_scheduler.VISITS_PER_CALL
+    monkeypatch.setattr(settings, "BATCH_SCHEDULER_MAX_IN_FLIGHT", users)
+    for user_id in range(1, users + 1):
+        _submit(redis_client, user_id=user_id, job_id=1, count=1)
+
+    tasks = fair_scheduler.dispatch(redis_client)
+
+    assert sorted(_users(tasks)) == list(range(1, users + 1))
+    assert redis_client.llen(fair_scheduler.ACTIVE_KEY) == 0
+
+
+def test_expensive_tasks_wait_for_enough_turns(redis_client) -> None:
+    _submit(redis_client, user_id=1, job_id=1, count=1, cost=50_000)
+
+    assert len(fair_scheduler.dispatch(redis_client)) == 1
+
+
+def test_drop_job_keeps_other_jobs_queued(redis_client) -> None:
+    _submit(redis_client, user_id=1, job_id=1, count=3)
+    _submit(redis_client, user_id=1, job_id=2, count=2)
+
+    assert fair_scheduler.drop_job(redis_client, 1, 1) == 3
+
+    assert {job_id for _, job_id, _ in fair_scheduler.dispatch(redis_client)} == {2}
+
+
+def test_all_keys_share_one_hash_slot(redis_client) -> None:
+    fair_scheduler.set_user_limits(redis_client, 1, max_in_flight=2, weight=2)
+    _submit(redis_client, user_id=1, job_id=1, count=10)
+    fair_scheduler.dispatch(redis_client)
+
+    assert all(key.startswith("{sched}:") for key in redis_client.keys("*"))
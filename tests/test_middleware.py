@@ -0,0 +1,88 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from fastapi.testclient import TestClient
+
+from app.middleware import ENCODINGS, CompressionMiddleware, choose_encoding
+
+BODY = {"summary": "A course about data analysis. " * 100}
+
+
+@pytest.mark.parametrize(
+    ("accept_encoding", "expected"),
+    [
+        ("gzip", "gzip"),
+        ("GZIP;q=0.5", "gzip"),
+        ("deflate", None),
+        ("", None),
+        ("gzip;q=0", None),
+        ("*;q=0", None),
+        ("gzip;q=bad", None),
+    ],
+)
+def test_choose_encoding(accept_encoding: str, expected: str | None) -> None:
+    assert choose_encoding(accept_encoding) == expected
+
+
+def test_choose_encoding_prefers_higher_q() -> None:
+    assert choose_encoding("gzip;q=0.9, *;q=0.1") == "gzip"
+
+
+def test_choose_encoding_breaks_ties_in_server_order() -> None:
+    first = next(iter(ENCODINGS))
+
+    assert choose_encoding("*") == first
+    assert choose_encoding(", ".join(reversed(ENCODINGS))) == first
+
+
+@pytest.fixture
+def client() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+    @app.get("/large")
+    def large():
+        return JSONResponse(BODY, headers={"ETag": '"v1"'})
+
+    @app.get("/small")
+    def small():
+        return JSONResponse({"ok": True})
+
+    @app.get("/binary")
+    def binary():
+        return Response(b"\0" * 1000, media_type="application/octet-stream")
+
+    @app.get("/text")
+    def text():
+        return PlainTextResponse("plain " * 100)
+
+    return TestClient(app)
+
+
+def test_large_json_is_compressed(client) -> None:
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["ETag"] == '"v1-gzip"'
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.json() == BODY
+
+
+@pytest.mark.parametrize(
+    ("path", "accept_encoding"),
+    [("/small", "gzip"), ("/large", "identity"), ("/text", "")],
+)
+def test_uncompressed_eligible_response_varies_on_encoding(
+    client, path: str, accept_encoding: str
+) -> None:
+    response = client.get(path, headers={"Accept-Encoding": accept_encoding})
+
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Vary"] == "Accept-Encoding"
+
+
+def test_ineligible_response_is_left_alone(client) -> None:
+    response = client.get("/binary", headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in response.headers
+    assert "Vary" not in response.headers
@@ -0,0 +1,97 @@
+import pytest
+
+from app.core.config import settings
+from app.services import postprocess
+from app.services.llm import SummaryResult
+
+SENTENCE = "This course covers the fundamentals of machine learning. "
+
+
+def _continuation(text: str):
+    def complete(prompt: str) -> SummaryResult:
+        return SummaryResult(text=text, prompt_tokens=10, completion_tokens=5)
+
+    return complete
+
+
+def _unused(prompt: str) -> SummaryResult:
+    raise AssertionError("the continuation prompt should not run")
+
+
+def test_accepts_complete_summary() -> None:
+    result = postprocess.postprocess_summary(SummaryResult(text=SENTENCE * 2), _unused)
+
+    assert result.postprocess_outcome == "accepted"
+    assert result.text == (SENTENCE * 2).strip()
+
+
+def test_trims_long_summary_to_last_sentence_within_limit() -> None:
+    result = postprocess.postprocess_summary(SummaryResult(text=SENTENCE * 20), _unused)
+
+    assert result.postprocess_outcome == "trimmed"
+    assert len(result.text) <= settings.SUMMARY_MAX_CHARS
+    assert result.text.endswith("learning.")
+
+
+def test_cuts_long_summary_without_sentence_at_limit() -> None:
+    result = postprocess.postprocess_summary(SummaryResult(text="word " * 500), _unused)
+
+    assert result.postprocess_outcome == "incomplete"
+    assert len(result.text) <= settings.SUMMARY_MAX_CHARS
+
+
+def test_trims_cut_off_summary_with_enough_full_sentences() -> None:
+    result = postprocess.postprocess_summary(
+        SummaryResult(text=SENTENCE * 2 + "It also", finish_reason="length"),
+        _unused,
+    )
+
+    assert result.postprocess_outcome == "trimmed"
+    assert result.text == (SENTENCE * 2).strip()
+
+
+def test_continues_short_cut_off_summary() -> None:
+    result = postprocess.postprocess_summary(
+        SummaryResult(
+            text="This course covers the fundamentals of",
+            prompt_tokens=100,
+            completion_tokens=50,
+            finish_reason="length",
+        ),
+        _continuation("machine learning and deep learning."),
+    )
+
+    assert result.postprocess_outcome == "continued"
+    assert result.text.endswith("deep learning.")
+    assert (result.prompt_tokens, result.completion_tokens) == (110, 55)
+    assert result.llm_calls == 2
+
+
+@pytest.mark.parametrize(
+    "continuation", ["and more", "and more. " + "x" * settings.SUMMARY_MAX_CHARS]
+)
+def test_marks_unrepairable_summary_incomplete(continuation: str) -> None:
+    result = postprocess.postprocess_summary(
+        SummaryResult(text="This course covers", finish_reason="length"),
+        _continuation(continuation),
+    )
+
+    assert result.postprocess_outcome == "incomplete"
+    assert len(result.text) <= settings.SUMMARY_MAX_CHARS
+
+
+def test_short_continued_summary_is_too_short() -> None:
+    result = postprocess.postprocess_summary(
+        SummaryResult(text="Covers", finish_reason="length"),
+        _continuation("Python."),
+    )
+
+    assert result.postprocess_outcome == "too_short"
+    assert len(result.text) < settings.SUMMARY_MIN_CHARS
+
+
+@pytest.mark.parametrize("text", ["Too short.", ""])
+def test_short_summary_is_too_short(text: str) -> None:
+    result = postprocess.postprocess_summary(SummaryResult(text=text), _unused)
+
+    assert result.postprocess_outcome == "too_short"
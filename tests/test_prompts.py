@@ -0,0 +1,57 @@
+import pytest
+
+from app.crud import courses as courses_crud
+from app.crud import prompts as prompts_crud
+from app.models import Course, PromptTemplateCreate
+
+
+@pytest.fixture
+def old_summary(session, make_course):
+    prompts_crud.create_prompt_template(
+        session=session,
+        prompt_in=PromptTemplateCreate(
+            version="v1",
+            system_prompt="Summarize courses.",
+            summary_prompt="Summarize: {text}",
+            chunk_prompt="Part {part} of {parts}: {text}",
+        ),
+    )
+    course = make_course()
+    return courses_crud.update_course_with_summary(
+        session=session,
+        course_id=course.id,
+        ai_summary="Generated with the old prompt.",
+        summary_model="gpt-4o-mini",
+        summary_prompt_version="v1",
+        summary_source_hash=course.description_hash,
+    )
+
+
+def _outdated(session) -> list[int]:
+    rows = prompts_crud.get_outdated_courses(
+        session=session, prompt_versions=["v2"], before_id=None, limit=10
+    )
+    return [row.id for row in rows]
+
+
+def test_summary_from_an_old_prompt_is_outdated(session, old_summary) -> None:
+    assert _outdated(session) == [old_summary.id]
+
+
+def test_edited_summary_is_not_outdated(session, user, old_summary) -> None:
+    courses_crud.update_course_with_summary(
+        session=session,
+        course_id=old_summary.id,
+        ai_summary="Rewritten by hand.",
+        edited_by=user.id,
+    )
+
+    assert _outdated(session) == []
+    course = session.get(Course, old_summary.id)
+    assert (course.summary_model, course.summary_prompt_version) == (None, None)
+
+
+def test_finalized_summary_is_not_outdated(session, old_summary) -> None:
+    courses_crud.finalize_course_summary(session=session, course_id=old_summary.id)
+
+    assert _outdated(session) == []
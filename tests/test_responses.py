@@ -0,0 +1,41 @@
+import pytest
+from starlette.requests import Request
+
+from app.responses import etag, etag_matches
+
+TAG = etag("course", 1, "2026-01-01T00:00:00")
+
+
+def _request(if_none_match: str | None) -> Request:
+    headers = []
+    if if_none_match is not None:
+        headers.append((b"if-none-match", if_none_match.encode()))
+    return Request({"type": "http", "headers": headers})
+
+
+def test_etag_is_stable_and_quoted() -> None:
+    assert etag("course", 1, "2026-01-01T00:00:00") == TAG
+    assert etag("course", 2, "2026-01-01T00:00:00") != TAG
+    assert TAG.startswith('"') and TAG.endswith('"')
+
+
+@pytest.mark.parametrize(
+    "header",
+    [
+        TAG,
+        f"W/{TAG}",
+        f'"other", {TAG}',
+        "*",
+        f'{TAG[:-1]}-gzip"',
+        f'W/{TAG[:-1]}-zstd"',
+    ],
+)
+def test_etag_matches(header: str) -> None:
+    assert etag_matches(_request(header), TAG)
+
+
+@pytest.mark.parametrize(
+    "header", [None, "", '"other"', f'{TAG[:-1]}-deflate"', TAG[1:-1]]
+)
+def test_etag_does_not_match(header: str | None) -> None:
+    assert not etag_matches(_request(header), TAG)
@@ -0,0 +1,43 @@
+import pytest
+
+from app.core import textdelta
+from app.core.config import settings
+from app.crud.revisions import new_summary_revision
+
+PREVIOUS = (
+    "This course teaches Python for data analysis. Learners work with pandas "
+    "and NumPy and finish with a capstone project."
+)
+EDITED = PREVIOUS.replace("Learners", "Students")
+
+
+def _revision(revision: int, previous: str = PREVIOUS, text: str = EDITED):
+    return new_summary_revision(
+        course_id=1, revision=revision, previous=previous, text=text, source="user"
+    )
+
+
+@pytest.mark.parametrize(
+    "revision", [1, settings.SUMMARY_REVISION_KEYFRAME_INTERVAL + 1]
+)
+def test_every_interval_starts_with_a_keyframe(revision: int) -> None:
+    stored = _revision(revision)
+
+    assert stored.keyframe
+    assert stored.content == EDITED
+
+
+def test_small_edit_is_stored_as_delta() -> None:
+    stored = _revision(2)
+
+    assert not stored.keyframe
+    assert textdelta.patch(PREVIOUS, stored.content) == EDITED
+
+
+def test_rewrite_is_stored_as_keyframe() -> None:
+    rewritten = "An entirely different summary of a machine learning course."
+
+    stored = _revision(2, text=rewritten)
+
+    assert stored.keyframe
+    assert stored.content == rewritten
@@ -0,0 +1,74 @@
+import pytest
+
+from app.crud import batch
+from app.crud import courses as courses_crud
+from app.crud import prompts as prompts_crud
+from app.models import PromptTemplateCreate
+
+
+@pytest.fixture
+def summarize(session):
+    prompts_crud.create_prompt_template(
+        session=session,
+        prompt_in=PromptTemplateCreate(
+            version="v1",
+            system_prompt="Summarize courses.",
+            summary_prompt="Summarize: {text}",
+            chunk_prompt="Part {part} of {parts}: {text}",
+        ),
+    )
+
+    def summarize(course, model: str = "gpt-4o-mini"):
+        return courses_crud.update_course_with_summary(
+            session=session,
+            course_id=course.id,
+            ai_summary=f"Summary by {model}.",
+            summary_model=model,
+            summary_prompt_version="v1",
+            summary_source_hash=course.description_hash,
+        )
+
+    return summarize
+
+
+def _stale(session, courses) -> list[int]:
+    return batch.get_stale_course_ids(
+        session=session,
+        course_ids=[course.id for course in courses],
+        model="gpt-4o-mini",
+        prompt_versions=["v1"],
+    )
+
+
+def test_current_summary_is_not_stale(session, make_course, summarize) -> None:
+    current = summarize(make_course())
+    unsummarized = make_course()
+    other_model = summarize(make_course(), model="gpt-4o")
+
+    assert _stale(session, [current, unsummarized, other_model]) == [
+        unsummarized.id,
+        other_model.id,
+    ]
+
+
+def test_summary_of_an_old_description_is_stale(
+    session, make_course, summarize
+) -> None:
+    course = summarize(make_course())
+    course.description_hash = "changed"
+    session.add(course)
+    session.commit()
+
+    assert _stale(session, [course]) == [course.id]
+
+
+def test_hand_edited_summary_is_kept(session, user, make_course, summarize) -> None:
+    course = summarize(make_course(), model="gpt-4o")
+    courses_crud.update_course_with_summary(
+        session=session,
+        course_id=course.id,
+        ai_summary="Rewritten by hand.",
+        edited_by=user.id,
+    )
+
+    assert _stale(session, [course]) == []
@@ -0,0 +1,111 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.crud import courses as courses_crud
+from app.crud import prompts as prompts_crud
+from app.dependencies import get_current_user, get_llm_service
+from app.main import app
+from app.models import PromptTemplateCreate
+from app.services import prompts
+from app.services.llm import DEFAULT_PROMPT, StubLLMService
+from app.services.singleflight import SingleFlight
+
+
+def _flight(redis_client) -> SingleFlight:
+    return SingleFlight(
+        redis_client,
+        namespace="test",
+        lock_seconds=5,
+        wait_seconds=5,
+        poll_seconds=0.01,
+    )
+
+
+def test_concurrent_callers_share_one_call(redis_client) -> None:
+    calls = []
+
+    def generate() -> str:
+        calls.append(1)
+        time.sleep(0.2)
+        return "summary"
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(_flight(redis_client).run("key", generate))
+        )
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(results) == [("summary", False)] + [("summary", True)] * 3
+
+
+def test_caller_takes_over_after_the_leader_fails(redis_client) -> None:
+    def fail() -> str:
+        raise RuntimeError("LLM call failed")
+
+    with pytest.raises(RuntimeError):
+        _flight(redis_client).run("key", fail)
+
+    assert _flight(redis_client).run("key", lambda: "summary") == ("summary", False)
+
+
+@pytest.fixture
+def client(session, redis_client, user, monkeypatch):
+    # Summaries reference their prompt version, seeded by the migrations
+    prompts_crud.create_prompt_template(
+        session=session,
+        prompt_in=PromptTemplateCreate(
+            version=DEFAULT_PROMPT.version,
+            system_prompt=DEFAULT_PROMPT.system_prompt,
+            summary_prompt=DEFAULT_PROMPT.summary_prompt,
+            chunk_prompt=DEFAULT_PROMPT.chunk_prompt,
+            weight=1,
+        ),
+    )
+    monkeypatch.setattr(prompts, "_cache", None)
+    app.dependency_overrides[get_current_user] = lambda: user
+    app.dependency_overrides[get_llm_service] = lambda: StubLLMService(
+        latency_ms=0, tokens_per_second=10**6
+    )
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def test_idempotency_key_replays_the_original_response(
+    client, session, user, make_course
+) -> None:
+    course = make_course("Learn SQL from scratch. Then build a data warehouse.")
+    headers = {"Idempotency-Key": "first-try"}
+
+    first = client.post(f"/courses/generate_summary/{course.id}", headers=headers)
+    assert first.status_code == 200
+    assert first.json()["ai_summary"]
+
+    courses_crud.update_course_with_summary(
+        session=session, course_id=course.id, ai_summary="Edited.", edited_by=user.id
+    )
+    replay = client.post(f"/courses/generate_summary/{course.id}", headers=headers)
+
+    assert replay.status_code == 200
+    assert replay.content == first.content
+
+
+def test_idempotency_key_cannot_be_reused_for_another_course(
+    client, make_course
+) -> None:
+    headers = {"Idempotency-Key": "first-try"}
+    first, other = make_course(), make_course()
+
+    client.post(f"/courses/generate_summary/{first.id}", headers=headers)
+    response = client.post(f"/courses/generate_summary/{other.id}", headers=headers)
+
+    assert response.status_code == 409
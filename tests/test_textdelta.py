@@ -0,0 +1,40 @@
+import pytest
+
+from app.core import textdelta
+
+SUMMARY = (
+    "This course teaches Python for data analysis. Learners work with pandas "
+    "and NumPy and finish with a capstone project."
+)
+
+
+@pytest.mark.parametrize(
+    ("old", "new"),
+    [
+        ("", ""),
+        ("", SUMMARY),
+        (SUMMARY, ""),
+        (SUMMARY, SUMMARY),
+        (SUMMARY, SUMMARY.replace("Learners", "Students")),
+        (SUMMARY, "Intro. " + SUMMARY + " Updated for 2026."),
+        (SUMMARY, SUMMARY.replace(" pandas", "")),
+        (SUMMARY, SUMMARY.replace(". ", ".\n\n")),
+        ("  leading and trailing  ", "leading and\ttrailing"),
+        ("Grundlagen der Datenanalyse", "Grundlagen der Datenanalyse für Anfänger 📊"),
+    ],
+)
+def test_patch_restores_new_text(old: str, new: str) -> None:
+    assert textdelta.patch(old, textdelta.diff(old, new)) == new
+
+
+def test_one_word_edit_is_small() -> None:
+    new = SUMMARY.replace("Learners", "Students")
+
+    delta = textdelta.diff(SUMMARY, new)
+
+    assert delta == '[7,-1,"Students ",11]'
+    assert len(delta) < len(new)
+
+
+def test_unchanged_text_is_a_single_copy() -> None:
+    assert textdelta.diff(SUMMARY, SUMMARY) == "[19]"
@@ -0,0 +1,91 @@
+from datetime import UTC, datetime, timedelta
+
+from sqlmodel import select
+
+from app.core.config import settings
+from app.crud import batch
+from app.models import BatchJob, BatchStatus, BatchTask, Course
+from app.services import write_behind
+from app.services.write_behind import TaskOutcome
+from app.tasks.maintenance import reap_stale_batch_tasks
+from app.tasks.outcome_flusher import OutcomeFlusher
+
+
+def _claimed_task(session, user, course) -> BatchTask:
+    job = batch.create_batch_job(
+        session=session,
+        batch_in={"name": "Job", "course_ids": [course.id]},
+        user_id=user.id,
+    )
+    task = session.exec(select(BatchTask).where(BatchTask.batch_job_id == job.id)).one()
+    batch.claim_batch_task(session=session, task_id=task.id, lease_seconds=600)
+    return task
+
+
+def _outcome(task: BatchTask) -> TaskOutcome:
+    return TaskOutcome(
+        task_id=task.id,
+        batch_job_id=task.batch_job_id,
+        course_id=task.course_id,
+        status=BatchStatus.COMPLETED,
+        result="Buffered summary.",
+        prompt_tokens=100,
+        completion_tokens=20,
+        llm_calls=1,
+        summary_model="gpt-4o-mini",
+    )
+
+
+def test_outcome_round_trips_through_stream_fields() -> None:
+    outcome = TaskOutcome(
+        task_id=1, batch_job_id=2, course_id=3, status=BatchStatus.FAILED, error="x"
+    )
+
+    fields = {name: str(value) for name, value in outcome.to_fields().items()}
+
+    assert TaskOutcome.from_fields(fields) == outcome
+
+
+def test_reaper_leaves_tasks_with_buffered_outcomes_alone(
+    session, redis_client, user, make_course
+) -> None:
+    course = make_course()
+    task = _claimed_task(session, user, course)
+    write_behind.ensure_group(redis_client)
+    write_behind.push_outcome(redis_client, _outcome(task))
+
+    # The flusher lags behind until long after the lease has expired
+    task.lease_expires_at = datetime.now(UTC) - timedelta(seconds=1)
+    session.add(task)
+    session.commit()
+    reap_stale_batch_tasks()
+
+    session.expire_all()
+    assert session.get(BatchTask, task.id).status == BatchStatus.PROCESSING
+
+    flusher = OutcomeFlusher(consumer="test")
+    entries = write_behind.read_outcomes(redis_client, "test", 10, 0)
+    flusher.flush(redis_client, entries)
+
+    session.expire_all()
+    assert session.get(BatchTask, task.id).status == BatchStatus.COMPLETED
+    assert session.get(Course, course.id).ai_summary == "Buffered summary."
+    assert session.get(BatchJob, task.batch_job_id).status == BatchStatus.COMPLETED
+    assert write_behind.pending_task_ids(redis_client) == []
+    assert redis_client.xlen(write_behind.STREAM_KEY) == 0
+
+
+def test_reaper_still_requeues_tasks_without_outcomes(
+    session, redis_client, user, make_course, monkeypatch
+) -> None:
+    # Pull workers claim requeued tasks themselves, so nothing goes to Celery
+    monkeypatch.setattr(settings, "BATCH_WORKER_MODE", "pull")
+    task = _claimed_task(session, user, make_course())
+    task.lease_expires_at = datetime.now(UTC) - timedelta(seconds=1)
+    session.add(task)
+    session.commit()
+
+    reap_stale_batch_tasks()
+
+    session.expire_all()
+    assert session.get(BatchTask, task.id).status == BatchStatus.PENDING